@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Batch export: many projects are opened one after another in a single IDE session and each is
+exported with the same export engine as cs_export. The script engine, the bundle modules and
+the libraries the IDE has already resolved are loaded once per batch instead of once per project.
+With --native-cache, the native export cache (devices, library managers) is loaded once and shared
+by all projects; it doesn't notice changes of device parameters, see NativeExportCache.
+With --store all projects go into one ObjectStore, which keeps the hashes of known blobs
+in memory between projects.
+
+Usage (IDE with --scriptargs, or CPython with the mock API installed):
+    batch_export.py <project list file or project paths> [--store STORE] [--native-cache [FOLDER]]
+
+A project list file has one project path per line; empty lines and lines starting with # are skipped.
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import io
+import os
+import sys
+import time
+from collections import namedtuple
+
+from .cs_export import (
+    NativeExportCache,
+    default_native_cache_folder,
+    export_project,
+    get_save_folder,
+    scripting,
+)
+from .object_store import ObjectStore, StoreTarget
+
+# Seconds are None for steps that were not reached; error is set if the project failed
+BatchResult = namedtuple(
+    "BatchResult", ["path", "save_folder", "files", "open_seconds", "export_seconds", "close_seconds", "error"]
+)
+
+
+def read_project_list(path):
+    with io.open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def project_name(project_path):
+    return os.path.splitext(os.path.basename(project_path))[0]
+
+
+def export_one(projects, project_path, store=None, save_folder_for=get_save_folder, native_cache=None):
+    """Open project_path, export it and close it again. Errors are returned in the result, not raised."""
+    save_folder = save_folder_for(project_path)
+    files = 0
+    open_seconds = export_seconds = close_seconds = None
+    error = None
+    project = None
+    try:
+        start = time.time()
+        project = projects.open(project_path)
+        open_seconds = time.time() - start
+
+        start = time.time()
+        target = None
+        if store is not None:
+            target = StoreTarget(store, project_name(project_path))
+        run = export_project(project, save_folder, target, native_cache)
+        files = len(run.written)
+        export_seconds = time.time() - start
+    except Exception as e:
+        error = "{}: {}".format(type(e).__name__, e)
+    finally:
+        if project is not None:
+            start = time.time()
+            try:
+                project.close()
+            except Exception as e:
+                error = error or "close failed, {}: {}".format(type(e).__name__, e)
+            close_seconds = time.time() - start
+    return BatchResult(project_path, save_folder, files, open_seconds, export_seconds, close_seconds, error)
+
+
+def export_projects(project_paths, projects=None, store=None, save_folder_for=get_save_folder, native_cache=None):
+    """
+    Export every project of project_paths, each to its own save folder (or ref in store).
+    A project open in the IDE is closed first, like load.py does.
+
+    Args:
+        project_paths (list[str]): project files, exported in this order
+        projects: the scripting API's projects object, default scripting.projects
+        store: an ObjectStore or its root folder shared by all projects; the projects are stored
+            under their name instead of being written to their save folders
+        save_folder_for: project path -> save folder
+        native_cache: NativeExportCache shared by all projects, None exports everything from the IDE
+
+    Returns:
+        list[BatchResult]: one result per project
+    """
+    if projects is None:
+        projects = scripting.projects
+    if store is not None and not isinstance(store, ObjectStore):
+        store = ObjectStore(store)
+    if projects.primary:
+        projects.primary.close()
+    results = []
+    for project_path in project_paths:
+        result = export_one(projects, project_path, store, save_folder_for, native_cache)
+        print(format_result(result))
+        results.append(result)
+    return results
+
+
+def format_seconds(seconds):
+    return "-" if seconds is None else "{:.2f}s".format(seconds)
+
+
+def format_result(result):
+    line = "{}: open {}, export {} ({} files), close {}".format(
+        result.path,
+        format_seconds(result.open_seconds),
+        format_seconds(result.export_seconds),
+        result.files,
+        format_seconds(result.close_seconds),
+    )
+    if result.error:
+        line += ", FAILED {}".format(result.error)
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export several projects in one session")
+    parser.add_argument("projects", nargs="+", help="project files or a text file listing them")
+    parser.add_argument("--store", help="object store to export into instead of the save folders")
+    parser.add_argument("--native-cache", nargs="?", const=default_native_cache_folder(), metavar="FOLDER",
+                        help="reuse unchanged native exports from this cache folder (default folder: %(const)s)")
+    args = parser.parse_args(argv)
+
+    project_paths = []
+    for path in args.projects:
+        if path.lower().endswith(".project"):
+            project_paths.append(path)
+        else:
+            project_paths.extend(read_project_list(path))
+    native_cache = NativeExportCache(args.native_cache) if args.native_cache else None
+    start = time.time()
+    results = export_projects(project_paths, store=args.store, native_cache=native_cache)
+    failed = [result for result in results if result.error]
+    print("{} projects exported in {:.1f}s, {} failed.".format(len(results) - len(failed), time.time() - start,
+                                                              len(failed)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1186 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks for the parser and the mock script object trees.
+
+Run all benchmarks:      python -m codesys_bridge.benchmarks
+Run selected benchmarks: python -m codesys_bridge.benchmarks mock_tree
+
+Guard rails for the parser: python -m codesys_bridge.benchmarks --check
+times every scaling case at doubling input sizes, fails if doubling the input grows the time by
+more than MAX_DOUBLING_RATIO (accidental quadratic code) or if a time is more than the tolerance
+slower than the baseline stored for this machine and Python in the history file. The first
+passing check on a machine, or --save-baseline, stores the baseline; cases it has no entry for
+are added to it on their first passing check.
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import datetime
+import gc
+import io
+import json
+import math
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from .cs_export import (
+    build_element_tree,
+    code_matches,
+    cs_tree_dumps,
+    find_element_delimiters,
+    find_newline_positions,
+    get_element_type,
+    parse_iec_element,
+    merge_var_sections,
+    create_mock_cs_script_object,
+    create_lazy_mock_cs_script_object,
+)
+from .roundtrip import verify_tree
+from . import codesys_script_install
+from . import mock_scripting
+from .sharded_export import export_project_sharded
+from .selective_export import ExportFilter, export_selected
+from .cs_export import export_project
+from .export_archive import ExportArchive, export_project_to_archive
+from .cs_import import process_directory, update_textlists
+from .call_graph import CallGraph
+from .import_session import ImportSession
+from .io_map import IoMap
+from .migrate_legacy import migrate_tree
+from .device_descriptors import DeviceResolver
+from .tree_handle import TreeHandle
+from .tracing import trace_to
+from .var_table import parse_variables
+from .textlists import normalize_textlist
+from .tree_diff import FolderTree, diff_trees
+from .object_store import ObjectStore, StoredTree
+from .symbol_index import IDENTIFIER_PATTERN, SymbolIndex
+
+BENCHMARKS = {}
+SCALING_CASES = {}
+
+HISTORY_FILE = ".benchmark_history.json"
+HISTORY_LIMIT = 200  # runs kept in the history file
+SCALING_SIZES = (250, 500, 1000, 2000)  # methods of the generated function block
+MAX_DOUBLING_RATIO = 2.2
+TOLERANCE = 0.25  # allowed slowdown against the baseline
+
+
+def benchmark(func):
+    """Register a bench_* function under its name without the prefix."""
+    BENCHMARKS[func.__name__[len("bench_"):]] = func
+    return func
+
+
+def scaling_case(func):
+    """Register a scale_* function: size -> function to time, under its name without the prefix."""
+    SCALING_CASES[func.__name__[len("scale_"):]] = func
+    return func
+
+
+def generate_function_block(name="FB_Large", methods=200, actions=50, vars_per_section=20, lines_per_body=20):
+    """Generate a large but realistic FUNCTION_BLOCK text in the exported layout."""
+    lines = ["FUNCTION_BLOCK {}".format(name)]
+    for section in ("VAR_INPUT", "VAR_OUTPUT", "VAR"):
+        lines.append("    " + section)
+        for i in range(vars_per_section):
+            lines.append("        {}_{} : INT; (* {} variable *)".format(section.lower(), i, section))
+        lines.append("    END_VAR")
+    for m in range(methods):
+        lines.append("    ")
+        lines.append("    METHOD Method{}".format(m))
+        lines.append("        VAR_INPUT")
+        lines.append("            param : INT;")
+        lines.append("        END_VAR")
+        for i in range(lines_per_body):
+            lines.append("        var_{} := param + {}; // step {}".format(i % vars_per_section, i, i))
+        lines.append("    END_METHOD")
+    for a in range(actions):
+        lines.append("    ")
+        lines.append("    ACTION Action{}".format(a))
+        for i in range(lines_per_body):
+            lines.append("        var_{} := var_{} + 1;".format(i % vars_per_section, i % vars_per_section))
+        lines.append("    END_ACTION")
+    lines.append("    ")
+    for i in range(lines_per_body):
+        lines.append("    var_{} := {};".format(i % vars_per_section, i))
+    lines.append("END_FUNCTION_BLOCK")
+    return "\n".join(lines) + "\n"
+
+
+def measure(func, repeat=5):
+    """Return (best wall time in seconds, peak traced memory in bytes) of func()."""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def print_results(title, rows):
+    print(title)
+    for label, seconds, peak in rows:
+        print("  {:<40} {:>10.2f} ms {:>10.1f} KiB".format(label, seconds * 1000, peak / 1024.0))
+
+
+def scaling_text(methods):
+    return generate_function_block(methods=methods, actions=methods // 4, vars_per_section=5, lines_per_body=5)
+
+
+@scaling_case
+def scale_find_element_delimiters(methods):
+    text = scaling_text(methods)
+    newline_positions = find_newline_positions(text)
+    return lambda: find_element_delimiters(text, newline_positions)
+
+
+@scaling_case
+def scale_build_element_tree(methods):
+    text = scaling_text(methods)
+    delimiters = find_element_delimiters(text, find_newline_positions(text))
+    return lambda: build_element_tree(delimiters)
+
+
+@scaling_case
+def scale_merge_var_sections(methods):
+    tree = parse_iec_element(scaling_text(methods))
+    return lambda: merge_var_sections(tree)
+
+
+@scaling_case
+def scale_cs_tree_dumps(methods):
+    text = scaling_text(methods)
+    script_object = create_mock_cs_script_object(merge_var_sections(parse_iec_element(text)), text.splitlines(True))
+    return lambda: cs_tree_dumps(script_object)
+
+
+# Lexer inputs that made a backtracking comment and string pattern quadratic, by the repeated unit;
+# a scaling size of n repeats the unit 8 * n times
+ADVERSARIAL_UNITS = {
+    "unterminated_comments": "(* VAR\n",
+    "nested_comments": None,  # n * 8 openers, then the closers
+    "unterminated_escapes": "\"$\"",
+    "unterminated_quotes": "' VAR x\n",
+}
+
+
+def adversarial_text(kind, size):
+    count = size * 8
+    if kind == "nested_comments":
+        return "(* VAR " * count + "*) END_VAR " * count
+    return ADVERSARIAL_UNITS[kind] * count
+
+
+def adversarial_case(kind):
+    def case(size):
+        text = adversarial_text(kind, size)
+        newline_positions = find_newline_positions(text)
+        return lambda: find_element_delimiters(text, newline_positions)
+    case.__name__ = str("scale_lexer_" + kind)
+    return case
+
+
+def element_type_text(kind, size):
+    """adversarial_text without keywords, so get_element_type has to scan all of it"""
+    return adversarial_text(kind, size).replace("VAR", "x")
+
+
+def element_type_case(kind):
+    def case(size):
+        text = element_type_text(kind, size)
+        return lambda: get_element_type(text)
+    case.__name__ = str("scale_element_type_" + kind)
+    return case
+
+
+for _kind in sorted(ADVERSARIAL_UNITS):
+    scaling_case(adversarial_case(_kind))
+    scaling_case(element_type_case(_kind))
+
+
+def run_scaling(cases=None, sizes=SCALING_SIZES, repeat=7):
+    """
+    {case: {size: best seconds}} of the scaling cases. The sizes of a case are timed in turns,
+    so a slower phase of the machine affects all of them instead of one size.
+    """
+    results = {}
+    for name in cases or sorted(SCALING_CASES):
+        funcs = [(size, SCALING_CASES[name](size)) for size in sizes]
+        timings = dict((size, None) for size in sizes)
+        for _ in range(repeat):
+            for size, func in funcs:
+                seconds = measure_time(func, repeat=1)
+                timings[size] = seconds if timings[size] is None else min(timings[size], seconds)
+        results[name] = timings
+    return results
+
+
+def measure_time(func, repeat=5, min_time=0.02):
+    """
+    Best wall time of one func() call in seconds, like timeit: func runs in loops of at least
+    min_time with the garbage collector off, so short calls and collections don't add noise.
+    """
+    def run(loops):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(loops):
+                func()
+            return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    loops = 1
+    elapsed = run(loops)
+    while elapsed < min_time:
+        loops *= 2
+        elapsed = run(loops)
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, run(loops))
+    return best / loops
+
+
+def scaling_exponent(timings):
+    """Slope of log(time) over log(size), least squares: 1 for linear, 2 for quadratic code"""
+    points = [(math.log(size), math.log(seconds)) for size, seconds in timings.items()]
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    return (sum((x - mean_x) * (y - mean_y) for x, y in points) /
+            sum((x - mean_x) ** 2 for x, _ in points))
+
+
+def scaling_failures(results, max_ratio=MAX_DOUBLING_RATIO):
+    """Messages for every case whose time grows by more than max_ratio per doubling of the size"""
+    failures = []
+    for name, timings in sorted(results.items()):
+        ratio = 2 ** scaling_exponent(timings)
+        if ratio > max_ratio:
+            failures.append("{}: doubling the size takes {:.2f}x the time, allowed {:.2f}x".format(
+                name, ratio, max_ratio))
+    return failures
+
+
+def baseline_regressions(results, baseline, tolerance=TOLERANCE):
+    """Messages for every case more than tolerance slower than in baseline, geometric mean over the sizes"""
+    regressions = []
+    for name, timings in sorted(results.items()):
+        ratios = [seconds / baseline[name][size] for size, seconds in timings.items()
+                  if baseline.get(name, {}).get(size)]
+        if not ratios:
+            continue
+        ratio = math.exp(sum(math.log(r) for r in ratios) / len(ratios))
+        if ratio > 1 + tolerance:
+            regressions.append("{}: {:.2f}x the baseline time, allowed {:.2f}x".format(name, ratio, 1 + tolerance))
+    return regressions
+
+
+def environment_key():
+    """Baselines are only comparable on the same machine and Python"""
+    return "{} {} {} {}".format(platform.node(), platform.machine(), platform.python_implementation(),
+                                platform.python_version())
+
+
+class BenchmarkHistory(object):
+    """Scaling results of earlier runs and the baseline per environment, stored as JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {"baselines": {}, "runs": []}
+        if os.path.exists(path):
+            with io.open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def baseline(self, environment):
+        """{case: {size: seconds}} or None"""
+        stored = self.data["baselines"].get(environment)
+        if stored is None:
+            return None
+        return dict((name, dict((int(size), seconds) for size, seconds in timings.items()))
+                    for name, timings in stored.items())
+
+    def record(self, results, environment, baseline=False):
+        self.data["runs"].append({
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "environment": environment,
+            "results": results,
+        })
+        del self.data["runs"][:-HISTORY_LIMIT]
+        if baseline:
+            self.data["baselines"][environment] = results
+
+    def extend_baseline(self, results, environment):
+        """Add the results of cases the baseline of environment has no entry for"""
+        self.data["baselines"].setdefault(environment, {}).update(results)
+
+    def save(self):
+        with io.open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.data, indent=1, sort_keys=True))
+
+
+def check(history_path=HISTORY_FILE, tolerance=TOLERANCE, save_baseline=False, cases=None, sizes=SCALING_SIZES,
+          repeat=7):
+    """Run the scaling cases, compare them to the baseline and record them. Returns the failures."""
+    environment = environment_key()
+    history = BenchmarkHistory(history_path)
+    baseline = history.baseline(environment)
+    results = run_scaling(cases, sizes, repeat)
+
+    print("scaling: {}".format(environment))
+    for name, timings in sorted(results.items()):
+        references = (baseline or {}).get(name)
+        for size, seconds in sorted(timings.items()):
+            reference = (references or {}).get(size)
+            compared = " {:>6.2f}x baseline".format(seconds / reference) if reference else ""
+            print("  {:<40} {:>10.2f} ms{}".format("{} {}".format(name, size), seconds * 1000, compared))
+        print("  {:<40} {:>10.2f}x per doubling{}".format(name, 2 ** scaling_exponent(timings),
+                                                       "" if references else ", no baseline"))
+
+    failures = scaling_failures(results)
+    if baseline is not None:
+        failures.extend(baseline_regressions(results, baseline, tolerance))
+    # a failing first run would make the regression the reference
+    history.record(results, environment, baseline=save_baseline or (baseline is None and not failures))
+    if baseline is not None and not save_baseline:
+        # cases added since the baseline was stored get their first passing results as baseline
+        added = dict((name, timings) for name, timings in results.items()
+                     if name not in baseline and not scaling_failures({name: timings}))
+        if added:
+            history.extend_baseline(added, environment)
+            print("baseline added for {}".format(", ".join(sorted(added))))
+    history.save()
+    for failure in failures:
+        print("FAILED " + failure)
+    return failures
+
+
+@benchmark
+def bench_mock_tree(methods=2000):
+    """Parsing with and without element hashes; eager vs lazy mock trees: building, walking the
+    shape only, and full text materialization."""
+    text = generate_function_block(methods=methods, actions=methods // 4)
+    tree = merge_var_sections(parse_iec_element(text))
+    text_lines = text.splitlines(True)
+
+    def shape(root):
+        return [(child.type, child.get_name(), len(child.get_children())) for child in root.get_children()]
+
+    def full_text(root):
+        return [(child.textual_declaration.text, child.textual_implementation.text) for child in root.get_children()]
+
+    cases = [
+        ("parse", lambda: parse_iec_element(text)),
+        ("parse with hashes", lambda: parse_iec_element(text, hashes=True)),
+        ("eager build", lambda: create_mock_cs_script_object(tree, text_lines)),
+        ("lazy build", lambda: create_lazy_mock_cs_script_object(tree, text_lines)),
+        ("eager build + shape", lambda: shape(create_mock_cs_script_object(tree, text_lines))),
+        ("lazy build + shape", lambda: shape(create_lazy_mock_cs_script_object(tree, text_lines))),
+        ("eager build + text", lambda: full_text(create_mock_cs_script_object(tree, text_lines))),
+        ("lazy build + text", lambda: full_text(create_lazy_mock_cs_script_object(tree, text_lines))),
+    ]
+    rows = [(label,) + measure(func) for label, func in cases]
+    print_results("mock_tree: {} lines, {} methods".format(len(text_lines), methods), rows)
+    return rows
+
+
+def write_export_tree(root, files, folders=100, **fb_options):
+    """Write a synthetic export tree of generated function blocks below root."""
+    fb_options.setdefault("methods", 5)
+    fb_options.setdefault("actions", 2)
+    fb_options.setdefault("vars_per_section", 5)
+    fb_options.setdefault("lines_per_body", 5)
+    for i in range(files):
+        folder = os.path.join(root, "Application", "Folder{}".format(i % folders))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        name = "FB_{}".format(i)
+        with io.open(os.path.join(folder, name + ".st"), "w", encoding="utf-8") as f:
+            f.write(generate_function_block(name, **fb_options))
+
+
+@benchmark
+def bench_roundtrip(files=10000):
+    """Round-trip verification of a whole export tree, serial vs process pool."""
+    root = tempfile.mkdtemp()
+    try:
+        write_export_tree(root, files)
+        rows = []
+        for label, processes in (("serial", 1), ("process pool", None)):
+            start = time.perf_counter()
+            verify_tree(root, processes)
+            rows.append((label, time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("roundtrip: {} files".format(files), rows)
+    return rows
+
+
+@benchmark
+def bench_tree_diff(files=10000, changed=10):
+    """Element diff of two export trees differing in a few methods: folders vs object store refs."""
+    root = tempfile.mkdtemp()
+    try:
+        old = os.path.join(root, "old")
+        new = os.path.join(root, "new")
+        write_export_tree(old, files)
+        shutil.copytree(old, new)
+        for i in range(changed):
+            path = os.path.join(new, "Application", "Folder{}".format(i % 100), "FB_{}.st".format(i))
+            with io.open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            with io.open(path, "w", encoding="utf-8") as f:
+                f.write(text.replace("param : INT;", "param : DINT;", 1))
+        store = ObjectStore(os.path.join(root, "store"))
+        store.add_folder(old, "old")
+        store.add_folder(new, "new")
+
+        rows = []
+        for label, old_tree, new_tree in (("folders", FolderTree(old), FolderTree(new)),
+                                          ("store refs", StoredTree(store, "old"), StoredTree(store, "new"))):
+            start = time.perf_counter()
+            changes = diff_trees(old_tree, new_tree)
+            rows.append(("{}: {} changes".format(label, len(changes)), time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("tree_diff: {} files, {} changed".format(files, changed), rows)
+    return rows
+
+
+@benchmark
+def bench_symbol_index(files=10000, queries=100):
+    """Symbol index of an export tree: full build, no-op update, update after one change, queries."""
+    root = tempfile.mkdtemp()
+    try:
+        write_export_tree(root, files)
+        lines = 0
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                with io.open(os.path.join(dirpath, filename), encoding="utf-8") as f:
+                    lines += sum(1 for _ in f)
+        rows = []
+        with SymbolIndex(root) as index:
+            start = time.perf_counter()
+            index.update(processes=None)
+            rows.append(("build", time.perf_counter() - start, 0))
+            start = time.perf_counter()
+            index.update()
+            rows.append(("update, nothing changed", time.perf_counter() - start, 0))
+            path = os.path.join(root, "Application", "Folder0", "FB_0.st")
+            with io.open(path, "a", encoding="utf-8") as f:
+                f.write("\n")
+            start = time.perf_counter()
+            index.update()
+            rows.append(("update, one file changed", time.perf_counter() - start, 0))
+            start = time.perf_counter()
+            for i in range(queries):
+                index.find("FB_{}".format(i * (files // queries)))
+                index.find("var_input_{}".format(i % 5))
+            rows.append(("{} queries".format(2 * queries), time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("symbol_index: {} files, {} lines".format(files, lines), rows)
+    return rows
+
+
+@benchmark
+def bench_lsp_server(files=20000, requests=20):
+    """Language server latency on a large tree: symbols, definition, references and edits of an open document."""
+    import asyncio
+    from .lsp_server import LanguageServer, path_to_uri
+
+    root = tempfile.mkdtemp()
+    try:
+        write_export_tree(root, files)
+        with SymbolIndex(root) as index:
+            index.update(processes=None)
+        text = generate_function_block("FB_Open").replace("    END_VAR", "        pump : FB_17;\n    END_VAR", 1)
+        path = os.path.join(root, "Application", "FB_Open.st")
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        uri = path_to_uri(path)
+
+        async def run():
+            server = LanguageServer(lambda message: None)
+            await server.handle({"id": 0, "method": "initialize", "params": {"rootUri": path_to_uri(root)}})
+            await server.index_update
+            await server.handle({"method": "textDocument/didOpen", "params": {"textDocument": {
+                "uri": uri, "version": 1, "text": text}}})
+
+            async def timed(label, messages):
+                start = time.perf_counter()
+                for message in messages:
+                    await server.handle(message)
+                return ("{} x{}".format(label, requests), (time.perf_counter() - start) / requests, 0)
+
+            def at(method, line, character, i, **params):
+                params.update({"textDocument": {"uri": uri}, "position": {"line": line, "character": character}})
+                return {"id": i, "method": method, "params": params}
+
+            def edits(line):
+                messages = []
+                for i in range(requests):
+                    messages.append({"method": "textDocument/didChange", "params": {
+                        "textDocument": {"uri": uri},
+                        "contentChanges": [{"range": {"start": {"line": line, "character": 0},
+                                                      "end": {"line": line, "character": 0}}, "text": " "}]}})
+                    messages.append({"id": i, "method": "textDocument/documentSymbol",
+                                     "params": {"textDocument": {"uri": uri}}})
+                return messages
+
+            # "var_input_1 : INT; (* ... *)" on line 3 of the open FB, "pump : FB_17" on line 22,
+            # "var_0 := param + 0" on line 73
+            rows = [
+                await timed("documentSymbol, cached", [{"id": i, "method": "textDocument/documentSymbol",
+                                                       "params": {"textDocument": {"uri": uri}}}
+                                                      for i in range(requests)]),
+                await timed("edit in a body + documentSymbol", edits(74)),
+                await timed("edit in a declaration + documentSymbol", edits(3)),
+                await timed("definition, local variable", [at("textDocument/definition", 73, 9, i)
+                                                           for i in range(requests)]),
+                await timed("references, local variable", [at("textDocument/references", 73, 9, i)
+                                                           for i in range(requests)]),
+                await timed("definition, function block", [at("textDocument/definition", 22, 17, i)
+                                                           for i in range(requests)]),
+                await timed("references, function block", [at("textDocument/references", 22, 17, i)
+                                                           for i in range(requests)]),
+            ]
+            await server.handle({"id": 1, "method": "shutdown"})
+            server.index.close()
+            return rows
+
+        rows = asyncio.run(run())
+    finally:
+        shutil.rmtree(root)
+    print_results("lsp_server: {} files, latency per request".format(files), rows)
+    return rows
+
+
+@benchmark
+def bench_lexer(size=8000):
+    """find_element_delimiters and the symbol index token scan on the adversarial lexer inputs."""
+    rows = []
+    for kind in sorted(ADVERSARIAL_UNITS):
+        text = adversarial_text(kind, size)
+        newline_positions = find_newline_positions(text)
+        rows.append(("{} delimiters".format(kind),) +
+                    measure(lambda: find_element_delimiters(text, newline_positions), repeat=3))
+        rows.append(("{} identifiers".format(kind),) +
+                    measure(lambda: list(code_matches(IDENTIFIER_PATTERN, text)), repeat=3))
+        element_text = element_type_text(kind, size)
+        rows.append(("{} element type".format(kind),) + measure(lambda: get_element_type(element_text), repeat=3))
+    print_results("lexer: adversarial inputs of {} repeated units".format(size * 8), rows)
+    return rows
+
+
+def generate_io_gvl(variables=60000, first=0):
+    """
+    A GVL of I/O variables as written by the I/O mapping: AT addresses, comments, some attributes.
+    Variable i is bound in the bytes 4 * i to 4 * i + 3, so GVLs of consecutive ranges of
+    variables (first) don't share addresses.
+    """
+    types = [("BOOL", "X", None, 1), ("INT", "W", "0", 2), ("REAL", "D", "0.0", 4), ("WORD", "W", "16#0", 2)]
+    lines = ["{attribute 'qualified_only'}", "VAR_GLOBAL"]
+    for i in range(first, first + variables):
+        type_name, size, initial_value, size_bytes = types[i % len(types)]
+        direction = "I" if i % 2 else "Q"
+        address = "%{}{}{}".format(direction, size, 4 * i // size_bytes)
+        if size == "X":
+            address += ".0"
+        if i % 100 == 0:
+            lines.append("    // Module {}".format(i // 100))
+            lines.append("    {attribute 'hide'}")
+        lines.append("    io_{} AT {} : {}{}; // channel {}".format(
+            i, address, type_name, " := " + initial_value if initial_value else "", i % 16))
+    lines.append("END_VAR")
+    return "\n".join(lines) + "\n"
+
+
+@benchmark
+def bench_var_table(variables=60000, lookups=10000, rescans=20):
+    """Variable table of a large I/O GVL: parse, lookups by name and address, against scanning the text."""
+    text = generate_io_gvl(variables)
+    element = parse_iec_element(text)
+    rows = [("parse",) + measure(lambda: parse_variables(text, element), repeat=3)]
+    table = parse_variables(text, element)
+    names = ["io_{}".format(i * (variables // lookups)) for i in range(lookups)]
+    addresses = [variable.address for variable in (table.get(name) for name in names) if variable.address]
+
+    def by_name():
+        for name in names:
+            table.get(name)
+    rows.append(("{} lookups by name".format(lookups),) + measure(by_name))
+
+    def by_address():
+        for address in addresses:
+            table.at_address(address)
+    rows.append(("{} lookups by address".format(len(addresses)),) + measure(by_address))
+    rows.append(("variables of type BOOL",) + measure(lambda: table.rows_of_type("BOOL")))
+
+    def rescan():
+        for name in names[::len(names) // rescans]:
+            re.search(r"^\s*{}\b[^:]*:\s*([^;:]+)".format(name), text, re.MULTILINE)
+    rows.append(("{} lookups scanning the text".format(rescans),) + measure(rescan, repeat=3))
+    print_results("var_table: GVL of {} variables, {} types".format(len(table), len(table.type_names)), rows)
+    return rows
+
+
+@benchmark
+def bench_io_map(files=200, variables_per_file=500, queries=1000):
+    """Address map of a tree of I/O GVLs: build, incremental updates, overlap detection, address queries."""
+    root = tempfile.mkdtemp()
+    try:
+        folder = os.path.join(root, "PLC.dev", "Application")
+        os.makedirs(folder)
+        for i in range(files):
+            with io.open(os.path.join(folder, "GVL_IO_{}.st".format(i)), "w", encoding="utf-8") as f:
+                f.write(generate_io_gvl(variables_per_file, first=i * variables_per_file))
+        # one binding on a word already used by another file
+        with io.open(os.path.join(folder, "PRG_Main.st"), "w", encoding="utf-8") as f:
+            f.write("PROGRAM PRG_Main\nVAR\n    wShared AT %IW2 : WORD;\nEND_VAR\nEND_PROGRAM\n")
+        rows = []
+        io_map = IoMap(root)
+        start = time.perf_counter()
+        io_map.update(processes=None)
+        rows.append(("build", time.perf_counter() - start, 0))
+        io_map.save()
+        start = time.perf_counter()
+        IoMap(root).update()
+        rows.append(("load and update, nothing changed", time.perf_counter() - start, 0))
+        with io.open(os.path.join(folder, "GVL_IO_0.st"), "a", encoding="utf-8") as f:
+            f.write("\n")
+        start = time.perf_counter()
+        io_map.update()
+        rows.append(("update, one file changed", time.perf_counter() - start, 0))
+        start = time.perf_counter()
+        overlaps = io_map.overlaps()
+        rows.append(("overlaps: {} found".format(len(overlaps)), time.perf_counter() - start, 0))
+        addresses = [binding.address for binding in io_map.bindings[::len(io_map.bindings) // queries]]
+        start = time.perf_counter()
+        for address in addresses:
+            io_map.overlapping(address)
+        rows.append(("{} address queries".format(len(addresses)), time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("io_map: {} files, {} bindings".format(files + 1, len(io_map.bindings)), rows)
+    return rows
+
+
+def write_call_tree(root, pous=1000, methods=10, lines_per_method=20, folders=10):
+    """
+    Function blocks FB_<i> calling the methods of an instance of FB_<i + 1> and their own, a
+    library function, and PRG_Main calling FB_0. Returns the number of lines written.
+    """
+    lines_written = 0
+    for i in range(pous):
+        lines = ["FUNCTION_BLOCK FB_{}".format(i), "VAR", "    fbNext : FB_{};".format(i + 1),
+                 "    x : INT;", "END_VAR"]
+        for m in range(methods):
+            lines.extend(["", "    METHOD M_{}".format(m)])
+            for j in range(lines_per_method):
+                if j == 0 and i + 1 < pous:
+                    lines.append("        fbNext.M_{}(); // next".format(m))
+                elif j == 1 and m + 1 < methods:
+                    lines.append("        M_{}();".format(m + 1))
+                elif j % 5 == 2:
+                    lines.append("        x := F_Scale(x, {}); (* library *)".format(j))
+                else:
+                    lines.append("        x := x + {};".format(j))
+            lines.append("    END_METHOD")
+        lines.extend(["", "M_0();", "END_FUNCTION_BLOCK"])
+        folder = os.path.join(root, "Application", "Folder{}".format(i % folders))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        with io.open(os.path.join(folder, "FB_{}.st".format(i)), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        lines_written += len(lines)
+    with io.open(os.path.join(root, "Application", "PRG_Main.st"), "w", encoding="utf-8") as f:
+        f.write("PROGRAM PRG_Main\nVAR\n    fb0 : FB_0;\nEND_VAR\nfb0();\nEND_PROGRAM\n")
+    return lines_written + 6
+
+
+@benchmark
+def bench_call_graph(pous=1000, methods=10):
+    """Call graph: build, updates after no change, a re-export with equal content and one change, queries."""
+    root = tempfile.mkdtemp()
+    try:
+        lines = write_call_tree(root, pous, methods)
+        rows = []
+        graph = CallGraph(root)
+        start = time.perf_counter()
+        graph.update(processes=None)
+        graph.edges
+        rows.append(("build", time.perf_counter() - start, 0))
+        graph.save()
+        start = time.perf_counter()
+        CallGraph(root).update()
+        rows.append(("load and update, nothing changed", time.perf_counter() - start, 0))
+        write_call_tree(root, pous, methods)
+        start = time.perf_counter()
+        graph.update()
+        rows.append(("update after a re-export, same content", time.perf_counter() - start, 0))
+        path = os.path.join(root, "Application", "Folder0", "FB_0.st")
+        with io.open(path, "a", encoding="utf-8") as f:
+            f.write("\n")
+        start = time.perf_counter()
+        graph.update()
+        graph.edges
+        rows.append(("update and resolve, one file changed", time.perf_counter() - start, 0))
+        start = time.perf_counter()
+        impact = graph.impact("FB_{}.M_{}".format(pous - 1, methods - 1))
+        rows.append(("impact: {} elements".format(len(impact)), time.perf_counter() - start, 0))
+        start = time.perf_counter()
+        unreachable = graph.unreachable()
+        rows.append(("unreachable: {} elements".format(len(unreachable)), time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("call_graph: {} files, {} lines, {} edges".format(pous + 1, lines, len(graph.edges)), rows)
+    return rows
+
+
+IMPORT_TIME_SCRIPT = """\
+import time
+start = time.perf_counter()
+import {}
+print(time.perf_counter() - start)
+"""
+
+
+def measure_import_time(modules, runs=5):
+    """Import modules in fresh interpreters, return the list of import times in seconds."""
+    script = IMPORT_TIME_SCRIPT.format(", ".join(modules))
+    # codesys_bridge importable from any working directory, like in the calling interpreter
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(path for path in (package_parent, env.get("PYTHONPATH")) if path)
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", script], env=env)
+        timings.append(float(output.decode("ascii").strip()))
+    return timings
+
+
+@benchmark
+def bench_tracing(devices=2, folders=10, pous_per_folder=20):
+    """Export of a mock project with the tracer stopped and running; prints the span summary."""
+    root = tempfile.mkdtemp()
+    try:
+        project = generate_mock_project(os.path.join(root, "machine.project"), devices, folders, pous_per_folder)
+        save_folder = os.path.join(root, "st_source")
+        def export():
+            export_project(project, save_folder)
+        rows = [("tracer stopped",) + measure(export, repeat=3)]
+        with trace_to(os.path.join(root, "export.trace.json"), summary=False) as tracer:
+            export()
+            spans = len(tracer.events)
+            rows.append(("tracer running: {} spans".format(spans),) + measure(export, repeat=3))
+            del tracer.events[spans:]
+    finally:
+        shutil.rmtree(root)
+    print_results("tracing: export of {} function blocks".format(devices * folders * pous_per_folder), rows)
+    print(tracer.format_summary())
+    return rows
+
+
+@benchmark
+def bench_import_time(modules=("codesys_bridge.cs_export", "codesys_bridge.cs_import")):
+    """Cold import of the parser modules on plain CPython, without the script engine."""
+    timings = measure_import_time(modules)
+    rows = [(", ".join(modules), min(timings), 0)]
+    print_results("import_time: best of {} fresh interpreters".format(len(timings)), rows)
+    return rows
+
+
+def generate_mock_project(path, devices=4, folders=5, pous_per_folder=10, latency=0.0, **fb_options):
+    """A mock project with devices, each with one application of folders of generated function blocks."""
+    fb_options.setdefault("methods", 5)
+    fb_options.setdefault("actions", 2)
+    fb_options.setdefault("vars_per_section", 5)
+    fb_options.setdefault("lines_per_body", 5)
+    project = mock_scripting.MockProject(path, latency=latency)
+    for d in range(devices):
+        app_folders = []
+        for f in range(folders):
+            pous = [
+                mock_scripting.textual_object(generate_function_block("FB_{}_{}_{}".format(d, f, p), **fb_options))
+                for p in range(pous_per_folder)
+            ]
+            app_folders.append(mock_scripting.folder("Folder{}".format(f), *pous))
+        app_folders.append(mock_scripting.library_manager(libraries=["Standard", "Util"]))
+        app_folders.append(mock_scripting.textlist("Texts{}".format(d), "Id;Default\nT1;Text 1\n"))
+        project.add(mock_scripting.device("PLC{}".format(d), mock_scripting.application("Application", *app_folders)))
+    return project
+
+
+LEGACY_DECLARATION = "(*#-#-#-#-#-#-#-#-#-#---Declaration---#-#-#-#-#-#-#-#-#-#-#-#-#*)\r\n"
+LEGACY_IMPLEMENTATION = "(*#-#-#-#-#-#-#-#-#-#---Implementation---#-#-#-#-#-#-#-#-#-#-#-#-#*)\r\n"
+LEGACY_SUFFIXES = {"pou": "pou", "gvl": "gvl", "dut": "dut", "itf": "itf", "m": "m", "ACTION": "act",
+                   "prop": "prop", "pm": "pm", "dev": "dev", "tl": "tl", "lib": "lib"}
+
+
+def write_legacy_export(obj, directory):
+    """Write obj like the legacy export.py: IDE texts with \\r\\n behind markers, written in text mode on Windows."""
+    suffix = LEGACY_SUFFIXES.get(obj.object_type, "")
+    file_name = obj.name + "." + suffix if suffix else obj.name
+    text = ""
+    if obj.object_type == "dev":
+        text = "type=4096\nid=1001 {}\nver={}".format(obj.name, obj.version)
+    if obj._declaration is not None:
+        text += LEGACY_DECLARATION + obj._declaration.text.replace("\n", "\r\n")
+    if obj._implementation is not None:
+        text += LEGACY_IMPLEMENTATION + obj._implementation.text.replace("\n", "\r\n")
+    if obj.object_type == "lib":
+        obj.project.export_native([obj], os.path.join(directory, file_name))
+    elif obj.object_type == "tl":
+        obj.export(os.path.join(directory, file_name))
+    if obj.children:
+        directory = os.path.join(directory, file_name)
+        os.makedirs(directory)
+    if text:
+        with io.open(os.path.join(directory, file_name), "wb") as f:
+            f.write(text.replace("\n", "\r\n").encode("utf-8"))
+    for child in obj.children:
+        write_legacy_export(child, directory)
+
+
+@benchmark
+def bench_sharded_export(shards=(1, 2, 4), latency=0.0005):
+    """Sharded export of a mock project whose API calls each take `latency` seconds."""
+    root = tempfile.mkdtemp()
+    try:
+        project_path = os.path.join(root, "machine.project")
+        mock_scripting.save_mock_project(generate_mock_project(project_path, latency=latency))
+        rows = []
+        for count in shards:
+            start = time.perf_counter()
+            export_project_sharded(project_path, os.path.join(root, "st_source"), count,
+                                   opener=mock_scripting.open_mock_project)
+            rows.append(("{} shard(s)".format(count), time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("sharded_export: {:.1f} ms per API call".format(latency * 1000), rows)
+    return rows
+
+
+@benchmark
+def bench_selective_export(latency=0.0005):
+    """Export of a whole mock project vs one folder of it merged into the exported tree."""
+    root = tempfile.mkdtemp()
+    try:
+        project = generate_mock_project(os.path.join(root, "machine.project"), latency=latency)
+        save_folder = os.path.join(root, "st_source")
+        rows = []
+        for label in ("full export", "one folder"):
+            project.calls.clear()
+            start = time.perf_counter()
+            if label == "full export":
+                export_project(project, save_folder)
+            else:
+                export_selected(project, save_folder, ExportFilter(include=["PLC0/Plc Logic/Application/Folder0"]))
+            rows.append(("{}: {} calls".format(label, sum(project.calls.values())), time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("selective_export: {:.1f} ms per API call".format(latency * 1000), rows)
+    return rows
+
+
+@benchmark
+def bench_archive_export(devices=4, folders=25, pous_per_folder=25, reads=200):
+    """Export of a mock project to a folder of files vs a single archive, and random access reads."""
+    root = tempfile.mkdtemp()
+    try:
+        project = generate_mock_project(os.path.join(root, "machine.project"), devices, folders, pous_per_folder)
+        save_folder = os.path.join(root, "st_source")
+        archive_path = os.path.join(root, "st_source.zip")
+        rows = []
+        start = time.perf_counter()
+        run = export_project(project, save_folder)
+        rows.append(("export to files", time.perf_counter() - start, 0))
+        start = time.perf_counter()
+        export_project_to_archive(project, archive_path)
+        rows.append(("export to archive", time.perf_counter() - start, 0))
+
+        members = [path.replace(os.sep, "/") for path in run.written if path.endswith(".st")][:reads]
+        start = time.perf_counter()
+        with ExportArchive(archive_path) as archive:
+            for member in members:
+                archive.read_text(member)
+        rows.append(("open archive + {} reads by path".format(len(members)), time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("archive_export: {} files".format(len(run.written)), rows)
+    return rows
+
+
+def generate_textlist(entries, languages, seed=0):
+    """Text list content with entries in reverse Id order, so normalizing has to sort."""
+    lines = [";".join(["Id", "Default"] + languages)]
+    for i in reversed(range(entries)):
+        lines.append(";".join(["T{:06d}".format(i), "Text {} {}".format(i, seed)] +
+                              ["{} {}".format(language, i) for language in languages]))
+    return "\n".join(lines) + "\n"
+
+
+@benchmark
+def bench_textlists(entries=50000, languages=("en", "fr", "es", "it", "zh", "ja", "ko", "de"), lists=200, changed=2):
+    """Normalizing one large text list, and updating many text lists of which a few changed."""
+    root = tempfile.mkdtemp()
+    try:
+        rows = []
+        path = os.path.join(root, "Large.tl")
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(generate_textlist(entries, list(languages)))
+        start = time.perf_counter()
+        normalize_textlist(path, path)
+        rows.append(("normalize {} entries x {} languages".format(entries, len(languages)),
+                     time.perf_counter() - start, 0))
+
+        project = mock_scripting.MockProject(os.path.join(root, "machine.project"), [
+            mock_scripting.application("Application", *[
+                mock_scripting.textlist("Texts{}".format(i), generate_textlist(100, ["en", "de"], i))
+                for i in range(lists)
+            ])
+        ])
+        save_folder = os.path.join(root, "st_source")
+        export_project(project, save_folder)
+        state_path = os.path.join(root, "textlists.json")
+        for label in ("first update, all {} lists".format(lists), "update after {} changed".format(changed)):
+            project.calls.clear()
+            start = time.perf_counter()
+            update_textlists(project, save_folder, state_path)
+            rows.append(("{}: {} imported".format(label, project.calls["importfile"]), time.perf_counter() - start, 0))
+            for i in range(changed):
+                with io.open(os.path.join(save_folder, "Application", "Texts{}.tl".format(i)), "a",
+                             encoding="utf-8") as f:
+                    f.write("TX;changed;en;de\n")
+    finally:
+        shutil.rmtree(root)
+    print_results("textlists", rows)
+    return rows
+
+
+# Minimal scriptengine module: an empty primary project, enough to run the export scripts
+STUB_SCRIPTENGINE = """\
+class Project(object):
+    def __init__(self, path):
+        self.path = path
+
+    def get_children(self, recursive=False):
+        return []
+
+
+class Projects(object):
+    def __init__(self, path):
+        self.primary = Project(path)
+
+
+projects = Projects({project_path!r})
+"""
+
+# Runs a toolbar script several times in one interpreter, like repeated clicks in one IDE session
+SCRIPT_CLICKS = """\
+import sys, time
+sys.path.insert(0, {stub_dir!r})
+script = {script!r}
+timings = []
+for _ in range({clicks}):
+    start = time.perf_counter()
+    with open(script) as f:
+        code = compile(f.read(), script, "exec")
+    exec(code, {{"__name__": "__main__", "__file__": script}})
+    timings.append(time.perf_counter() - start)
+print(" ".join(str(t) for t in timings))
+"""
+
+
+def scan_path(node, names):
+    """Path lookup one level at a time with a get_name() per sibling, like export_sync.get_by_name_hierarchy"""
+    for name in names:
+        for child in node.get_children(False):
+            if child.get_name(False) == name:
+                node = child
+                break
+        else:
+            return None
+    return node
+
+
+@benchmark
+def bench_tree_handle(latency=0.0001):
+    """Resolve the path of every POU of a mock project: sibling scans vs a TreeHandle."""
+    project = generate_mock_project("machine.project", latency=latency)
+    paths = []
+    for device in project.children:
+        for folder in device.children[0].children[0].children:
+            for pou in folder.children:
+                paths.append([device.name, "Plc Logic", "Application", folder.name, pou.name])
+    rows = []
+    for label in ("sibling scan", "tree handle"):
+        project.calls.clear()
+        start = time.perf_counter()
+        tree = TreeHandle(project)
+        for names in paths:
+            if label == "sibling scan":
+                scan_path(project, names)
+            else:
+                tree.get(names)
+        rows.append(("{}: {} calls".format(label, sum(project.calls.values())), time.perf_counter() - start, 0))
+    print_results("tree_handle: {} paths, {} s per call".format(len(paths), latency), rows)
+    return rows
+
+
+@benchmark
+def bench_device_resolver(devices=300, kinds=3, latency=0.002):
+    """Device lookups of an import: one per device like load.create_dev vs DeviceResolver, cold and cached."""
+    identifications = [(4096, "101a 075{}".format(i % kinds), "5.1.10.10") for i in range(devices)]
+    root = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(root, "devices.json")
+        rows = []
+        for label in ("per device", "resolver", "resolver, cache file"):
+            repository = mock_scripting.MockDeviceRepository(identifications, latency)
+            start = time.perf_counter()
+            if label == "per device":
+                for identification in identifications:
+                    repository.get_device(repository.create_device_identification(*identification))
+            else:
+                resolver = DeviceResolver(repository, cache_path)
+                resolver.validate([(None, identification) for identification in identifications])
+                resolver.save()
+            rows.append(("{}: {} repository calls".format(label, sum(repository.calls.values())),
+                         time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("device_resolver: {} devices of {} kinds, {} s per call".format(devices, kinds, latency), rows)
+    return rows
+
+
+@benchmark
+def bench_migrate_legacy(devices=4, folders=25, pous_per_folder=40):
+    """Migration of a legacy marker export tree to the current layout, serial vs process pool."""
+    root = tempfile.mkdtemp()
+    try:
+        legacy = os.path.join(root, "legacy")
+        os.makedirs(legacy)
+        project = generate_mock_project(os.path.join(root, "machine.project"), devices, folders, pous_per_folder)
+        for obj in project.children:
+            write_legacy_export(obj, legacy)
+        rows = []
+        for label, processes in (("serial", 1), ("process pool", None)):
+            start = time.perf_counter()
+            written, problems = migrate_tree(legacy, os.path.join(root, "migrated"), processes)
+            rows.append(("{}: {} files, {} problems".format(label, written, len(problems)),
+                         time.perf_counter() - start, 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("migrate_legacy: {} function blocks".format(devices * folders * pous_per_folder), rows)
+    return rows
+
+
+def write_stub_scriptengine(directory, project_path):
+    with io.open(os.path.join(directory, "scriptengine.py"), "w", encoding="utf-8") as f:
+        f.write(STUB_SCRIPTENGINE.format(project_path=project_path))
+
+
+def measure_script_clicks(script, stub_dir, clicks=3):
+    """Run script clicks times in a fresh interpreter with the stub scriptengine importable.
+    Returns the list of per-click times in seconds, the first one is the cold start."""
+    env = dict(os.environ)
+    env.pop("PYTHONPATH", None)
+    output = subprocess.check_output(
+        [sys.executable, "-c", SCRIPT_CLICKS.format(stub_dir=stub_dir, script=script, clicks=clicks)],
+        cwd=stub_dir,
+        env=env,
+    )
+    return [float(t) for t in output.decode("utf-8").splitlines()[-1].split()]
+
+
+@benchmark
+def bench_import_session(latency=0.0005):
+    """Import of an export folder into a new mock project, immediate calls vs. an ImportSession."""
+    root = tempfile.mkdtemp()
+    mock_scripting.install()
+    try:
+        source = os.path.join(root, "st_source")
+        export_project(generate_mock_project(os.path.join(root, "machine.project")), source)
+        rows = []
+        for label in ("immediate", "deferred"):
+            project = mock_scripting.MockProject(os.path.join(root, "imported.project"), latency=latency)
+            start = time.perf_counter()
+            if label == "deferred":
+                session = ImportSession(project)
+                process_directory(session.root, source)
+                session.save()
+            else:
+                process_directory(project, source)
+                project.save()
+            seconds = time.perf_counter() - start
+            rows.append(("{}: {} calls, {} find, {} replace".format(
+                label, sum(project.calls.values()), project.calls["find"], project.calls["replace"]), seconds, 0))
+    finally:
+        mock_scripting.uninstall()
+        shutil.rmtree(root)
+    print_results("import_session: {} s latency per call".format(latency), rows)
+    return rows
+
+
+@benchmark
+def bench_script_startup(clicks=5):
+    """Toolbar script start: the standalone cs_export.py vs the installed bundle launcher."""
+    root = tempfile.mkdtemp()
+    try:
+        stub_dir = os.path.join(root, "engine")
+        install_dir = os.path.join(root, "Script Commands")
+        os.makedirs(stub_dir)
+        os.makedirs(install_dir)
+        write_stub_scriptengine(stub_dir, os.path.join(root, "projects", "machine", "machine.project"))
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        standalone = os.path.join(install_dir, "cs_export_standalone.py")
+        shutil.copy2(os.path.join(package_dir, "cs_export.py"), standalone)
+        launcher_name, _ = codesys_script_install.install_bundle(install_dir, package_dir)
+
+        rows = []
+        for label, script in (("standalone cs_export.py", standalone), ("bundle launcher", os.path.join(install_dir, launcher_name))):
+            timings = measure_script_clicks(script, stub_dir, clicks)
+            rows.append((label + ", first click", timings[0], 0))
+            rows.append((label + ", next clicks", min(timings[1:]), 0))
+    finally:
+        shutil.rmtree(root)
+    print_results("script_startup: stub script engine, {} clicks per session".format(clicks), rows)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run codesys_bridge benchmarks")
+    parser.add_argument("names", nargs="*", help="benchmarks to run: {}".format(", ".join(sorted(BENCHMARKS))))
+    parser.add_argument("--check", action="store_true",
+                        help="run the scaling cases against the baseline instead, exit 1 on failures")
+    parser.add_argument("--history", default=HISTORY_FILE, help="history file (default: %(default)s)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed slowdown against the baseline (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args(argv)
+    if args.check:
+        return 1 if check(args.history, args.tolerance, args.save_baseline) else 0
+    for name in args.names or sorted(BENCHMARKS):
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
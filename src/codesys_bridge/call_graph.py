@@ -0,0 +1,512 @@
+# -*- coding: utf-8 -*-
+"""
+Call graph of an exported source tree, keyed by element path ("FB_Motor", "FB_Motor.M_Start").
+
+Every implementation (PROGRAM, FUNCTION_BLOCK, FUNCTION, METHOD, ACTION) is scanned for
+calls, name( or a.b(, outside comments and strings. The calls are resolved project-wide:
+
+    M_Start()            method or action of the own function block or its bases, or a POU
+    fbAxis(...)          instance of FB_Axis: the body of FB_Axis
+    fbAxis.M_Home()      FB_Axis.M_Home, or the method of a base of FB_Axis
+    THIS^.M() SUPER^.M() the own or the base function block
+    GVL_IO.fbPump()      instance declared in the GVL
+
+Declared instances are edges of their own ("instance"), like a function block's base
+("extends") and the dispatch from a method of a base or an interface to its overrides and
+implementations ("override", "implementation"), so impact() and unreachable() see code that is
+only called through an interface.
+
+The facts of every file (definitions, variables of function block types, call tokens) are
+kept in a cache (default <root>/.call_graph/facts.json, with a .gitignore) by the hash of the
+file, so files rewritten with the same content by the next export are not parsed again; new and
+changed files are scanned in worker processes. The resolution is cheap and runs after every update:
+
+    graph = CallGraph(st_source)
+    graph.update(processes=None)
+    graph.save()
+    graph.impact("FB_Axis.M_Home")  # elements calling it, directly or through others
+    graph.unreachable()             # not reachable from any PROGRAM
+
+Element names are unique in a project; in trees of several applications the first definition
+of a name wins.
+
+Usage: python -m codesys_bridge.call_graph <st_source> [--callers|--callees|--impact PATH] [--dead]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+from collections import defaultdict, namedtuple, deque
+
+from .cs_export import (
+    code_matches,
+    code_pattern,
+    find_newline_positions,
+    get_line_number,
+    is_var_section,
+    make_cache_folder,
+    parse_iec_element,
+)
+from .cs_import import read_st_file
+from .roundtrip import find_st_files
+from .symbol_index import KEYWORDS
+from .var_table import parse_variables
+
+CACHE_FOLDER = ".call_graph"
+CACHE_VERSION = 2
+
+# [i], [i, j], [a[i]] after a name
+INDEX = r"(?:\s*\[(?:[^\[\]]|\[[^\[\]]*\])*\])"
+INDEX_PATTERN = re.compile(INDEX)
+
+# a.b^.c( and aAxes[i].M_Home( at the start of a name, not inside a.b.c
+CALL_PATTERN = code_pattern(
+    r"(?<![\w.^])(?P<callee>(?:[A-Za-z_]\w*{index}*\^?\s*\.\s*)*[A-Za-z_]\w*{index}*)\s*\(".format(index=INDEX))
+
+# Keyword line of an element, with access modifiers and the EXTENDS and IMPLEMENTS clauses
+DEFINITION_PATTERN = re.compile(
+    r"\b(?P<type>FUNCTION_BLOCK|FUNCTION|INTERFACE|PROGRAM|METHOD|ACTION)\s+"
+    r"(?:(?:PUBLIC|PRIVATE|PROTECTED|INTERNAL|FINAL|ABSTRACT)\s+)*(?P<name>[A-Za-z_]\w*)"
+    r"(?:[^\n]*?\bEXTENDS\s+(?P<extends>[\w.]+(?:\s*,\s*[\w.]+)*))?"
+    r"(?:[^\n]*?\bIMPLEMENTS\s+(?P<implements>[\w.]+(?:\s*,\s*[\w.]+)*))?",
+    re.IGNORECASE)
+
+# Function block type of a variable: FB_X, ARRAY[..] OF FB_X, REFERENCE TO / POINTER TO FB_X, FB_X(args)
+VARIABLE_TYPE_PATTERN = re.compile(
+    r"(?P<array>ARRAY\s*\[.*\]\s*OF\s+)?(?P<reference>(?:REFERENCE|POINTER)\s+TO\s+)?(?P<type>[A-Za-z_][\w.]*)",
+    re.IGNORECASE)
+
+IMPLEMENTATION_TYPES = frozenset(["PROGRAM", "FUNCTION_BLOCK", "FUNCTION", "METHOD", "ACTION"])
+CONTROL_KEYWORDS = frozenset(["if", "elsif", "while", "until", "case", "for", "return", "then", "do", "of", "to",
+                              "by", "and", "or", "xor", "not", "mod", "and_then", "or_else"])
+# Called by the runtime for every instance
+IMPLICIT_METHODS = frozenset(["fb_init", "fb_reinit", "fb_exit"])
+
+Definition = namedtuple("Definition", ["path", "type", "extends", "implements", "file", "line"])
+# callee: resolved element path, None if not defined in the tree (libraries); text: as written
+Edge = namedtuple("Edge", ["caller", "callee", "kind", "text", "file", "line"])
+
+
+def file_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def split_names(names):
+    return [name.strip() for name in names.split(",")] if names else []
+
+
+def scan_text(text, gvl_name=None):
+    """
+    Facts of an ST text, as lists for the JSON cache:
+    definitions [path, type, extends, [implements], line]
+    variables [scope, name, type, instance], only of non-elementary types
+    calls [caller path, callee as written, line]
+    Variables of a GVL (a VAR_GLOBAL file) have gvl_name as scope.
+    """
+    element = parse_iec_element(text)
+    newline_positions = find_newline_positions(text)
+    facts = {"definitions": [], "variables": [], "calls": []}
+    if element is None:
+        return facts
+
+    def offset(line):
+        return newline_positions[line - 2] + 1 if line > 1 else 0
+
+    def line_end(line):
+        return newline_positions[line - 1] if line <= len(newline_positions) else len(text)
+
+    scopes = {}  # lower case element path as in parse_variables: element path
+
+    def visit(element, prefix, parsed_prefix):
+        if is_var_section(element.type) or element.type == "TYPE":
+            return
+        keyword_line = element.start_segment.end_line
+        m = DEFINITION_PATTERN.search(text, offset(keyword_line), line_end(keyword_line))
+        # the parser takes "METHOD PUBLIC M_Start" for a method named PUBLIC
+        name = m.group("name") if m else element.name
+        path = prefix + "." + name if prefix else name
+        parsed_path = parsed_prefix + "." + element.name if parsed_prefix else element.name
+        scopes[parsed_path.lower()] = path
+        extends = split_names(m.group("extends"))[:1] if m else []
+        facts["definitions"].append([path, element.type, extends[0] if extends else None,
+                                     split_names(m.group("implements")) if m else [], keyword_line])
+        if element.type in IMPLEMENTATION_TYPES:
+            body = element.body_segment
+            if body.start_line <= body.end_line:
+                pending = [(offset(body.start_line), line_end(body.end_line))]
+                while pending:
+                    start, end = pending.pop()
+                    for call in code_matches(CALL_PATTERN, text, start, end):
+                        callee = call.group("callee")
+                        if callee.lower() in CONTROL_KEYWORDS:
+                            continue
+                        facts["calls"].append([path, re.sub(r"\s+", "", callee),
+                                               get_line_number(call.start(), newline_positions)])
+                        if "[" in callee:
+                            # calls in the index expressions, aAxes[GetIndex()].M_Home()
+                            pending.append((call.start("callee") + callee.index("["), call.end("callee")))
+        for sub in element.sub_elements:
+            visit(sub, path, parsed_path)
+
+    visit(element, "", "")
+    table = parse_variables(text, element)
+    for row, type_name in enumerate(table.type_names[type_id] for type_id in table.type_ids):
+        m = VARIABLE_TYPE_PATTERN.match(type_name)
+        if m is None or m.group("type").lower() in KEYWORDS:
+            continue
+        scope = table.sections[table.section_ids[row]][0]
+        scope = scopes.get(scope.lower(), scope) if scope else gvl_name
+        facts["variables"].append([scope, table.names[row], m.group("type"), not m.group("reference")])
+    return facts
+
+
+def scan_file(path):
+    """(path, facts, problem or None)"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return path, scan_text(read_st_file(path), name), None
+    except (IOError, OSError) as e:
+        return path, None, "not read: {}".format(e)
+    except (ValueError, AssertionError) as e:
+        return path, None, "not parsed: {}".format(e)
+
+
+def scan_files(paths, processes=None, chunksize=16):
+    if processes == 1 or len(paths) < chunksize * 2:
+        return map(scan_file, paths)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return list(pool.imap_unordered(scan_file, paths, chunksize))
+    finally:
+        pool.close()
+        pool.join()
+
+
+class CallGraph(object):
+    def __init__(self, root, cache_path=None):
+        self.root = root
+        if cache_path is None:
+            cache_path = os.path.join(make_cache_folder(os.path.join(root, CACHE_FOLDER)), "facts.json")
+        self.cache_path = cache_path
+        # relative path: {"size", "mtime", "hash", "facts" or None, "problem"}
+        self.files = {}
+        self.changed = False
+        self._resolved = None
+        if os.path.exists(cache_path):
+            try:
+                with io.open(cache_path, "r", encoding="utf-8") as f:
+                    cache = json.load(f)
+                if cache.get("version") == CACHE_VERSION:
+                    self.files = cache["files"]
+            except ValueError:
+                pass
+
+    def update(self, processes=1):
+        """
+        Re-scan new files and files whose content changed, drop removed ones.
+
+        Returns:
+            tuple: (number of files scanned, number of files removed)
+        """
+        seen = set()
+        changed = []
+        hashes = {}
+        for full_path in find_st_files(self.root):
+            path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+            seen.add(path)
+            stat = os.stat(full_path)
+            known = self.files.get(path)
+            if known is not None and (known["size"], known["mtime"]) == (stat.st_size, stat.st_mtime):
+                continue
+            with io.open(full_path, "rb") as f:
+                content_hash = file_hash(f.read())
+            if known is not None and known["hash"] == content_hash:
+                # written again with the same content, e.g. by the next export
+                known["size"], known["mtime"] = stat.st_size, stat.st_mtime
+                self.changed = True
+                continue
+            hashes[path] = (stat.st_size, stat.st_mtime, content_hash)
+            changed.append(full_path)
+        removed = [path for path in self.files if path not in seen]
+        for path in removed:
+            del self.files[path]
+        for full_path, facts, problem in scan_files(changed, processes):
+            path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+            size, mtime, content_hash = hashes[path]
+            self.files[path] = {"size": size, "mtime": mtime, "hash": content_hash, "facts": facts,
+                                "problem": problem}
+        if changed or removed:
+            self.changed = True
+            self._resolved = None
+        return len(changed), len(removed)
+
+    def save(self):
+        if not self.changed:
+            return
+        folder = os.path.dirname(self.cache_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with io.open(self.cache_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": CACHE_VERSION, "files": self.files}, sort_keys=True, ensure_ascii=False))
+        self.changed = False
+
+    @property
+    def problems(self):
+        return sorted((path, entry["problem"]) for path, entry in self.files.items() if entry["problem"])
+
+    def resolved(self):
+        """(definitions by lower case path, edges), resolved from the facts of all files"""
+        if self._resolved is None:
+            self._resolved = Resolver(self.files).resolve()
+        return self._resolved
+
+    @property
+    def definitions(self):
+        return self.resolved()[0]
+
+    @property
+    def edges(self):
+        return self.resolved()[1]
+
+    def canonical(self, path):
+        definition = self.definitions.get(path.lower())
+        if definition is None:
+            raise ValueError("Element {} not found".format(path))
+        return definition.path
+
+    def edge_index(self, callers):
+        """Edges by lower case callee (callers=True, resolved ones only) or caller"""
+        index = defaultdict(list)
+        for edge in self.edges:
+            if not callers:
+                index[edge.caller.lower()].append(edge)
+            elif edge.callee is not None:
+                index[edge.callee.lower()].append(edge)
+        return index
+
+    def callees(self, path):
+        """Edges from the element at path, calls into libraries with callee None"""
+        return self.edge_index(False).get(self.canonical(path).lower(), [])
+
+    def callers(self, path):
+        """Edges to the element at path"""
+        return self.edge_index(True).get(self.canonical(path).lower(), [])
+
+    def impact(self, path):
+        """Paths of the elements (and GVLs) reaching the element at path through any chain of edges, sorted"""
+        index = self.edge_index(True)
+        start = self.canonical(path).lower()
+        seen = {start: None}  # lower case path: path
+        queue = deque([start])
+        while queue:
+            for edge in index.get(queue.popleft(), []):
+                key = edge.caller.lower()
+                if key not in seen:
+                    seen[key] = edge.caller
+                    queue.append(key)
+        del seen[start]
+        return sorted(seen.values())
+
+    def unreachable(self, roots=None):
+        """
+        Definitions not reachable from roots (default: every PROGRAM, tasks call them), sorted by
+        path. Interfaces and the methods of interfaces are left out, they have no code.
+        """
+        definitions = self.definitions
+        if roots is None:
+            roots = [definition.path for definition in definitions.values() if definition.type == "PROGRAM"]
+        index = self.edge_index(False)
+        members = defaultdict(list)
+        for key in definitions:
+            owner, dot, name = key.rpartition(".")
+            if dot and name in IMPLICIT_METHODS:
+                members[owner].append(key)
+        seen = set()
+        queue = deque(self.canonical(root).lower() for root in roots)
+        while queue:
+            key = queue.popleft()
+            if key in seen:
+                continue
+            seen.add(key)
+            queue.extend(edge.callee.lower() for edge in index.get(key, []) if edge.callee is not None)
+            # FB_init and FB_exit of a function block in use
+            queue.extend(members.get(key, []))
+        interfaces = set(key for key, definition in definitions.items() if definition.type == "INTERFACE")
+        return sorted(definition for key, definition in definitions.items()
+                      if key not in seen and key.split(".")[0] not in interfaces)
+
+
+class Resolver(object):
+    """Resolution of the call texts of all files to element paths"""
+
+    def __init__(self, files):
+        self.files = files
+        self.definitions = {}  # lower case path: Definition
+        self.scopes = defaultdict(dict)  # lower case scope: {lower case name: (type, instance)}
+        self.globals = {}  # lower case name: type, of all GVLs
+        self.gvls = set()
+        for path in sorted(files):
+            facts = files[path]["facts"]
+            if facts is None:
+                continue
+            for element_path, element_type, extends, implements, line in facts["definitions"]:
+                self.definitions.setdefault(element_path.lower(), Definition(
+                    element_path, element_type, extends, tuple(implements), path, line))
+            for scope, name, type_name, instance in facts["variables"]:
+                self.scopes[scope.lower()].setdefault(name.lower(), (type_name, instance))
+        for scope in list(self.scopes):
+            if scope not in self.definitions:
+                # a GVL, named by its file
+                self.gvls.add(scope)
+                for name, (type_name, _) in self.scopes[scope].items():
+                    self.globals.setdefault(name, type_name)
+
+    def bases(self, type_name):
+        """Lower case paths of the function block type_name and its bases"""
+        chain = []
+        key = type_name.lower() if type_name else None
+        while key in self.definitions and key not in chain:
+            chain.append(key)
+            extends = self.definitions[key].extends
+            key = extends.lower() if extends else None
+        return chain
+
+    def member(self, type_name, name):
+        """Path of method or action name of type_name or of its bases, None if there is none"""
+        for key in self.bases(type_name):
+            definition = self.definitions.get(key + "." + name.lower())
+            if definition is not None:
+                return definition.path
+        return None
+
+    def variable_type(self, caller, name):
+        """Type of the variable name seen from the element caller: own, function block, bases, globals"""
+        owner = caller.split(".")[0]
+        for scope in [caller.lower()] + self.bases(owner):
+            declared = self.scopes.get(scope, {}).get(name)
+            if declared is not None:
+                return declared[0]
+        return self.globals.get(name)
+
+    def resolve_call(self, caller, text):
+        if "[" in text:
+            text = INDEX_PATTERN.sub("", text)  # aAxes[i].M_Home: a method of the element type
+        parts = [part.rstrip("^") for part in text.split(".")]
+        first = parts[0].lower()
+        owner = caller.split(".")[0]
+        if first == "this":
+            target, rest = owner, parts[1:]
+        elif first == "super":
+            definition = self.definitions.get(owner.lower())
+            target, rest = (definition.extends if definition else None), parts[1:]
+        else:
+            target = self.variable_type(caller, first)
+            rest = parts[1:]
+            if target is None:
+                if len(parts) == 1:
+                    member = self.member(owner, first)
+                    if member is not None:
+                        return member
+                    definition = self.definitions.get(first)
+                    return definition.path if definition is not None else None
+                if first in self.gvls and len(parts) > 1:
+                    target = self.scopes[first].get(parts[1].lower(), (None,))[0]
+                    rest = parts[2:]
+                elif first in self.definitions:
+                    # PRG_Main.A_Reset(), or a namespace
+                    target = self.definitions[first].path
+                else:
+                    return None
+        if target is None:
+            return None
+        if not rest:
+            definition = self.definitions.get(target.lower())
+            return definition.path if definition is not None else None
+        if len(rest) == 1:
+            return self.member(target, rest[0])
+        return None
+
+    def resolve(self):
+        edges = []
+        for path in sorted(self.files):
+            facts = self.files[path]["facts"]
+            if facts is None:
+                continue
+            for caller, text, line in facts["calls"]:
+                edges.append(Edge(caller, self.resolve_call(caller, text), "call", text, path, line))
+            for scope, name, type_name, instance in facts["variables"]:
+                definition = self.definitions.get(type_name.lower())
+                if instance and definition is not None and definition.type == "FUNCTION_BLOCK":
+                    edges.append(Edge(scope, definition.path, "instance", name, path, None))
+        # dispatch through bases and interfaces to the overriding and implementing methods
+        for key, definition in sorted(self.definitions.items()):
+            base = self.definitions.get(definition.extends.lower()) if definition.extends else None
+            if base is not None:
+                edges.append(Edge(definition.path, base.path, "extends", definition.extends, definition.file,
+                                  definition.line))
+            owner, dot, name = key.rpartition(".")
+            if not dot or definition.type != "METHOD":
+                continue
+            owner_definition = self.definitions.get(owner)
+            if owner_definition is None:
+                continue
+            for base in self.bases(owner)[1:]:
+                overridden = self.definitions.get(base + "." + name)
+                if overridden is not None:
+                    edges.append(Edge(overridden.path, definition.path, "override", name, definition.file,
+                                      definition.line))
+            for interface in owner_definition.implements:
+                for interface_key in self.bases(interface):
+                    declared = self.definitions.get(interface_key + "." + name)
+                    if declared is not None:
+                        edges.append(Edge(declared.path, definition.path, "implementation", name, definition.file,
+                                          definition.line))
+        return self.definitions, edges
+
+
+def describe(edge):
+    location = "{}:{}".format(edge.file, edge.line) if edge.line else edge.file
+    return "{} -> {} ({}{}, {})".format(edge.caller, edge.callee or "?", edge.kind,
+                                        "" if edge.callee else " " + edge.text, location)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Call graph of an exported source tree")
+    parser.add_argument("root", help="export tree, e.g. <project>_txt/st_source")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--callers", metavar="PATH", help="edges to an element, e.g. FB_Motor.M_Start")
+    group.add_argument("--callees", metavar="PATH", help="edges from an element")
+    group.add_argument("--impact", metavar="PATH", help="elements reaching an element through any chain of calls")
+    group.add_argument("--dead", action="store_true", help="elements not reachable from a PROGRAM")
+    parser.add_argument("--cache", help="cache file (default: <root>/{}/facts.json)".format(CACHE_FOLDER))
+    parser.add_argument("-j", "--processes", type=int, default=None, help="worker processes for scanning")
+    args = parser.parse_args(argv)
+
+    graph = CallGraph(args.root, args.cache)
+    graph.update(args.processes)
+    graph.save()
+    try:
+        if args.callers or args.callees:
+            for edge in graph.callers(args.callers) if args.callers else graph.callees(args.callees):
+                print(describe(edge))
+        elif args.impact:
+            for path in graph.impact(args.impact):
+                print(path)
+        else:
+            for definition in graph.unreachable():
+                print("{} {} ({}:{})".format(definition.type, definition.path, definition.file, definition.line))
+    except ValueError as e:
+        print(e)
+        return 1
+    for path, problem in graph.problems:
+        print("{}: {}".format(path, problem))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
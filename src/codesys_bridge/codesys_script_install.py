@@ -4,6 +4,40 @@ import ctypes
 import shutil
 import json
 import glob
+import hashlib
+import io
+import zipfile
+
+BUNDLE_NAME = 'codesys_bridge_bundle.zip'
+BUNDLE_STAMP_NAME = 'codesys_bridge_bundle.json'
+
+# Modules the IDE scripts may import. They must stay IronPython 2.7 compatible; build_bundle
+# can't check that, it compiles them with the interpreter running the installation.
+BUNDLE_MODULES = [
+    '__init__.py',
+    'cs_export.py',
+    'cs_import.py',
+    'export_archive.py',
+    'object_store.py',
+    'batch_export.py',
+    'textlists.py',
+    'import_session.py',
+    'device_descriptors.py',
+    'tree_handle.py',
+    'tracing.py',
+    'selective_export.py',
+]
+
+LAUNCHER_TEMPLATE = """\
+# -*- coding: utf-8 -*-
+# Generated by the codesys-bridge installer, changes will be overwritten.
+import sys
+BUNDLE = {bundle!r}
+if BUNDLE not in sys.path:
+    sys.path.insert(0, BUNDLE)
+from codesys_bridge import {module}
+{module}.main()
+"""
 
 def is_admin():
     try:
@@ -33,6 +67,93 @@ def get_installation_directories():
     
     return directories
 
+def get_version():
+    try:
+        from importlib.metadata import version
+        return version('codesys-bridge')
+    except Exception:
+        return 'unknown'
+
+
+def build_bundle(current_dir, modules=BUNDLE_MODULES):
+    """
+    Build the zip bundle of the codesys_bridge modules used from the IDE.
+
+    Every module is compiled first, so a syntax error fails the installation instead of the
+    toolbar script. This uses the grammar of the interpreter running the installation, code
+    that only IronPython 2.7 rejects is not caught. The zip is byte-for-byte reproducible, its sha256 is part of
+    the version stamp.
+
+    Returns:
+        tuple: (zip bytes, stamp dict)
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for module in sorted(modules):
+            with open(os.path.join(current_dir, module), 'rb') as f:
+                source = f.read()
+            compile(source, module, 'exec')
+            info = zipfile.ZipInfo('codesys_bridge/' + module, date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            bundle.writestr(info, source)
+    data = buffer.getvalue()
+    stamp = {
+        'version': get_version(),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'modules': sorted(modules),
+    }
+    return data, stamp
+
+
+def write_if_changed(path, data):
+    """Write bytes to path unless it already has exactly this content. Returns True if written."""
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+
+def install_bundle(path, current_dir, script_module='cs_export'):
+    """
+    Install the module bundle and a small launcher script for script_module into path.
+    Skipped when the installed version stamp matches the bundle being installed.
+
+    Returns:
+        tuple: (launcher file name, True if the bundle was (re)installed)
+    """
+    bundle_path = os.path.join(path, BUNDLE_NAME)
+    stamp_path = os.path.join(path, BUNDLE_STAMP_NAME)
+    data, stamp = build_bundle(current_dir)
+
+    installed_stamp = None
+    if os.path.exists(stamp_path) and os.path.exists(bundle_path):
+        with open(stamp_path, 'r') as f:
+            try:
+                installed_stamp = json.load(f)
+            except ValueError:
+                pass
+
+    updated = installed_stamp != stamp
+    if updated:
+        with open(bundle_path, 'wb') as f:
+            f.write(data)
+        with open(stamp_path, 'w') as f:
+            json.dump(stamp, f, indent=4)
+
+    return write_launcher(path, script_module), updated
+
+
+def write_launcher(path, script_module):
+    """Write the launcher for script_module of the bundle installed in path. Returns its file name."""
+    launcher_name = script_module + '.py'
+    launcher = LAUNCHER_TEMPLATE.format(bundle=os.path.join(path, BUNDLE_NAME), module=script_module)
+    write_if_changed(os.path.join(path, launcher_name), launcher.encode('utf-8'))
+    return launcher_name
+
+
 def install_to_directory(path, config_entry, current_dir, just_link=False):
     """Install config and assets to a single directory"""
     print(f"\nInstalling to: {path}")
@@ -47,9 +168,14 @@ def install_to_directory(path, config_entry, current_dir, just_link=False):
     
     script_path = os.path.join(current_dir, 'cs_export.py')
     if not just_link: # Codesys will refuse to run the script if it's not in ScriptLib or under.
-        shutil.copy2(script_path, os.path.join(path, 'cs_export.py'))
-        print(f"Copied cs_export.py to {path}")
-        config_entry["Path"] = 'cs_export.py'
+        launcher_name, updated = install_bundle(path, current_dir)
+        write_launcher(path, 'batch_export')  # for --runscript with --scriptargs, no toolbar entry
+        write_launcher(path, 'selective_export')
+        if updated:
+            print(f"Installed {BUNDLE_NAME} and {launcher_name} to {path}")
+        else:
+            print(f"{BUNDLE_NAME} in {path} is up to date")
+        config_entry["Path"] = launcher_name
     else:
         print(f"Linking cs_export.py to {path}")
         config_entry["Path"] = script_path
@@ -1,11 +1,26 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, unicode_literals
 from collections import defaultdict
+import io
 import os
 import shutil
 import re
+import sys
 from bisect import bisect_right
 from collections import namedtuple
+from contextlib import contextmanager
+
+# hashlib, json, tempfile and textlists are imported where they are used, they would make up a
+# large part of the import time of the parser
+try:
+    from .tracing import trace_from_environment, traced
+except (ImportError, ValueError):
+    def traced(name):
+        return lambda func: func
+
+    @contextmanager
+    def trace_from_environment():
+        yield None
 
 
 """
@@ -42,71 +57,351 @@ SoftMotion_General_Axis_Pool=Guid('e9159722-55bc-49e5-8034-fbd278ef718f')
 """
 
 
+class ScriptingEnvironment(object):
+    """
+    Resolves the names the CodeSys script engine injects into scripts (projects, PouType,
+    DutType, system, device_repository, ...) on first use instead of at import time,
+    so the parsing code can be imported on plain CPython.
+
+    Lookup order: names set with install(), the __main__ module (script run from the IDE),
+    the scriptengine module.
+    """
+
+    def __init__(self):
+        self.installed = {}
+
+    def install(self, **names):
+        """Provide names explicitly, e.g. a mock project for tests and tools."""
+        self.installed.update(names)
+
+    def uninstall(self, *names):
+        for name in names or list(self.installed):
+            self.installed.pop(name, None)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name in self.installed:
+            return self.installed[name]
+        main_module = sys.modules.get("__main__")
+        if main_module is not None and hasattr(main_module, name):
+            return getattr(main_module, name)
+        try:
+            import scriptengine  # type: ignore
+        except ImportError:
+            scriptengine = None
+        if scriptengine is not None and hasattr(scriptengine, name):
+            return getattr(scriptengine, name)
+        raise AttributeError(
+            "{} is not available outside of the CodeSys script engine".format(name)
+        )
+
+
+scripting = ScriptingEnvironment()
+
+
 def save(text, path, name):
-    with open(os.path.join(path, name + ".st"), "w") as f:
-        f.write(text.encode("utf-8"))
+    with io.open(os.path.join(path, name + ".st"), "w", encoding="utf-8") as f:
+        f.write(text)
 
 
-def walk_export_tree(treeobj, depth, path):
-    # TODO: it should ba possible to streamline this function
-    # to decide on the type_guid (mapped to intuitive object_type)
-    # and do native_export, this or that special_export 
-    # independently of that we'll have a simple condition to create
-    # a subdirectory and walk down.
-    global unknown_object_types
-    curpath = path
+class DirectoryTarget(object):
+    """Export target writing every exported object to its own file below the save folder"""
+
+    def __init__(self, save_folder):
+        self.save_folder = save_folder
+
+    def path(self, relative_path):
+        return os.path.join(self.save_folder, relative_path)
+
+    def make_folder(self, relative_path):
+        path = self.path(relative_path)
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def write_text(self, relative_path, text):
+        with io.open(self.path(relative_path), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def export_file(self, relative_path, export):
+        """export is called with the file system path the IDE should write to"""
+        export(self.path(relative_path))
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """Called instead of close when the export failed"""
+        pass
+
+
+def native_export_key(treeobj):
+    """
+    Identification and version of a device, or the libraries and versions referenced by a
+    library manager. None if the object is neither, or the IDE doesn't provide them, e.g. a
+    library without version; such objects are always exported from the IDE.
+    Device parameters are not part of the key, see NativeExportCache.
+    """
+    try:
+        if treeobj.is_device:
+            device_id = treeobj.get_device_identification()
+            return "device {} {} {}".format(device_id.type, device_id.id, device_id.version)
+        if treeobj.is_libman:
+            libraries = []
+            for library in treeobj.get_libraries():
+                version = getattr(library, "version", None)
+                if not version:
+                    return None
+                libraries.append("{} {}".format(library.name, version))
+            return "libraries " + ";".join(sorted(libraries))
+    except AttributeError:  # scripting API without these members
+        pass
+    return None
+
+
+def file_hash(path):
+    import hashlib
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def default_native_cache_folder():
+    import tempfile
+    base = os.environ.get("LOCALAPPDATA") or tempfile.gettempdir()
+    return os.path.join(base, "codesys_bridge", "native_cache")
+
+
+def make_cache_folder(folder):
+    """
+    Create the cache folder folder inside an export tree, with a .gitignore that keeps all of
+    it out of version control, and return it
+    """
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    gitignore = os.path.join(folder, ".gitignore")
+    if not os.path.exists(gitignore):
+        with io.open(gitignore, "w", encoding="utf-8") as f:
+            f.write("# cache of codesys_bridge, rebuilt from the exported files\n*\n")
+    return folder
+
+
+NATIVE_CACHE_ENVIRONMENT_VARIABLE = "CODESYS_BRIDGE_NATIVE_CACHE"
+
+
+def native_cache_from_environment():
+    """
+    NativeExportCache in the folder named by CODESYS_BRIDGE_NATIVE_CACHE ("1" for the default
+    folder), None if it is not set
+    """
+    folder = os.environ.get(NATIVE_CACHE_ENVIRONMENT_VARIABLE)
+    if not folder:
+        return None
+    return NativeExportCache(default_native_cache_folder() if folder == "1" else folder)
 
-    text_representation = ""
 
-    name = treeobj.get_name(False)
+class NativeExportCache(object):
+    """
+    Native exports of devices and library managers, reused while the key of the object
+    (project, output path, native_export_key) is unchanged, so the slow IDE export is skipped.
+    Cached XML is stored by its sha256 and checked against it before it is reused.
+
+    Changing only device parameters or I/O mappings doesn't change the key, the cache would
+    export the earlier XML. It is therefore only used when asked for (--native-cache, or
+    CODESYS_BRIDGE_NATIVE_CACHE for the toolbar export); delete the cache folder after such changes.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.index_path = os.path.join(folder, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self.changed = False
+        self.index = {}
+        if os.path.exists(self.index_path):
+            import json
+            try:
+                with io.open(self.index_path, "r", encoding="utf-8") as f:
+                    self.index = json.load(f)
+            except ValueError:
+                pass
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.folder, content_hash + ".xml")
+
+    def lookup(self, key):
+        """Path of the cached export for key, None if there is none or it was modified."""
+        content_hash = self.index.get(key)
+        if content_hash is None:
+            return None
+        path = self.blob_path(content_hash)
+        if not os.path.exists(path) or file_hash(path) != content_hash:
+            if os.path.exists(path):
+                os.remove(path)
+            del self.index[key]
+            self.changed = True
+            return None
+        return path
+
+    def store(self, key, exported_path):
+        content_hash = file_hash(exported_path)
+        path = self.blob_path(content_hash)
+        if not os.path.exists(path):
+            if not os.path.exists(self.folder):
+                os.makedirs(self.folder)
+            shutil.copyfile(exported_path, path)
+        if self.index.get(key) != content_hash:
+            self.index[key] = content_hash
+            self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        import json
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        with io.open(self.index_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.index, indent=1, sort_keys=True, ensure_ascii=False))
+        self.changed = False
+
+
+class ExportRun(object):
+    """
+    State of one export: the project handle used for native exports, the target written to,
+    the unknown object types found and the files written (relative to the save folder).
+    """
+
+    def __init__(self, project, save_folder, target=None, native_cache=None):
+        self.project = project
+        self.save_folder = save_folder
+        self.target = target if target is not None else DirectoryTarget(save_folder)
+        self.native_cache = native_cache
+        self.unknown_object_types = defaultdict(lambda: [])
+        self.written = []
+        self.removed = []  # files and folders of objects no longer in the project, see selective_export
+
+    def relative(self, file_path):
+        return os.path.relpath(file_path, self.save_folder)
+
+    def make_folder(self, path):
+        self.target.make_folder(self.relative(path))
+
+    @traced("save")
+    def save(self, text, path, name):
+        relative_path = self.relative(os.path.join(path, name + ".st"))
+        self.target.write_text(relative_path, text)
+        self.written.append(relative_path)
+
+    @traced("export_native")
+    def export_native(self, treeobj, file_path, recursive=False):
+        relative_path = self.relative(file_path)
+        cache_key = None
+        if self.native_cache is not None and not recursive:
+            object_key = native_export_key(treeobj)
+            if object_key is not None:
+                cache_key = "{}|{}|{}".format(getattr(self.project, "path", ""), relative_path, object_key)
+
+        cached_path = self.native_cache.lookup(cache_key) if cache_key else None
+        if cached_path is not None:
+            self.native_cache.hits += 1
+
+            def export(target_path):
+                shutil.copyfile(cached_path, target_path)
+        else:
+            def export(target_path):
+                if recursive:
+                    self.project.export_native([treeobj], target_path, recursive=True)
+                else:
+                    self.project.export_native([treeobj], target_path)
+                if cache_key:
+                    self.native_cache.misses += 1
+                    self.native_cache.store(cache_key, target_path)
+        self.target.export_file(relative_path, export)
+        self.written.append(relative_path)
+
+    @traced("export_textlist")
+    def export_textlist(self, treeobj, file_path):
+        def export(target_path):
+            treeobj.export(target_path)
+            try:
+                from .textlists import normalize_textlist
+            except (ImportError, ValueError):  # cs_export.py run as a standalone script
+                return
+            normalize_textlist(target_path, target_path)
+        relative_path = self.relative(file_path)
+        self.target.export_file(relative_path, export)
+        self.written.append(relative_path)
+
+    def write_unknown_object_types(self):
+        self.target.write_text("unknown_object_types.txt", str(dict(self.unknown_object_types)))
+
+
+TEXTUAL_OBJECT_TYPES = {"pou", "gvl", "dut", "itf"}
+
+
+def export_object(treeobj, path, run, name=None, contents=True):
+    """
+    Export treeobj itself: native XML of devices, tasks and library managers, text lists
+    and the .st file of textual objects (including their methods, actions, ...).
+
+    Args:
+        name: name of treeobj, if the caller already asked the IDE for it
+        contents: False only creates the directory for the children, for objects walked
+            through without being exported
+
+    Returns:
+        tuple: (directory for the children or None if they were exported with treeobj, children)
+    """
+    if name is None:
+        name = treeobj.get_name(False)
     type_guid = treeobj.type.ToString()
 
     if type_guid in guid_type:
         object_type = guid_type[type_guid]
     else:
         object_type = "unknown"
-        unknown_object_types[type_guid].append(name)
+        run.unknown_object_types[type_guid].append(name)
+
+    if not contents:
+        pass  # walked through, the IDE isn't asked for its content
 
-    if treeobj.is_device:
-        exports = [treeobj]
-        projects.primary.export_native(exports, os.path.join(curpath, name + ".xml"))
+    elif treeobj.is_device:
+        run.export_native(treeobj, os.path.join(path, name + ".xml"))
 
     elif treeobj.is_task:
-        exports = [treeobj]
-        projects.primary.export_native(exports, os.path.join(curpath, name + "_task.xml"), recursive=True)
+        run.export_native(treeobj, os.path.join(path, name + "_task.xml"), recursive=True)
 
     elif treeobj.is_libman:
-        exports = [treeobj]
-        projects.primary.export_native(exports, os.path.join(curpath, name + "_lib.xml"))
+        run.export_native(treeobj, os.path.join(path, name + "_lib.xml"))
 
     elif treeobj.is_textlist:
-        treeobj.export(os.path.join(curpath, name + ".tl"))
+        run.export_textlist(treeobj, os.path.join(path, name + ".tl"))
 
-    if treeobj.has_textual_declaration:
-        a = treeobj.textual_declaration
-        text_representation = text_representation + a.text
-
-    if treeobj.has_textual_implementation:
-        a = treeobj.textual_implementation
-        text_representation = text_representation + a.text
+    if object_type in TEXTUAL_OBJECT_TYPES:
+        if contents:
+            run.save(cs_tree_dumps(treeobj), path, name)
+        return None, []
 
     children = treeobj.get_children(False)
+    curpath = path
+    if children:
+        if object_type in {"folder", "application", "unknown"}:
+            curpath = os.path.join(curpath, name)
+        else:
+            curpath = os.path.join(curpath, name + "." + object_type)
 
-    if object_type in  {"pou", "gvl", "dut", "itf",}:
-        save(cs_tree_dumps(treeobj), curpath, name)
+        if object_type != "task":
+            run.make_folder(curpath)
+    return curpath, children
 
-    else:
-        if children:
-            if object_type in {"folder", "application","unknown"}:
-                curpath = os.path.join(curpath, name)
-            else:
-                curpath = os.path.join(curpath, name + "." + object_type)
 
-            if object_type != "task" and not os.path.exists(curpath):
-                os.makedirs(curpath)
-
-        for child in treeobj.get_children(False):
-            walk_export_tree(child, depth + 1, os.path.join(curpath))
+@traced("walk_export_tree")
+def walk_export_tree(treeobj, depth, path, run=None):
+    """Export treeobj and everything below it into path."""
+    if run is None:
+        run = ExportRun(scripting.projects.primary, path)
+    curpath, children = export_object(treeobj, path, run)
+    for child in children:
+        walk_export_tree(child, depth + 1, curpath, run)
 
 
 # Named tuples for structured data
@@ -118,7 +413,7 @@ LineSegment = namedtuple("LineSegment", ["start_line", "end_line"])
 
 class IECElement(object):
     """Recursive data structure representing an IEC element and its sub-elements. It doesn't hold source code, only line numbers."""
-    def __init__(self, name, type, start_segment, sub_elements, body_segment):
+    def __init__(self, name, type, start_segment, sub_elements, body_segment, hash=None):
         self.name = name
         self.type = type  # 'FUNCTION_BLOCK', 'FUNCTION', 'INTERFACE', 'PROGRAM', 'TYPE', 'VAR_GLOBAL' and inside FUNCTION_BLOCK: 'METHOD', 'ACTION', 'VAR_INPUT', 'VAR_OUTPUT', 'VAR_IN_OUT', 'VAR_TEMP'
         self.start_segment = (
@@ -132,6 +427,8 @@ class IECElement(object):
             if isinstance(body_segment, tuple)
             else body_segment
         )
+        # Merkle hash of the element's text, see element_hash; None unless requested from parse_iec_element
+        self.hash = hash
 
 
 def find_newline_positions(text):
@@ -156,50 +453,167 @@ def get_line_number(pos, newline_positions):
     return line + 1
 
 
+# Comments and strings skipped by the regular expression itself: line comments, comments
+# without "*" or "(" inside, strings without "$" escapes or line breaks. A failed attempt stops
+# at the next "*", "(", "$", quote or line break, and these runs don't overlap, so they cost
+# linear time in total. All other comments and strings start with span_start and are skipped
+# by SpanScanner.
+SPAN_ALTERNATIVES = r"""(?P<skip>//[^\n]*|\(\*[^*(]*\*\)|"[^"$\n]*"|'[^'$\n]*')|(?P<span_start>\(\*|["'])"""
+
+
+def code_pattern(tokens, flags=0):
+    """Pattern for code_matches: the comment and string alternatives first, then tokens"""
+    return re.compile(SPAN_ALTERNATIVES + "|" + tokens, flags)
+
+
+class SpanScanner(object):
+    """
+    Ends of the comments and strings of a text, in linear time over all calls.
+
+    Comments nest: (* (* *) *) is one comment. In strings $ escapes the next character, both
+    kinds of strings may span lines. A comment or string without its end is not one, the scan
+    continues after its first character (like the earlier regular expression did).
+
+    Each call searches forward with str.find from the start it is asked for. A comment that is
+    closed is skipped by the caller; a scan reaching the end of the text records the result of
+    every opener it passed, so later openers are answered from comment_ends. Later quotes of
+    the same kind after an unterminated string are in the same escape state as that scan, so
+    they are unterminated as well, and comments after the last "*)" can't be closed. No
+    position is scanned twice by unterminated scans.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.comment_ends = {}  # position of "(*": end of its comment, None if unterminated
+        self.closeless = len(text)  # no "*)" from here on, later comments are unterminated
+        self.unterminated = {}  # quote: start of an unterminated string
+
+    def end(self, start):
+        """End of the comment or string starting at start, None if it is unterminated"""
+        if self.text[start] == "(":
+            return self.comment_end(start)
+        return self.string_end(start)
+
+    def comment_end(self, start):
+        if start in self.comment_ends:
+            return self.comment_ends[start]
+        if start >= self.closeless:
+            return None
+        text = self.text
+        stack = [start]
+        i = start + 2
+        next_open = text.find("(*", i)
+        next_close = text.find("*)", i)
+        while stack and next_close != -1:
+            if next_open != -1 and next_open < next_close:
+                stack.append(next_open)
+                i = next_open + 2
+                next_open = text.find("(*", i)
+            else:
+                i = next_close + 2
+                self.comment_ends[stack.pop()] = i
+            if next_close < i:
+                next_close = text.find("*)", i)
+        if next_close == -1:
+            self.closeless = min(self.closeless, i)
+        for opening in stack:
+            self.comment_ends[opening] = None
+        return self.comment_ends[start]
+
+    def string_end(self, start):
+        text = self.text
+        quote = text[start]
+        if self.unterminated.get(quote, len(text)) < start:
+            return None
+        i = start + 1
+        close = text.find(quote, i)
+        while close != -1:
+            escape = text.find("$", i, close)
+            if escape == -1:
+                return close + 1
+            i = escape + 2
+            if close < i:
+                close = text.find(quote, i)
+        self.unterminated[quote] = start
+        return None
+
+
+def code_matches(pattern, text, pos=0, endpos=None, spans=None):
+    """
+    Matches of the tokens of a code_pattern outside comments and strings.
+    With a list as spans, the (start, end) of the skipped comments and strings are appended to it.
+    """
+    if endpos is None:
+        endpos = len(text)
+    scanner = SpanScanner(text)
+    while pos < endpos:
+        for m in pattern.finditer(text, pos, endpos):
+            group = m.lastgroup
+            if group == "skip":
+                if spans is not None:
+                    spans.append(m.span())
+                continue
+            if group == "span_start":
+                end = scanner.end(m.start())
+                if end is not None:
+                    if spans is not None:
+                        spans.append((m.start(), end))
+                    # restart after the comment or string
+                    pos = end
+                    break
+                continue  # unterminated: its first character is code, go on after it
+            yield m
+        else:
+            return
+
+
+def code_spans(text):
+    """(start, end) of the comments and strings of text, as code_matches skips them"""
+    scanner = SpanScanner(text)
+    pos = 0
+    while True:
+        m = SPAN_PATTERN.search(text, pos)
+        if m is None:
+            return
+        end = m.end() if m.group("skip") is not None else scanner.end(m.start())
+        if end is None:
+            pos = m.start() + 1
+        else:
+            yield m.start(), end
+            pos = end
+
+
+SPAN_PATTERN = re.compile(SPAN_ALTERNATIVES)
+
+ELEMENT_TOKENS = r"""
+    # Opening elements with names
+    \b(?P<named_element>FUNCTION_BLOCK|FUNCTION|INTERFACE|PROGRAM|TYPE|METHOD|ACTION)\s+(?P<name>\w+)\b
+    |
+    # Opening elements without names
+    \b(?P<var_section>VAR_GLOBAL|VAR_INPUT|VAR_OUTPUT|VAR_TEMP|VAR_IN_OUT|VAR)\b
+    |
+    # Closing elements
+    \b(?P<end_element>END_FUNCTION_BLOCK|END_FUNCTION|END_INTERFACE|END_TYPE|END_PROGRAM|END_VAR|END_METHOD|END_ACTION)\b
+    """
+ELEMENT_PATTERN = code_pattern(ELEMENT_TOKENS, re.VERBOSE | re.IGNORECASE)
+
+
 def find_element_delimiters(text, newline_positions):
     """Find all element boundaries in the text."""
-    element_pattern = re.compile(
-        r"""
-        # Comments and strings to ignore (non-capturing)
-        (?:
-            \(\*.*?\*\)  # Multiline comments
-            |
-            //[^\n]*     # Single line comments
-            |
-            "(?:[^"$]|\$")*(?<![$])"      # Double quoted strings with escaped quotes
-            |
-            '(?:[^'$]|\$')*(?<![$])'      # Single quoted strings with escaped quotes
-        )
-        |
-        # Opening elements with names
-        \b(?P<named_element>FUNCTION_BLOCK|FUNCTION|INTERFACE|PROGRAM|TYPE|METHOD|ACTION)\s+(?P<name>\w+)\b
-        |
-        # Opening elements without names
-        \b(?P<var_section>VAR_GLOBAL|VAR_INPUT|VAR_OUTPUT|VAR_TEMP|VAR_IN_OUT|VAR)\b
-        |
-        # Closing elements
-        \b(?P<end_element>END_FUNCTION_BLOCK|END_FUNCTION|END_INTERFACE|END_TYPE|END_PROGRAM|END_VAR|END_METHOD|END_ACTION)\b
-    """,
-        re.VERBOSE | re.IGNORECASE | re.MULTILINE | re.DOTALL,
-    )
-
     element_delimiters = []
     start_line = 1  # Start from line 1
 
-    for m in element_pattern.finditer(text):
-        element_type = None
-        name = None
-
+    for m in code_matches(ELEMENT_PATTERN, text):
         # Check which group matched and get type/name
         if m.group("named_element"):  # Named opening element
             element_type = m.group("named_element").upper()
             name = m.group("name")
         elif m.group("var_section"):  # VAR section
             element_type = m.group("var_section").upper()
-        elif m.group("end_element"):  # Closing element
+            name = None
+        else:  # Closing element
             element_type = m.group("end_element").upper()
-        else:  # Must be a comment or string, skip it
-            continue
+            name = None
 
         end_line = get_line_number(m.end(), newline_positions)
         element_delimiters.append(
@@ -212,10 +626,41 @@ def find_element_delimiters(text, newline_positions):
     return element_delimiters
 
 
-def build_element_tree(delimiters, start_idx=0):
+def segment_text(text, newline_positions, segment):
+    """Text of the lines of segment including the last line break"""
+    if segment.start_line > segment.end_line:
+        return ""
+    start = newline_positions[segment.start_line - 2] + 1 if segment.start_line > 1 else 0
+    if segment.end_line <= len(newline_positions):
+        end = newline_positions[segment.end_line - 1] + 1
+    else:
+        end = len(text)
+    return text[start:end] if start < end else ""
+
+
+def element_hash(element_type, name, start_text, sub_elements, body_text):
+    """
+    Merkle hash of an element: its type and name, the text of its start and body segments and
+    the hashes of its sub elements. Only the text goes in, so edits elsewhere in the file
+    that shift the element's line numbers don't change it.
+    """
+    import hashlib
+    h = hashlib.sha1()
+    h.update("{}\0{}\0".format(element_type, name or "").encode("utf-8"))
+    h.update(start_text.encode("utf-8"))
+    for sub_element in sub_elements:
+        h.update(b"\0")
+        h.update(sub_element.hash.encode("ascii"))
+    h.update(b"\0")
+    h.update(body_text.encode("utf-8"))
+    return h.hexdigest()
+
+
+def build_element_tree(delimiters, start_idx=0, text=None, newline_positions=None):
     """
     Recursively build an IEC element tree from element delimiters.
     start_idx is the index of the delimiter to start parsing from.
+    With text and its newline_positions, every element gets its hash (see element_hash).
     Returns (IECElement, next_idx) tuple. next_idx  
             """
     if start_idx >= len(delimiters):
@@ -239,7 +684,7 @@ def build_element_tree(delimiters, start_idx=0):
             break # found the matching END element, "go to" end of build_element_tree
 
         # if the current delimiter is not an END element, it has to be sub element
-        sub_element, previous_end_idx = build_element_tree(delimiters, current_idx)
+        sub_element, previous_end_idx = build_element_tree(delimiters, current_idx, text, newline_positions)
         current_idx = previous_end_idx + 1
         assert(sub_element)
         sub_elements.append(sub_element)
@@ -250,24 +695,41 @@ def build_element_tree(delimiters, start_idx=0):
         raise ValueError("No matching %s found for %s" % (end_type, delimiter.type))
 
     # Create element with found boundaries
+    start_segment = LineSegment(delimiter.start_line, delimiter.end_line)
+    body_segment = LineSegment(
+        sub_elements[-1].body_segment.end_line + 1
+        if sub_elements
+        else delimiter.end_line + 1,
+        delimiters[end_idx].end_line,  # End at the end of END_* marker line
+    )
+    hash = None
+    if text is not None:
+        hash = element_hash(
+            delimiter.type,
+            delimiter.name,
+            segment_text(text, newline_positions, start_segment),
+            sub_elements,
+            segment_text(text, newline_positions, body_segment),
+        )
     return IECElement(
         name=delimiter.name,
         type=delimiter.type,
-        start_segment=LineSegment(delimiter.start_line, delimiter.end_line),
+        start_segment=start_segment,
         sub_elements=sub_elements,
-        body_segment=LineSegment(
-            sub_elements[-1].body_segment.end_line + 1
-            if sub_elements
-            else delimiter.end_line + 1,
-            delimiters[end_idx].end_line,  # End at the end of END_* marker line
-        ),
+        body_segment=body_segment,
+        hash=hash,
     ), end_idx
 
 
-def parse_iec_element(text):
+@traced("parse_iec_element")
+def parse_iec_element(text, hashes=False):
+    """Parse text into an IECElement tree, with hashes=True every element gets its Merkle hash."""
     newline_positions = find_newline_positions(text)
     element_delimiters = find_element_delimiters(text, newline_positions)
-    root_element, _ = build_element_tree(element_delimiters)
+    if hashes:
+        root_element, _ = build_element_tree(element_delimiters, 0, text, newline_positions)
+    else:
+        root_element, _ = build_element_tree(element_delimiters)
     return root_element
 
 
@@ -306,35 +768,22 @@ def get_declaration_and_implementation(element, text_lines, deindent_level=0):
     return declaration, implementation
 
 
+ELEMENT_TYPE_TOKENS = r"""
+    # Opening elements with names
+    \b(?P<named_element>FUNCTION_BLOCK|FUNCTION|INTERFACE|PROGRAM|TYPE|METHOD|ACTION)\s+(?P<name>\w+)\b
+    |
+    # Opening elements without names
+    \b(?P<var_section>VAR_GLOBAL|VAR_INPUT|VAR_OUTPUT|VAR_TEMP|VAR_IN_OUT|VAR)\b
+    """
+ELEMENT_TYPE_PATTERN = code_pattern(ELEMENT_TYPE_TOKENS, re.VERBOSE | re.IGNORECASE)
+
+
 def get_element_type(declaration_text):
-    """Extract the element type from declaration text using regex."""
-    element_pattern = re.compile(
-        r"""
-        # Comments and strings to ignore (non-capturing)
-        (?:
-            \(\*.*?\*\)  # Multiline comments
-            |
-            //[^\n]*     # Single line comments
-            |
-            "(?:[^"$]|\$")*(?<![$])"      # Double quoted strings with escaped quotes
-            |
-            '(?:[^'$]|\$')*(?<![$])'      # Single quoted strings with escaped quotes
-        )
-        |
-        # Opening elements with names
-        \b(?P<named_element>FUNCTION_BLOCK|FUNCTION|INTERFACE|PROGRAM|TYPE|METHOD|ACTION)\s+(?P<name>\w+)\b
-        |
-        # Opening elements without names
-        \b(?P<var_section>VAR_GLOBAL|VAR_INPUT|VAR_OUTPUT|VAR_TEMP|VAR_IN_OUT|VAR)\b
-    """,
-        re.VERBOSE | re.IGNORECASE | re.MULTILINE | re.DOTALL,
-    )
-    
-    for match in element_pattern.finditer(declaration_text):
+    """Type of the first element keyword of declaration_text outside comments and strings, None if there is none."""
+    for match in code_matches(ELEMENT_TYPE_PATTERN, declaration_text):
         if match.group("named_element"):
             return match.group("named_element").upper()
-        elif match.group("var_section"):
-            return match.group("var_section").upper()
+        return match.group("var_section").upper()
     return None
 
 
@@ -350,13 +799,22 @@ def get_object_type(script_object):
     else:
         return guid_type[script_object.type.ToString()]
 
+
+@traced("fetch_text")
+def fetch_text(element, kind):
+    """Text of the declaration or implementation of element, read from the IDE"""
+    return getattr(element, "textual_" + kind).text
+
+
+@traced("cs_tree_dumps")
 def cs_tree_dumps(element, indent_level=0):
     """
     Convert a ScriptObject or MockScriptObject tree to its text representation and return as string.
     """
     result = []
-    if element.has_textual_declaration:
-        result.append(indent_lines(element.textual_declaration.text, indent_level))
+    declaration = fetch_text(element, "declaration") if element.has_textual_declaration else None
+    if declaration is not None:
+        result.append(indent_lines(declaration, indent_level))
         if result and not result[-1][-1]=='\n':
             result.append("\n")
     if element.has_textual_implementation or element.get_children():
@@ -375,10 +833,10 @@ def cs_tree_dumps(element, indent_level=0):
             result.append("    " * indent_level + "{} {}\n".format(object_type, element.get_name()))
 
         # Implementation is indented one more level than the declaration
-        result.append(indent_lines(element.textual_implementation.text, indent_level + 1))
+        result.append(indent_lines(fetch_text(element, "implementation"), indent_level + 1))
                     
-        if element.has_textual_declaration:
-            ending = get_element_type(element.textual_declaration.text)
+        if declaration is not None:
+            ending = get_element_type(declaration)
         elif object_type:
             ending = object_type
         if ending:
@@ -425,6 +883,70 @@ class MockScriptObject(object):
         return self.textual_implementation.text != ""
 
 
+class LazyMockScriptObject(object):
+    """Same interface as MockScriptObject, but children and text are only built when accessed.
+    Type, name and child count are available without touching the source text."""
+
+    __mocked__ = True
+    __slots__ = ("element", "lines_list", "deindent_level", "_children", "_documents")
+
+    def __init__(self, element, text_lines, deindent_level=0):
+        self.element = element
+        self.lines_list = text_lines
+        self.deindent_level = deindent_level
+        self._children = None
+        self._documents = None
+
+    @property
+    def type(self):
+        return self.element.type
+
+    @property
+    def name(self):
+        return self.element.name
+
+    def get_children(self):
+        if self._children is None:
+            self._children = [
+                LazyMockScriptObject(child, self.lines_list, self.deindent_level + 1)
+                for child in self.element.sub_elements
+            ]
+        return self._children
+
+    def get_name(self):
+        return self.name
+
+    def child_count(self):
+        return len(self.element.sub_elements)
+
+    def _get_documents(self):
+        if self._documents is None:
+            declaration, implementation = get_declaration_and_implementation(
+                self.element, self.lines_list, self.deindent_level
+            )
+            self._documents = (
+                MockScriptTextDocument("".join(declaration)),
+                MockScriptTextDocument("".join(implementation)),
+            )
+        return self._documents
+
+    @property
+    def textual_declaration(self):
+        return self._get_documents()[0]
+
+    @property
+    def textual_implementation(self):
+        return self._get_documents()[1]
+
+    @property
+    def has_textual_declaration(self):
+        return self.textual_declaration.text != ""
+
+    @property
+    def has_textual_implementation(self):
+        return self.textual_implementation.text != ""
+
+
 def merge_var_sections(element):
     """
     Transform an IECElement by merging VAR sections into the parent's start segment.
@@ -452,6 +974,7 @@ def merge_var_sections(element):
         start_segment=new_start_segment,
         sub_elements=new_sub_elements,
         body_segment=element.body_segment,
+        hash=element.hash,
     )
 
 
@@ -482,6 +1005,21 @@ def create_mock_cs_script_object(element_tree, text_lines, deindent_level=0):
 
     return mock_element
 
+
+def create_lazy_mock_cs_script_object(element_tree, text_lines, deindent_level=0):
+    """
+    Lazy counterpart of create_mock_cs_script_object. Only the root is created up front,
+    children and declaration/implementation text are built on first access.
+
+    Args:
+        element_tree (IECElement): The IEC element tree to convert
+        text_lines (list[str]): The original text lines, shared by all nodes
+
+    Returns:
+        LazyMockScriptObject: The root of the lazy tree
+    """
+    return LazyMockScriptObject(element_tree, text_lines, deindent_level)
+
 guid_type = {
     "792f2eb6-721e-4e64-ba20-bc98351056db": "pm",  # property method
     "2db5746d-d284-4425-9f7f-2663a34b0ebc": "dut",  # dut
@@ -506,18 +1044,18 @@ guid_type = {
 }
 
 
-if __name__ == "__main__":
-    # Get project path and set save folder to st_source subdirectory
-    project_path = projects.primary.path
+def get_save_folder(project_path):
+    """<project dir>/../<project name>_txt/st_source"""
     parent_dir = os.path.dirname(os.path.dirname(project_path))  # Go up one more level
-    save_folder = os.path.join(
+    return os.path.join(
         parent_dir,
         os.path.splitext(os.path.basename(project_path))[0] + "_txt",
         "st_source",
     )
-    print("Export to {} started.".format(save_folder))
 
 
+def clear_save_folder(save_folder):
+    """Create save_folder or remove its content, keeping hidden entries like .git"""
     if not os.path.exists(save_folder):
         os.makedirs(save_folder)
     else:
@@ -530,18 +1068,58 @@ if __name__ == "__main__":
                 else:
                     os.remove(sub_path)
 
-    unknown_object_types = defaultdict(lambda: [])
-
-
-    for obj in projects.primary.get_children():
-        walk_export_tree(obj, 0, save_folder)
 
+def write_unknown_object_types(save_folder, unknown_object_types):
     with open(
         os.path.join(save_folder, "unknown_object_types.txt"), "w"
     ) as unknown_ot_file:
         unknown_ot_file.write(str(dict(unknown_object_types)))
 
-    print("Export finished.")
+
+@traced("export_project")
+def export_project(project, save_folder, target=None, native_cache=None):
+    """
+    Export all objects of project. Without a target the files are written to save_folder,
+    replacing its previous content. With a target, e.g. an ArchiveTarget, save_folder is
+    only the root the exported paths are relative to. With a NativeExportCache, unchanged
+    devices and library managers are taken from the cache instead of the IDE. If the export
+    fails, the target is aborted, which removes its temporary files.
+    """
+    if target is None:
+        clear_save_folder(save_folder)
+    run = ExportRun(project, save_folder, target, native_cache)
+    completed = False
+    try:
+        for obj in project.get_children():
+            walk_export_tree(obj, 0, save_folder, run)
+
+        run.write_unknown_object_types()
+        if native_cache is not None:
+            native_cache.save()
+        completed = True
+    finally:
+        if not completed:
+            run.target.abort()
+    run.target.close()
+    return run
+
+
+def main():
+    # Get project path and set save folder to st_source subdirectory
+    project = scripting.projects.primary
+    save_folder = get_save_folder(project.path)
+    print("Export to {} started.".format(save_folder))
+    native_cache = native_cache_from_environment()
+    with trace_from_environment():
+        export_project(project, save_folder, native_cache=native_cache)
+    if native_cache is None:
+        print("Export finished.")
+    else:
+        print("Export finished, {} native exports taken from the cache.".format(native_cache.hits))
+
+
+if __name__ == "__main__":
+    main()
 
 """"
 Markdown, let's work on a table of element types etc.
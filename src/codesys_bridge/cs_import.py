@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, unicode_literals
+import codecs
 import os
 import re
 import sys
@@ -13,8 +14,13 @@ from .cs_export import (
     MockScriptTextDocument,
     guid_type,
     get_declaration_and_implementation,
-    merge_var_sections
+    merge_var_sections,
+    scripting,
 )
+from .import_session import ImportSession
+from .tracing import trace_from_environment, traced
+
+TEXTLIST_EXTENSIONS = ('.tl', '.gtl')
 
 # Mapping from file extension/type to creation function
 OBJECT_TYPE_MAPPING = {
@@ -35,11 +41,11 @@ OBJECT_TYPE_MAPPING = {
     "prop": "create_property",
 }
 
-# Mapping from element type to PouType
+# Mapping from element type to PouType member, resolved via scripting.PouType when used
 POU_TYPE_MAPPING = {
-    "FUNCTION_BLOCK": PouType.FunctionBlock,
-    "FUNCTION": PouType.Function,
-    "PROGRAM": PouType.Program,
+    "FUNCTION_BLOCK": "FunctionBlock",
+    "FUNCTION": "Function",
+    "PROGRAM": "Program",
 }
 
 # Mapping from element type to DutType
@@ -51,7 +57,6 @@ DUT_TYPE_MAPPING = {
 
 if sys.version_info[0] < 3:
     # Python 2
-    import codecs
     def open_file(path, mode='r'):
         return codecs.open(path, mode, encoding='utf-8')
 else:
@@ -79,7 +84,7 @@ def determine_object_type(file_path, content):
         return parts[-2]
     
     # Otherwise try to determine from content
-    element_type = get_element_type(content)
+    element_type = get_element_type(content) if content else None
     if element_type in ["FUNCTION_BLOCK", "FUNCTION", "PROGRAM"]:
         return "pou"
     elif element_type == "INTERFACE":
@@ -97,13 +102,14 @@ def create_object(project, object_type, name, content=None):
     """Create an object in the CodeSys project based on its type."""
     if object_type == "pou":
         # Determine POU type from content
-        pou_type = PouType.Program  # Default
+        pou_type_name = "Program"  # Default
         if content:
             element_type = get_element_type(content)
             if element_type in POU_TYPE_MAPPING:
-                pou_type = POU_TYPE_MAPPING[element_type]
-        
-        if pou_type == PouType.Function:
+                pou_type_name = POU_TYPE_MAPPING[element_type]
+        pou_type = getattr(scripting.PouType, pou_type_name)
+
+        if pou_type_name == "Function":
             return project.create_pou(name, pou_type, return_type="INT") # The return type will be set by set_object_content from text.
         else:
             return project.create_pou(name, pou_type)
@@ -145,6 +151,7 @@ def create_object(project, object_type, name, content=None):
     return None
 
 
+@traced("set_object_content")
 def set_object_content(obj, content):
     """Set the textual content of an object."""
     if not content:
@@ -225,9 +232,13 @@ def find_or_create_object(project, path, name, content=None):
 
 def process_st_file(project, file_path):
     """Process a single ST file and create/update the corresponding object."""
+    return process_st_content(project, file_path, read_st_file(file_path))
+
+
+def process_st_content(project, file_path, content):
+    """Create/update the object for the ST text content read from file_path."""
     name = os.path.splitext(os.path.basename(file_path))[0]
-    content = read_st_file(file_path)
-    
+
     # Create or find the object
     obj = find_or_create_object(project, file_path, name, content)
     if obj:
@@ -237,8 +248,12 @@ def process_st_file(project, file_path):
     return None
 
 
-def process_directory(project, directory_path):
-    """Process a directory of ST files recursively."""
+@traced("process_directory")
+def process_directory(project, directory_path, textlists=None):
+    """
+    Process a directory of ST files recursively. Text list files are appended to textlists
+    as (parent object, path, file path) for import_textlists, or imported right away without it.
+    """
     for item in os.listdir(directory_path):
         item_path = os.path.join(directory_path, item)
         
@@ -255,37 +270,110 @@ def process_directory(project, directory_path):
             folder_obj = find_or_create_object(project, item_path, folder_name)
             if folder_obj:
                 # Process the contents of the folder
-                process_directory(folder_obj, item_path)
+                process_directory(folder_obj, item_path, textlists)
         
         elif item.endswith('.st'):
             # Process ST file
             process_st_file(project, item_path)
 
+        elif item.endswith(TEXTLIST_EXTENSIONS):
+            if textlists is None:
+                from .textlists import import_textlists
+                import_textlists([(project, item_path, item_path)])
+            else:
+                textlists.append((project, item_path, item_path))
+
+
+def process_archive(project, archive, folder=""):
+    """Process a folder of an ExportArchive recursively, like process_directory for folders."""
+    for item in archive.listdir(folder):
+        item_path = folder + "/" + item if folder else item
+
+        if archive.isdir(item_path) and not item.startswith('.'):
+            folder_name = item.split('.')[0]
+            folder_obj = find_or_create_object(project, item_path, folder_name)
+            if folder_obj:
+                process_archive(folder_obj, archive, item_path)
+
+        elif item.endswith('.st'):
+            process_st_content(project, item_path, archive.read_text(item_path))
+
 
-def import_st_files(project_path, source_directory):
+def import_st_files(project_path, source_directory, deferred=True):
     """
     Import ST files from a directory into a CodeSys project.
     
     Args:
         project_path (str): Path to the CodeSys project file
-        source_directory (str): Path to the directory containing ST files
+        source_directory (str): Path to the directory containing ST files or to an export archive
+        deferred (bool): queue the changes in an ImportSession and apply them in one flush
     """
     # Close any open project
-    if projects.primary:
-        projects.primary.close()
+    if scripting.projects.primary:
+        scripting.projects.primary.close()
     
     # Create or open the project
-    proj = projects.create(project_path)
+    proj = scripting.projects.create(project_path)
+    session = ImportSession(proj) if deferred else None
+    root = session.root if deferred else proj
     
-    # Process the source directory
-    process_directory(proj, source_directory)
+    # Process the source directory or archive
+    if os.path.isfile(source_directory):
+        from .export_archive import ExportArchive
+        archive = ExportArchive(source_directory)
+        try:
+            process_archive(root, archive)
+        finally:
+            archive.close()
+    else:
+        from .textlists import import_textlists
+        textlists = []
+        process_directory(root, source_directory, textlists)
+        import_textlists(textlists)
 
+    if deferred:
+        session.flush()
+        if session.errors:
+            print("{0} queued changes failed or were skipped.".format(len(session.errors)))
     proj.save()
     proj.close()
     
     print("Import completed successfully.")
 
 
+def find_textlist_files(project, source_directory):
+    """
+    Text list files below source_directory whose parent folders exist in project, as
+    (parent object, path relative to source_directory, file path) for import_textlists.
+    """
+    textlists = []
+    stack = [(project, source_directory)]
+    while stack:
+        parent, directory_path = stack.pop()
+        for item in sorted(os.listdir(directory_path)):
+            item_path = os.path.join(directory_path, item)
+            if os.path.isdir(item_path) and not item.startswith('.'):
+                found = parent.find(item.split('.')[0], False)
+                if found:
+                    stack.append((found[0], item_path))
+            elif item.endswith(TEXTLIST_EXTENSIONS):
+                relative_path = os.path.relpath(item_path, source_directory).replace(os.sep, '/')
+                textlists.append((parent, relative_path, item_path))
+    return textlists
+
+
+def update_textlists(project, source_directory, state_path):
+    """
+    Import the text lists of an export folder into an open project, only those that changed
+    since the last update recorded in state_path.
+
+    Returns:
+        tuple: (number of text lists imported, number skipped)
+    """
+    from .textlists import TextListState, import_textlists
+    return import_textlists(find_textlist_files(project, source_directory), TextListState(state_path))
+
+
 def process_child_elements(parent_obj, element_tree, text_lines):
     """Process child elements of a parent object based on the parsed element tree."""
     if not element_tree or not element_tree.sub_elements:
@@ -321,8 +409,10 @@ def process_child_elements(parent_obj, element_tree, text_lines):
             process_child_elements(child_obj, sub_element, text_lines)
 
 
-        # Default paths for testing - use raw strings with double backslashes
-project_path = "C:\\Users\\tibor\\Documents\\sample2.project"
-source_directory = "C:\\Users\\tibor\\sample_txt\\st_source"
+if __name__ == "__main__":
+    # Default paths for testing - use raw strings with double backslashes
+    project_path = "C:\\Users\\tibor\\Documents\\sample2.project"
+    source_directory = "C:\\Users\\tibor\\sample_txt\\st_source"
 
-import_st_files(project_path, source_directory) 
\ No newline at end of file
+    with trace_from_environment():
+        import_st_files(project_path, source_directory)
\ No newline at end of file
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Device descriptions for the import of legacy export trees.
+
+Every device folder of a legacy tree (PLC.dev/) holds an identification file (PLC.dev) with
+type=, id= and ver= lines. load.create_dev turns it into a device identification and checks
+that the description is installed before adding the device. DeviceResolver does this once per
+distinct identification, so a project with hundreds of identical I/O couplers asks the device
+repository once, and remembers the identifications found installed in an optional cache file,
+where get_device is skipped on the next import.
+
+validate() resolves all identifications of a tree before the project is touched and raises
+MissingDeviceError listing every missing description, instead of failing half way through:
+
+    resolver = DeviceResolver(cache_path=default_device_cache_path())
+    resolver.validate(find_device_files(source_directory))
+    ...
+    proj.add(name, resolver.device_id(read_device_file(path)))
+"""
+from __future__ import print_function, unicode_literals
+import io
+import json
+import os
+import tempfile
+from collections import Counter
+
+from .cs_export import scripting
+
+DEVICE_SUFFIX = ".dev"
+
+
+def default_device_cache_path():
+    base = os.environ.get("LOCALAPPDATA") or tempfile.gettempdir()
+    return os.path.join(base, "codesys_bridge", "device_identifications.json")
+
+
+def read_device_file(path):
+    """(type, id, version) of a legacy device identification file"""
+    values = {}
+    with io.open(path, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            key, sep, value = line.partition("=")
+            if sep:
+                values[key.strip()] = value.strip()
+    try:
+        return int(values["type"]), values["id"], values["ver"]
+    except (KeyError, ValueError):
+        raise ValueError("{} is not a device identification file".format(path))
+
+
+def find_device_files(source_directory):
+    """(path, identification) of every device folder below source_directory, in walk order"""
+    devices = []
+    for dirpath, dirnames, filenames in os.walk(source_directory):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        name = os.path.basename(dirpath)
+        if name.endswith(DEVICE_SUFFIX) and name in filenames:
+            path = os.path.join(dirpath, name)
+            devices.append((path, read_device_file(path)))
+    return devices
+
+
+def identification_key(identification):
+    return "{} {} {}".format(*identification)
+
+
+class MissingDeviceError(Exception):
+    def __init__(self, missing):
+        self.missing = missing  # (path, identification)
+        super(MissingDeviceError, self).__init__(
+            "Device descriptions not installed:\n" + "\n".join(
+                "{}: type={} id={} ver={}".format(path, *identification) for path, identification in missing))
+
+
+class DeviceResolver(object):
+    """Device identifications by (type, id, version), looked up in the repository once"""
+
+    def __init__(self, repository=None, cache_path=None):
+        self._repository = repository
+        self.cache_path = cache_path
+        self.resolved = {}  # identification: device identification, None if not installed
+        self.known = set()  # keys of identifications found installed, from the cache file
+        self.changed = False
+        self.stats = Counter()
+        if cache_path is not None and os.path.exists(cache_path):
+            try:
+                with io.open(cache_path, "r", encoding="utf-8") as f:
+                    self.known = set(json.load(f))
+            except ValueError:
+                pass
+
+    @property
+    def repository(self):
+        if self._repository is None:
+            self._repository = scripting.device_repository
+        return self._repository
+
+    def resolve(self, identification):
+        """Device identification for (type, id, version), None if its description is not installed"""
+        identification = tuple(identification)
+        self.stats["resolve"] += 1
+        if identification in self.resolved:
+            return self.resolved[identification]
+        device_id = self.repository.create_device_identification(*identification)
+        key = identification_key(identification)
+        if key in self.known:
+            self.stats["cached"] += 1
+        elif self.repository.get_device(device_id) is not None:
+            self.known.add(key)
+            self.changed = True
+        else:
+            device_id = None
+        self.resolved[identification] = device_id
+        return device_id
+
+    def device_id(self, identification, path=None):
+        device_id = self.resolve(identification)
+        if device_id is None:
+            raise MissingDeviceError([(path, tuple(identification))])
+        return device_id
+
+    def validate(self, devices):
+        """
+        Resolve the (path, identification) of devices, e.g. from find_device_files.
+        Raises MissingDeviceError with all devices whose description is missing.
+
+        Returns:
+            int: number of distinct identifications
+        """
+        missing = [(path, tuple(identification)) for path, identification in devices
+                   if self.resolve(identification) is None]
+        if missing:
+            raise MissingDeviceError(missing)
+        return len(self.resolved)
+
+    def save(self):
+        """Write the identifications found installed to the cache file"""
+        if self.cache_path is None or not self.changed:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with io.open(self.cache_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(sorted(self.known), indent=1, ensure_ascii=False))
+        self.changed = False
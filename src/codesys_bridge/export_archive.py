@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Single-file export format: every .st, .xml and .tl output of an export is streamed into one
+zip archive instead of thousands of small files. The zip central directory is the index,
+so single objects can be read by path without extracting the archive.
+
+Paths inside the archive are the paths relative to the save folder, with "/" separators.
+"""
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import zipfile
+
+from .cs_export import export_project
+
+
+def archive_name(relative_path):
+    return relative_path.replace(os.sep, "/")
+
+
+class ArchiveTarget(object):
+    """Export target appending every exported file to a zip archive"""
+
+    def __init__(self, archive_path, compression=zipfile.ZIP_DEFLATED):
+        self.archive_path = archive_path
+        self.zip = zipfile.ZipFile(archive_path, "w", compression)
+        self.temp_folder = tempfile.mkdtemp()
+
+    def make_folder(self, relative_path):
+        # Folders are implied by the member paths
+        pass
+
+    def write_text(self, relative_path, text):
+        self.zip.writestr(archive_name(relative_path), text.encode("utf-8"))
+
+    def export_file(self, relative_path, export):
+        """The IDE exports into a temporary file which is then moved into the archive."""
+        temp_path = os.path.join(self.temp_folder, "export" + os.path.splitext(relative_path)[1])
+        export(temp_path)
+        try:
+            self.zip.write(temp_path, archive_name(relative_path))
+        finally:
+            os.remove(temp_path)
+
+    def close(self):
+        self.zip.close()
+        shutil.rmtree(self.temp_folder, ignore_errors=True)
+
+    def abort(self):
+        """Export failed: close the incomplete archive and remove the temporary folder"""
+        self.close()
+
+
+def export_project_to_archive(project, archive_path):
+    """Export project into a single archive file. Returns the ExportRun."""
+    return export_project(project, os.path.splitext(archive_path)[0], ArchiveTarget(archive_path))
+
+
+class ExportArchive(object):
+    """
+    Read access to an exported archive by path, mirroring the os functions the import and
+    round-trip tools use on export folders (listdir, isdir, exists, read_text).
+    Folder paths are "" for the root or "a/b" without trailing slash.
+    """
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.zip = zipfile.ZipFile(archive_path, "r")
+        self._folders = None
+
+    def close(self):
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def paths(self):
+        """All file paths in the archive, in export order"""
+        return [name for name in self.zip.namelist() if not name.endswith("/")]
+
+    @property
+    def folders(self):
+        """folder -> sorted entry names, built once from the central directory"""
+        if self._folders is None:
+            folders = {"": set()}
+            for path in self.paths():
+                parts = path.split("/")
+                for depth in range(len(parts)):
+                    folder = "/".join(parts[:depth])
+                    folders.setdefault(folder, set()).add(parts[depth])
+            self._folders = dict((folder, sorted(entries)) for folder, entries in folders.items())
+        return self._folders
+
+    def listdir(self, folder=""):
+        folder = folder.strip("/")
+        if folder not in self.folders:
+            raise OSError("No such folder in {}: {}".format(self.archive_path, folder))
+        return list(self.folders[folder])
+
+    def isdir(self, path):
+        return path.strip("/") in self.folders
+
+    def exists(self, path):
+        return self.isdir(path) or path in self.zip.NameToInfo
+
+    def read_bytes(self, path):
+        return self.zip.read(path)
+
+    def digest(self, path):
+        """CRC and size from the central directory, compares members without decompressing them"""
+        info = self.zip.getinfo(path)
+        return "{:08x}-{}".format(info.CRC, info.file_size)
+
+    def read_text(self, path):
+        """Decoded member text with universal newlines, like read_st_file for files"""
+        data = self.zip.read(path)
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            text = data.decode("latin-1")
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+    def open(self, path):
+        """File-like object for a member, read without extracting the archive"""
+        return self.zip.open(path)
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Deferred mutations for bulk imports.
+
+The import code finds or creates every object and replaces its declaration and implementation
+right away, and looks up by name what it just created. In an ImportSession the project tree is
+seen through DeferredObject proxies instead:
+
+- create_* calls and text list imports are queued, the proxy of the new object is returned at once
+- find on an object answers names created in this session from the queue, and names of existing
+  children from a memo, so every name costs at most one find in the IDE
+- replace on a text document only keeps the text; replacing it again drops the earlier text
+- flush() runs the queue in order: objects are created parent first, every document is written
+  once with its last text
+
+Anything else the proxies are asked for (e.g. add, import_native) flushes the queue and goes
+to the real object, so code written for the scripting API keeps working unchanged.
+
+A queued call that fails in the flush doesn't stop the import, like the import code skipping an
+object it can't create: the error is printed and kept in session.errors, the remaining calls are
+run, and the calls on an object that could not be created (its text, its children) are skipped.
+
+    session = ImportSession(project)
+    process_directory(session.root, source_directory)
+    session.save()  # flush and one project.save()
+
+session.stats counts the requested and the executed operations.
+"""
+from __future__ import print_function, unicode_literals
+from collections import Counter
+
+# Queued calls besides create_*
+QUEUED_METHODS = frozenset(["importfile"])
+
+# Attributes read from existing objects without running the queue
+QUERY_ATTRIBUTES = frozenset(["is_folder", "is_textlist", "is_device", "is_task", "is_libman", "type"])
+
+# is_* flags of not yet created objects, by the create call
+CREATED_FLAGS = {
+    "is_folder": "create_folder",
+    "is_textlist": "create_textlist",
+    "is_task": "create_task",
+}
+
+
+class DeferredDocument(object):
+    """textual_declaration or textual_implementation of a DeferredObject"""
+
+    def __init__(self, owner, kind):
+        self.owner = owner
+        self.kind = kind  # "declaration" or "implementation"
+        self.pending_text = None
+
+    @property
+    def session(self):
+        return self.owner.session
+
+    def replace(self, new_text):
+        self.session.stats["replace"] += 1
+        if self.pending_text is None:
+            self.session.operations.append((self, "replace", (), {}))
+        else:
+            self.session.stats["replace_coalesced"] += 1
+        self.pending_text = new_text
+
+    @property
+    def text(self):
+        if self.pending_text is not None:
+            return self.pending_text
+        return self.real().text
+
+    def real(self):
+        self.session.flush()
+        return getattr(self.owner.target, "textual_" + self.kind)
+
+    def write(self):
+        """Write the pending text, called by the flush"""
+        text, self.pending_text = self.pending_text, None
+        if self.owner.has_document(self.kind):
+            getattr(self.owner.target, "textual_" + self.kind).replace(text)
+            self.session.stats["replace_executed"] += 1
+
+    def __getattr__(self, name):
+        return getattr(self.real(), name)
+
+
+class DeferredObject(object):
+    """Proxy of a project tree object, existing (target) or queued for creation (create)"""
+
+    def __init__(self, session, target=None, create=None):
+        self.session = session
+        self.target = target
+        self.create = create  # (api name, name) until the object is created
+        self.documents = {}
+        self.has_documents = {}
+        self.generation = session.generation
+        self.found = {}  # lower case name: proxies of existing children, from find
+        self.created = {}  # lower case name: proxies of children created in the session
+        self.complete = target is None  # no children besides the created ones
+        self.failed = None  # error of the create call, or of the create of a parent
+
+    def memos(self):
+        if self.generation != self.session.generation:
+            self.generation = self.session.generation
+            self.found = {}
+            self.created = {}
+            self.complete = False
+        return self.found, self.created
+
+    @property
+    def name(self):
+        if self.target is None:
+            return self.create[1]
+        return self.target.get_name()
+
+    def get_name(self, localized=False):
+        return self.name
+
+    def find(self, name, recursive=False):
+        self.session.stats["find"] += 1
+        if recursive:
+            return [self.session.wrap(found) for found in self.real().find(name, True)]
+        found, created = self.memos()
+        key = name.lower()
+        if key not in found:
+            if self.complete:
+                found[key] = []
+            else:
+                self.session.stats["find_executed"] += 1
+                found[key] = [self.session.wrap(child) for child in self.target.find(name, False)]
+        return found[key] + created.get(key, [])
+
+    def queue_create(self, api_name):
+        def create(name, *args, **kwargs):
+            self.session.stats["create"] += 1
+            child = DeferredObject(self.session, create=(api_name, name))
+            self.memos()[1].setdefault(name.lower(), []).append(child)
+            self.session.operations.append((self, api_name, (child, name) + args, kwargs))
+            return child
+        return create
+
+    def queue_call(self, method):
+        def call(*args, **kwargs):
+            self.session.stats[method] += 1
+            self.session.operations.append((self, method, args, kwargs))
+        return call
+
+    def has_document(self, kind):
+        """has_textual_declaration / has_textual_implementation of the created object, asked once"""
+        if kind not in self.has_documents:
+            self.has_documents[kind] = getattr(self.real(), "has_textual_" + kind)
+        return self.has_documents[kind]
+
+    @property
+    def has_textual_declaration(self):
+        # for objects still to be created the flush checks before writing
+        return self.target is None or self.has_document("declaration")
+
+    @property
+    def has_textual_implementation(self):
+        return self.target is None or self.has_document("implementation")
+
+    def document(self, kind):
+        if kind not in self.documents:
+            self.documents[kind] = DeferredDocument(self, kind)
+        return self.documents[kind]
+
+    @property
+    def textual_declaration(self):
+        return self.document("declaration")
+
+    @property
+    def textual_implementation(self):
+        return self.document("implementation")
+
+    def real(self):
+        if self.target is None:
+            self.session.flush()
+        if self.failed is not None:
+            raise RuntimeError("{} {} failed: {}".format(self.create[0], self.create[1], self.failed))
+        return self.target
+
+    def __getattr__(self, name):
+        if name.startswith("create_"):
+            return self.queue_create(name)
+        if name in QUEUED_METHODS:
+            return self.queue_call(name)
+        if self.target is None and name in CREATED_FLAGS:
+            return self.create[0] == CREATED_FLAGS[name]
+        if self.target is not None and name in QUERY_ATTRIBUTES:
+            return getattr(self.target, name)
+        # not known to be free of side effects: run the queue, forget what was found
+        self.session.flush()
+        self.session.invalidate()
+        return getattr(self.real(), name)
+
+
+def describe(proxy, method, args):
+    """ "create_action A_Start in FB_Motor" of a queued call"""
+    if method.startswith("create_"):
+        return "{} {} in {}".format(method, args[1], proxy.name)
+    return "{} of {}".format(method, proxy.name)
+
+
+class ImportSession(object):
+    def __init__(self, project):
+        self.project = project
+        self.generation = 0
+        self.operations = []  # (proxy or document, method, args, kwargs) in call order
+        self.stats = Counter()
+        self.errors = []  # (description of the queued call, error) of the failed and skipped calls
+        self.root = DeferredObject(self, project)
+
+    def wrap(self, obj):
+        return DeferredObject(self, obj)
+
+    def invalidate(self):
+        """Drop the find memos, the tree may have changed behind the proxies"""
+        self.generation += 1
+
+    def flush(self):
+        """Execute the queued operations in order"""
+        if not self.operations:
+            return
+        self.stats["flush"] += 1
+        operations, self.operations = self.operations, []
+        for owner, method, args, kwargs in operations:
+            proxy = owner.owner if method == "replace" else owner
+            child = args[0] if method.startswith("create_") else None
+            if proxy.failed is not None:
+                # the object wasn't created, neither can its text be written nor its children created
+                if child is not None:
+                    child.failed = proxy.failed
+                self.stats["skipped"] += 1
+                self.errors.append((describe(proxy, method, args), proxy.failed))
+                continue
+            try:
+                if method == "replace":
+                    owner.write()
+                elif child is not None:
+                    child.target = getattr(owner.target, method)(*args[1:], **kwargs)
+                    child.create = None
+                    self.stats["create_executed"] += 1
+                else:
+                    getattr(owner.target, method)(*args, **kwargs)
+                    self.stats[method + "_executed"] += 1
+            except Exception as e:
+                if child is not None:
+                    child.failed = e
+                self.stats["failed"] += 1
+                self.errors.append((describe(proxy, method, args), e))
+                print("{} failed: {}".format(describe(proxy, method, args), e))
+        # created objects can now be found in the IDE as well, don't report them twice
+        self.invalidate()
+
+    def save(self):
+        """Flush and save the project once"""
+        self.flush()
+        self.project.save()
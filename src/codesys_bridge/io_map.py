@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Map of the direct address bindings (AT %IX0.0, %QW4, %MD10, ...) of an exported source tree.
+
+Every VAR section of every .st file is read with parse_variables, so declarations in comments
+and strings are not taken for bindings. Each address becomes a bit interval of its area: in
+CODESYS the number of %IW1 counts words, so %IW1 covers the bytes 2 and 3, i.e. %IX2.0 to
+%IX3.7, and %ID0 covers %IW0 and %IW1. The intervals of an area go into an IntervalTree,
+which finds the bindings overlapping an address without comparing it to all of them;
+overlaps() walks the intervals sorted by start once.
+
+The bindings of every file are kept in a cache (default <root>/.io_map/bindings.json, a hidden
+folder like .git, so the export tools skip it, with a .gitignore) with the file's size and modification time;
+update() only re-scans new and changed files, in worker processes:
+
+    io_map = IoMap(st_source)
+    io_map.update(processes=None)
+    io_map.save()
+    for first, second in io_map.overlaps():
+        ...
+
+Addresses left open for the I/O mapping (AT %I*) are not bindings and are skipped.
+
+Usage: python -m codesys_bridge.io_map <st_source> [--overlaps] [-j PROCESSES]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+from collections import namedtuple
+
+from .cs_export import make_cache_folder
+from .cs_import import read_st_file
+from .roundtrip import find_st_files
+from .var_table import parse_variables
+
+CACHE_FOLDER = ".io_map"
+CACHE_VERSION = 1
+
+ADDRESS_PATTERN = re.compile(r"%([IQM])([XBWDL]?)(\d+)(?:\.(\d+))?$")
+SIZE_BITS = {"X": 1, "B": 8, "W": 16, "D": 32, "L": 64}
+
+# start and end (exclusive) in bits from the start of the area; sorts by area and position
+Binding = namedtuple("Binding", ["area", "start", "end", "address", "name", "type", "path", "line", "scope"])
+Problem = namedtuple("Problem", ["path", "line", "reason"])
+
+
+def address_interval(address):
+    """
+    (area, first bit, end bit) of a direct address like %QX1.3 or %MW10.
+
+    Raises:
+        ValueError: not a direct address of a single bit, byte, word, double or long word
+    """
+    m = ADDRESS_PATTERN.match(address.upper())
+    if m is None:
+        raise ValueError("{} is not a direct address".format(address))
+    area, size, number, bit = m.groups()
+    size = size or "X"
+    if (size == "X") != (bit is not None):
+        raise ValueError("{} is not a direct address".format(address))
+    if size == "X":
+        if int(bit) > 7:
+            raise ValueError("{}: bit {} of a byte".format(address, bit))
+        start = int(number) * 8 + int(bit)
+    else:
+        start = int(number) * SIZE_BITS[size]
+    return area, start, start + SIZE_BITS[size]
+
+
+class IntervalTree(object):
+    """
+    Static interval tree over (start, end, value) with end exclusive: the intervals sorted by
+    start are the in-order nodes of a balanced tree, every node keeps the largest end below it,
+    so a query skips every subtree ending before it and every node starting after it.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals, key=lambda interval: interval[:2])
+        self.max_end = [0] * len(self.intervals)
+        stack = [(0, len(self.intervals), False)]
+        # post order without recursion: children first, then the node
+        while stack:
+            lo, hi, children_done = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if not children_done:
+                stack.extend([(lo, hi, True), (lo, mid, False), (mid + 1, hi, False)])
+                continue
+            end = self.intervals[mid][1]
+            if mid > lo:
+                end = max(end, self.max_end[(lo + mid) // 2])
+            if hi > mid + 1:
+                end = max(end, self.max_end[(mid + 1 + hi) // 2])
+            self.max_end[mid] = end
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def overlapping(self, start, end):
+        """Indexes into intervals of the intervals overlapping [start, end), ascending"""
+        found = []
+        stack = [(0, len(self.intervals))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] <= start:
+                continue
+            interval = self.intervals[mid]
+            if interval[0] < end:
+                if interval[1] > start:
+                    found.append(mid)
+                stack.append((mid + 1, hi))
+            stack.append((lo, mid))
+        found.sort()
+        return found
+
+
+def scan_file(path):
+    """(path, [(area, start, end, address, name, type, line, scope)], [(line, reason)]) of an ST file"""
+    try:
+        text = read_st_file(path)
+    except (IOError, OSError) as e:
+        return path, [], [(0, "not read: {}".format(e))]
+    if "%" not in text:
+        return path, [], []
+    try:
+        table = parse_variables(text)
+    except (ValueError, AssertionError) as e:
+        return path, [], [(0, "not parsed: {}".format(e))]
+    bindings = []
+    problems = []
+    for row, address in enumerate(table.addresses):
+        if address is None or address.endswith("*"):
+            continue
+        try:
+            area, start, end = address_interval(address)
+        except ValueError as e:
+            problems.append((table.lines[row], str(e)))
+            continue
+        scope = table.sections[table.section_ids[row]][0]
+        bindings.append((area, start, end, address, table.names[row], table.type_names[table.type_ids[row]],
+                         table.lines[row], scope))
+    return path, bindings, problems
+
+
+def scan_files(paths, processes=None, chunksize=16):
+    if processes == 1 or len(paths) < chunksize * 2:
+        return map(scan_file, paths)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return list(pool.imap_unordered(scan_file, paths, chunksize))
+    finally:
+        pool.close()
+        pool.join()
+
+
+class IoMap(object):
+    def __init__(self, root, cache_path=None):
+        self.root = root
+        if cache_path is None:
+            cache_path = os.path.join(make_cache_folder(os.path.join(root, CACHE_FOLDER)), "bindings.json")
+        self.cache_path = cache_path
+        # relative path: {"size", "mtime", "bindings": [[area, start, end, address, name, type, line, scope]],
+        #                 "problems": [[line, reason]]}
+        self.files = {}
+        self.changed = False
+        self._bindings = None
+        self._trees = None
+        if os.path.exists(cache_path):
+            try:
+                with io.open(cache_path, "r", encoding="utf-8") as f:
+                    cache = json.load(f)
+                if cache.get("version") == CACHE_VERSION:
+                    self.files = cache["files"]
+            except ValueError:
+                pass
+
+    def update(self, processes=1):
+        """
+        Re-scan new and changed files, drop removed ones.
+
+        Returns:
+            tuple: (number of files scanned, number of files removed)
+        """
+        stats = {}
+        changed = []
+        for full_path in find_st_files(self.root):
+            path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+            stat = os.stat(full_path)
+            stats[path] = (stat.st_size, stat.st_mtime)
+            known = self.files.get(path)
+            if known is None or (known["size"], known["mtime"]) != stats[path]:
+                changed.append(full_path)
+        removed = [path for path in self.files if path not in stats]
+        for path in removed:
+            del self.files[path]
+        for full_path, bindings, problems in scan_files(changed, processes):
+            path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+            size, mtime = stats[path]
+            self.files[path] = {"size": size, "mtime": mtime, "bindings": bindings, "problems": problems}
+        if changed or removed:
+            self.changed = True
+            self._bindings = self._trees = None
+        return len(changed), len(removed)
+
+    def save(self):
+        if not self.changed:
+            return
+        folder = os.path.dirname(self.cache_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with io.open(self.cache_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": CACHE_VERSION, "files": self.files}, sort_keys=True, ensure_ascii=False))
+        self.changed = False
+
+    @property
+    def bindings(self):
+        """All bindings sorted by area and address"""
+        if self._bindings is None:
+            bindings = []
+            for path, entry in self.files.items():
+                for area, start, end, address, name, type_name, line, scope in entry["bindings"]:
+                    bindings.append(Binding(area, start, end, address, name, type_name, path, line, scope))
+            bindings.sort()
+            self._bindings = bindings
+        return self._bindings
+
+    @property
+    def problems(self):
+        return sorted(Problem(path, line, reason) for path, entry in self.files.items()
+                      for line, reason in entry["problems"])
+
+    def trees(self):
+        """{area: IntervalTree of (start, end, index into bindings)}"""
+        if self._trees is None:
+            intervals = {}
+            for i, binding in enumerate(self.bindings):
+                intervals.setdefault(binding.area, []).append((binding.start, binding.end, i))
+            self._trees = dict((area, IntervalTree(area_intervals)) for area, area_intervals in intervals.items())
+        return self._trees
+
+    def overlapping(self, address):
+        """Bindings sharing at least one bit with address"""
+        area, start, end = address_interval(address)
+        tree = self.trees().get(area)
+        if tree is None:
+            return []
+        return [self.bindings[tree.intervals[i][2]] for i in tree.overlapping(start, end)]
+
+    def overlaps(self):
+        """(binding, later binding) for every two bindings sharing a bit, in map order"""
+        pairs = []
+        for area, tree in sorted(self.trees().items()):
+            intervals = tree.intervals
+            # sorted by start, a later interval overlaps exactly if it starts before the end
+            for i, (start, end, index) in enumerate(intervals):
+                j = i + 1
+                while j < len(intervals) and intervals[j][0] < end:
+                    pairs.append((self.bindings[index], self.bindings[intervals[j][2]]))
+                    j += 1
+        return pairs
+
+
+def describe(binding):
+    return "{} {} : {} ({}:{})".format(binding.address, ".".join(filter(None, [binding.scope, binding.name])),
+                                       binding.type, binding.path, binding.line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List the direct address bindings of an exported source tree")
+    parser.add_argument("root", help="export tree, e.g. <project>_txt/st_source")
+    parser.add_argument("--overlaps", action="store_true", help="only list overlapping bindings")
+    parser.add_argument("--cache", help="cache file (default: <root>/{}/bindings.json)".format(CACHE_FOLDER))
+    parser.add_argument("-j", "--processes", type=int, default=None, help="worker processes for scanning")
+    args = parser.parse_args(argv)
+
+    io_map = IoMap(args.root, args.cache)
+    io_map.update(args.processes)
+    io_map.save()
+    if not args.overlaps:
+        for binding in io_map.bindings:
+            print(describe(binding))
+    overlaps = io_map.overlaps()
+    for first, second in overlaps:
+        print("OVERLAP {} / {}".format(describe(first), describe(second)))
+    for problem in io_map.problems:
+        print("{}:{}: {}".format(*problem))
+    return 1 if overlaps else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
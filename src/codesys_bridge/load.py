@@ -2,6 +2,16 @@
 from __future__ import print_function
 import os
 import shutil
+try:
+	from codesys_bridge.import_session import ImportSession
+except ImportError:  # run on its own, without the bundle
+	ImportSession = None
+try:
+	from codesys_bridge.device_descriptors import (DeviceResolver, MissingDeviceError, default_device_cache_path,
+		find_device_files, read_device_file)
+except ImportError:
+	DeviceResolver = None
+device_resolver = None
 PROJECT = r"C:\Users\tibor\Documents\Pollak\MEProjects\test\me21dxyz.project"
 
 from_folder=r'C:\Users\tibor\Documents\Pollak\MEProjects\me21d_git2\st_source'
@@ -95,6 +105,11 @@ def create_task_old(proj,path,name):
 		
 @check		
 def create_dev(proj,path,name):
+	if device_resolver is not None:
+		# resolved and checked by the validation before the import
+		devId = device_resolver.device_id(read_device_file(os.path.join(path,name)), os.path.join(path,name))
+		proj.add(name.split('.')[0], devId)
+		return
 	type=0
 	id=''
 	ver=''
@@ -311,12 +326,32 @@ def walk_folder(proj,path,tp):
 			else:
 				pass
 
+if DeviceResolver is not None:
+	# every device of the tree is looked up before the project is touched
+	device_resolver = DeviceResolver(cache_path=default_device_cache_path())
+	try:
+		device_resolver.validate(find_device_files(from_folder))
+	except MissingDeviceError as e:
+		system.ui.info(str(e))
+		raise
+	device_resolver.save()
+
 if projects.primary:
 	projects.primary.close()
 
 proj = projects.create(PROJECT)
 
-walk_folder(proj,from_folder,'')
+if ImportSession is not None:
+	# queue the creates and replaces, the check finds are answered from the queue
+	session = ImportSession(proj)
+	walk_folder(session.root,from_folder,'')
+	session.save()
+	if session.errors:
+		# failed creates were skipped, like the try/except of the immediate import
+		system.ui.info("{0} objects not imported:\n{1}".format(
+			len(session.errors), "\n".join("{0}: {1}".format(call, e) for call, e in session.errors[:20])))
+else:
+	walk_folder(proj,from_folder,'')
 
 
 system.ui.info("ok")
\ No newline at end of file
@@ -0,0 +1,559 @@
+# -*- coding: utf-8 -*-
+"""
+Language server (LSP over stdio) for exported ST trees: document symbols (outline), go to
+definition and find references for POUs, methods, actions, properties and variables.
+
+Open documents are kept in memory; edits are applied incrementally and their parse and scan
+results are cached until the next edit. The rest of the workspace is answered from the
+SymbolIndex of the workspace root, built in a worker thread on start and updated after saves.
+Requests run as tasks, so one waiting for the index doesn't hold up later messages; notifications
+are handled in order. $/cancelRequest cancels a request that hasn't been answered yet.
+
+Positions use code points for the character offset; for ST sources, which keep non-BMP
+characters to comments if at all, this matches the UTF-16 offsets of the protocol.
+
+Usage: python -m codesys_bridge.lsp_server   (the editor starts it and talks over stdin/stdout)
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import traceback
+from urllib.parse import unquote, urlparse
+from urllib.request import pathname2url
+
+from .cs_export import IECElement, LineSegment, code_spans, is_var_section, parse_iec_element
+from .symbol_index import DEFINITION, SymbolIndex, scan_text
+from .tree_diff import element_key
+
+# LSP SymbolKind
+SYMBOL_KINDS = {
+    "PROGRAM": 2,  # Module
+    "FUNCTION_BLOCK": 5,  # Class
+    "METHOD": 6,  # Method
+    "PROPERTY": 7,  # Property
+    "INTERFACE": 11,  # Interface
+    "FUNCTION": 12,  # Function
+    "ACTION": 12,  # Function
+    "TYPE": 23,  # Struct
+    "VAR_GLOBAL": 3,  # Namespace
+}
+VARIABLE_KIND = 13
+
+# Variables of these sections are only visible in their element, their references are all in the same document
+PRIVATE_SECTIONS = frozenset(["VAR", "VAR_TEMP", "VAR_STAT", "VAR_INST"])
+
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+REQUEST_CANCELLED = -32800
+
+WORD_PATTERN = re.compile(r"[A-Za-z_]\w*")
+
+# Tokens deciding the element structure and the comment and string boundaries of a document,
+# the element keywords as in cs_export.ELEMENT_PATTERN
+STRUCTURE_PATTERN = re.compile(
+    r"\(\*|\*\)|//|\$.|[\"'%]"
+    r"|\b(?:FUNCTION_BLOCK|FUNCTION|INTERFACE|PROGRAM|TYPE|METHOD|ACTION)\s+\w+\b"
+    r"|\b(?:VAR_GLOBAL|VAR_INPUT|VAR_OUTPUT|VAR_TEMP|VAR_IN_OUT|VAR"
+    r"|END_FUNCTION_BLOCK|END_FUNCTION|END_INTERFACE|END_TYPE|END_PROGRAM|END_VAR|END_METHOD|END_ACTION)\b",
+    re.IGNORECASE | re.DOTALL)
+
+
+def uri_to_path(uri):
+    path = unquote(urlparse(uri).path)
+    if os.name == "nt" and path.startswith("/"):
+        path = path[1:]
+    return os.path.normpath(path)
+
+
+def path_to_uri(path):
+    return "file:" + pathname2url(os.path.abspath(path))
+
+
+def encode_message(message):
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return "Content-Length: {}\r\n\r\n".format(len(body)).encode("ascii") + body
+
+
+async def read_message(reader):
+    """Next JSON-RPC message from reader, None at the end of the stream"""
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            return None
+        line = line.decode("ascii").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers["content-length"]))
+    return json.loads(body.decode("utf-8"))
+
+
+def structure_tokens(text):
+    """(line offset, token) of the STRUCTURE_PATTERN tokens in text, None if it has direct addresses"""
+    tokens = []
+    line = 0
+    pos = 0
+    for m in STRUCTURE_PATTERN.finditer(text):
+        if m.group() == "%":
+            return None  # "%IX0.0(*" is one address, whitespace decides
+        line += text.count("\n", pos, m.end())
+        pos = m.end()
+        tokens.append((line, m.group().upper()))
+    return tokens
+
+
+def shift_element(element, line, delta):
+    """Copy of element with the keyword lines after line moved by delta"""
+
+    def shift(segment):
+        # segments start after the previous keyword line
+        start = segment.start_line - 1
+        return LineSegment((start + delta if start > line else start) + 1,
+                           segment.end_line + delta if segment.end_line > line else segment.end_line)
+
+    return IECElement(element.name, element.type, shift(element.start_segment),
+                      [shift_element(sub, line, delta) for sub in element.sub_elements],
+                      shift(element.body_segment))
+
+
+def make_range(line, start, end_line=None, end=None):
+    """LSP range from a 1-based line and 0-based characters"""
+    return {
+        "start": {"line": line - 1, "character": start},
+        "end": {"line": (end_line or line) - 1, "character": start if end is None else end},
+    }
+
+
+class Document(object):
+    """
+    An open document with its cached parse tree and identifier occurrences. Edits that keep the
+    element keywords, comment delimiters and quotes of the edited lines keep the tree (with
+    shifted line numbers) and only re-scan the edited lines; other edits drop the caches.
+    """
+
+    def __init__(self, uri, text, version=None):
+        self.uri = uri
+        self.path = uri_to_path(uri)
+        self.version = version
+        self.set_text(text)
+
+    def set_text(self, text):
+        self.text = text
+        self._line_starts = None
+        self._occurrences = None
+        self._tree = None
+        self._symbols = None
+
+    @property
+    def line_starts(self):
+        if self._line_starts is None:
+            self._line_starts = [0] + [m.end() for m in re.finditer("\n", self.text)]
+        return self._line_starts
+
+    def offset(self, position):
+        line_starts = self.line_starts
+        if position["line"] >= len(line_starts):
+            return len(self.text)
+        return min(line_starts[position["line"]] + position["character"], len(self.text))
+
+    def line_text(self, line):
+        """Text of the 0-based line without its line break"""
+        line_starts = self.line_starts
+        if line >= len(line_starts):
+            return ""
+        end = line_starts[line + 1] - 1 if line + 1 < len(line_starts) else len(self.text)
+        return self.text[line_starts[line]:end]
+
+    def apply_change(self, change):
+        if "range" not in change:
+            self.set_text(change["text"])
+            return
+        start = self.offset(change["range"]["start"])
+        end = self.offset(change["range"]["end"])
+        text = self.text[:start] + change["text"] + self.text[end:]
+        if self._tree is None or self._occurrences is None:
+            self.set_text(text)
+            return
+
+        # edited lines first..last (1-based), last + delta after the edit
+        first = change["range"]["start"]["line"] + 1
+        last = min(change["range"]["end"]["line"] + 1, len(self.line_starts))
+        delta = change["text"].count("\n") - self.text.count("\n", start, end)
+        old_lines = self.text[self.line_starts[first - 1]:self.offset({"line": last, "character": 0})]
+        tree, occurrences = self._tree, self._occurrences
+        self.set_text(text)
+        new_lines = text[self.line_starts[first - 1]:self.offset({"line": last + delta, "character": 0})]
+        tokens = structure_tokens(old_lines)
+        if tokens is None or tokens != structure_tokens(new_lines):
+            return
+        region = (self.line_starts[first - 1], self.line_starts[first - 1] + len(new_lines))
+        for span_start, span_end in code_spans(text):
+            if span_start >= region[1]:
+                break
+            if span_end > region[0] and "\n" in text[span_start:span_end]:
+                return  # the edited lines are inside a multiline comment or string
+        self._tree = tree = shift_element(tree, last, delta)
+        rescanned = scan_text(text, tree, (first, last + delta))
+        self._occurrences = (
+            [occurrence for occurrence in occurrences if occurrence[1] < first]
+            + rescanned
+            + [occurrence[:1] + (occurrence[1] + delta,) + occurrence[2:]
+               for occurrence in occurrences if occurrence[1] > last])
+
+    @property
+    def occurrences(self):
+        if self._occurrences is None:
+            self._occurrences = scan_text(self.text, self.tree)
+        return self._occurrences
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            try:
+                self._tree = parse_iec_element(self.text)
+            except (ValueError, AssertionError):
+                self._tree = None
+        return self._tree
+
+    def word_at(self, position):
+        line = self.line_text(position["line"])
+        for m in WORD_PATTERN.finditer(line):
+            if m.start() <= position["character"] <= m.end():
+                return m.group()
+        return None
+
+    def element_at(self, position):
+        """Element path at position, None outside of the parsed elements"""
+        line = position["line"] + 1
+        element = self.tree
+        if element is None or not element.start_segment.end_line <= line <= element.body_segment.end_line:
+            return None
+        path = element_key(element, {})[1]
+        while True:
+            counts = {}
+            for sub in element.sub_elements:
+                label = element_key(sub, counts)[1]
+                if sub.start_segment.end_line <= line <= sub.body_segment.end_line:
+                    element = sub
+                    path += "." + label
+                    break
+            else:
+                return path
+
+    def local_definition(self, name, element_path):
+        """
+        Innermost definition of name (lower case) in the elements enclosing element_path, None
+        for names defined at the top level or in another document.
+
+        Returns:
+            tuple: (line, column, scope element path, private variable)
+        """
+        if not element_path:
+            return None
+        best = None
+        for identifier, line, column, path, kind in self.occurrences:
+            if identifier != name or kind != DEFINITION or not path:
+                continue
+            scope, _, label = path.rpartition(".")
+            if not scope or not (element_path == scope or element_path.startswith(scope + ".")):
+                continue
+            if best is None or len(scope) > len(best[2]):
+                best = (line, column, scope, label.split("#")[0] in PRIVATE_SECTIONS)
+        return best
+
+    def symbols(self):
+        """Hierarchical DocumentSymbols of the elements and their variables"""
+        if self._symbols is None:
+            self._symbols = self.build_symbols()
+        return self._symbols
+
+    def build_symbols(self):
+        if self.tree is None:
+            return []
+        variables = {}
+        for name, line, column, path, kind in self.occurrences:
+            if kind == DEFINITION and path:
+                parent, _, section = path.rpartition(".")
+                if is_var_section(section.split("#")[0]):
+                    variables.setdefault(parent or path, []).append((line, column))
+        return [self.element_symbol(self.tree, "", element_key(self.tree, {})[1], variables)]
+
+    def element_symbol(self, element, prefix, label, variables):
+        path = prefix + label
+        line = element.start_segment.end_line
+        end_line = element.body_segment.end_line
+        keyword_line = self.line_text(line - 1)
+        column = keyword_line.find(element.name) if element.name else -1
+        column = max(column, 0)
+        children = []
+        counts = {}
+        for sub in element.sub_elements:
+            sub_label = element_key(sub, counts)[1]
+            if is_var_section(sub.type):
+                continue
+            children.append(self.element_symbol(sub, path + ".", sub_label, variables))
+        for var_line, var_column in variables.get(path, []):
+            name = WORD_PATTERN.match(self.line_text(var_line - 1), var_column).group()
+            children.append({
+                "name": name,
+                "kind": VARIABLE_KIND,
+                "range": make_range(var_line, var_column, end=var_column + len(name)),
+                "selectionRange": make_range(var_line, var_column, end=var_column + len(name)),
+            })
+        children.sort(key=lambda symbol: (symbol["range"]["start"]["line"], symbol["range"]["start"]["character"]))
+        return {
+            "name": element.name or label,
+            "detail": element.type,
+            "kind": SYMBOL_KINDS.get(element.type, 3),
+            "range": make_range(line, 0, end_line, len(self.line_text(end_line - 1))),
+            "selectionRange": make_range(line, column, end=column + len(element.name or "")),
+            "children": children,
+        }
+
+
+def update_index(root, processes):
+    with SymbolIndex(root) as index:
+        return index.update(processes)
+
+
+class LanguageServer(object):
+    def __init__(self, write_message, index_processes=1):
+        self.write_message = write_message
+        self.index_processes = index_processes
+        self.documents = {}
+        self.root = None
+        self.index = None
+        self.index_ready = asyncio.Event()
+        self.index_update = None
+        self.index_update_pending = False
+        self.shutdown_requested = False
+        self.running = True
+        self.requests = {}  # id: task of the requests not answered yet
+        self.handlers = {
+            "initialize": self.initialize,
+            "initialized": self.ignore,
+            "$/cancelRequest": self.cancel_request,
+            "shutdown": self.shutdown,
+            "exit": self.exit,
+            "textDocument/didOpen": self.did_open,
+            "textDocument/didChange": self.did_change,
+            "textDocument/didSave": self.did_save,
+            "textDocument/didClose": self.did_close,
+            "textDocument/documentSymbol": self.document_symbol,
+            "textDocument/definition": self.definition,
+            "textDocument/references": self.references,
+        }
+
+    async def serve(self, reader):
+        while self.running:
+            message = await read_message(reader)
+            if message is None:
+                break
+            if "id" in message:
+                self.requests[message["id"]] = asyncio.ensure_future(self.respond(message))
+                # the request runs up to its first wait before later messages change the documents
+                await asyncio.sleep(0)
+            else:
+                await self.handle(message)
+        for task in list(self.requests.values()):
+            task.cancel()
+        if self.requests:
+            await asyncio.wait(list(self.requests.values()))
+        if self.index_update is not None:
+            await self.index_update
+        if self.index is not None:
+            self.index.close()
+
+    async def respond(self, message):
+        try:
+            response = await self.handle(message)
+        except asyncio.CancelledError:
+            response = {"jsonrpc": "2.0", "id": message["id"],
+                        "error": {"code": REQUEST_CANCELLED, "message": "Request cancelled"}}
+        finally:
+            self.requests.pop(message["id"], None)
+        if response is not None and self.running:
+            self.write_message(response)
+
+    async def handle(self, message):
+        """Dispatch a request or notification, returns the response for requests"""
+        method = message.get("method")
+        handler = self.handlers.get(method)
+        is_request = "id" in message
+        if handler is None:
+            if is_request:
+                return {"jsonrpc": "2.0", "id": message["id"],
+                        "error": {"code": METHOD_NOT_FOUND, "message": "Unknown method {}".format(method)}}
+            return None
+        try:
+            result = await handler(message.get("params") or {})
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            if is_request:
+                return {"jsonrpc": "2.0", "id": message["id"],
+                        "error": {"code": INTERNAL_ERROR, "message": "{}: {}".format(type(e).__name__, e)}}
+            return None
+        if is_request:
+            return {"jsonrpc": "2.0", "id": message["id"], "result": result}
+        return None
+
+    async def ignore(self, params):
+        return None
+
+    async def cancel_request(self, params):
+        task = self.requests.get(params.get("id"))
+        if task is not None:
+            task.cancel()
+
+    async def initialize(self, params):
+        root_uri = params.get("rootUri")
+        if root_uri:
+            self.root = uri_to_path(root_uri)
+            self.schedule_index_update()
+        else:
+            self.index_ready.set()
+        return {
+            "capabilities": {
+                "textDocumentSync": {"openClose": True, "change": 2, "save": True},  # incremental changes
+                "documentSymbolProvider": True,
+                "definitionProvider": True,
+                "referencesProvider": True,
+            },
+            "serverInfo": {"name": "codesys-bridge"},
+        }
+
+    def schedule_index_update(self):
+        """Update the index in a worker thread; an update requested while one runs follows it."""
+        if self.index_update is not None and not self.index_update.done():
+            self.index_update_pending = True
+            return
+        self.index_update = asyncio.ensure_future(self.run_index_update())
+
+    async def run_index_update(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self.index_update_pending = False
+            try:
+                await loop.run_in_executor(None, update_index, self.root, self.index_processes)
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+            if self.index is None:
+                self.index = SymbolIndex(self.root)
+                self.index_ready.set()
+            if not self.index_update_pending:
+                break
+
+    async def shutdown(self, params):
+        self.shutdown_requested = True
+        return None
+
+    async def exit(self, params):
+        self.running = False
+        return None
+
+    async def did_open(self, params):
+        document = params["textDocument"]
+        self.documents[document["uri"]] = Document(document["uri"], document["text"], document.get("version"))
+
+    async def did_change(self, params):
+        document = self.documents[params["textDocument"]["uri"]]
+        for change in params["contentChanges"]:
+            document.apply_change(change)
+        document.version = params["textDocument"].get("version")
+
+    async def did_save(self, params):
+        if self.root is not None:
+            self.schedule_index_update()
+
+    async def did_close(self, params):
+        self.documents.pop(params["textDocument"]["uri"], None)
+
+    async def document_symbol(self, params):
+        document = self.documents.get(params["textDocument"]["uri"])
+        return document.symbols() if document is not None else []
+
+    async def occurrences(self, name, definitions=True, references=True):
+        """Locations of name: open documents from memory, the other files from the index"""
+        locations = []
+        open_paths = set()
+        for document in self.documents.values():
+            open_paths.add(os.path.normcase(document.path))
+            for identifier, line, column, _, kind in document.occurrences:
+                if identifier == name and (definitions if kind == DEFINITION else references):
+                    locations.append({"uri": document.uri, "range": make_range(line, column, end=column + len(name))})
+        await self.index_ready.wait()
+        if self.index is not None:
+            for occurrence in self.index.find(name, definitions_only=not references):
+                if occurrence.definition and not definitions:
+                    continue
+                path = os.path.join(self.root, *occurrence.path.split("/"))
+                if os.path.normcase(path) in open_paths:
+                    continue
+                locations.append({
+                    "uri": path_to_uri(path),
+                    "range": make_range(occurrence.line, occurrence.column, end=occurrence.column + len(name)),
+                })
+        return locations
+
+    def resolve(self, params):
+        """Document, lower case word and its local definition at the request position"""
+        document = self.documents.get(params["textDocument"]["uri"])
+        name = document.word_at(params["position"]) if document is not None else None
+        if name is None:
+            return document, None, None
+        name = name.lower()
+        return document, name, document.local_definition(name, document.element_at(params["position"]))
+
+    async def definition(self, params):
+        document, name, local = self.resolve(params)
+        if name is None:
+            return []
+        if local is not None:
+            line, column, _, _ = local
+            return [{"uri": document.uri, "range": make_range(line, column, end=column + len(name))}]
+        return await self.occurrences(name, references=False)
+
+    async def references(self, params):
+        document, name, local = self.resolve(params)
+        if name is None:
+            return []
+        include_declaration = params.get("context", {}).get("includeDeclaration", True)
+        if local is not None and local[3]:
+            # private variable: the uses in its element of this document
+            scope = local[2]
+            return [{"uri": document.uri, "range": make_range(line, column, end=column + len(name))}
+                    for identifier, line, column, path, kind in document.occurrences
+                    if identifier == name and path and (path == scope or path.startswith(scope + "."))
+                    and (include_declaration or kind != DEFINITION)]
+        return await self.occurrences(name, definitions=include_declaration)
+
+
+async def run_stdio(index_processes=1):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+    output = sys.stdout.buffer
+
+    def write_message(message):
+        output.write(encode_message(message))
+        output.flush()
+
+    server = LanguageServer(write_message, index_processes)
+    await server.serve(reader)
+    return 0 if server.shutdown_requested else 1
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Language server for exported ST trees, over stdio")
+    parser.add_argument("-j", "--processes", type=int, default=1, help="worker processes for building the index")
+    args = parser.parse_args(argv)
+    return asyncio.run(run_stdio(args.processes))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
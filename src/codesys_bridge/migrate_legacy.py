@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Migration of trees written by the legacy export script (export.py) to the current layout.
+
+The legacy export writes one file per object, named by a type suffix (FB_Motor.pou, M_Start.m,
+A_Reset.act, Speed.prop, Get.pm, ...), with the declaration and the implementation behind
+(*#-#-...---Declaration---...*) and (*#-#-...---Implementation---...*) marker lines. An object
+with children becomes a folder of the same name holding its own file and the children.
+
+The migration writes what export_project writes today: one .st file per POU, GVL, DUT and
+interface with its methods, actions and properties nested (cs_tree_dumps), text lists as .tl,
+native task and library manager exports as <name>_task.xml / <name>_lib.xml. Members are
+ordered by name like in the IDE, so the first export after the migration only shows real
+changes. Every file is read once and split at the markers in a single scan; the objects are
+converted in a process pool.
+
+Anything without a counterpart is reported: device identification files (the current export
+needs the native device export), unknown suffixes, members outside of a POU.
+
+Usage: python -m codesys_bridge.migrate_legacy <legacy st_source> <new st_source> [-j PROCESSES]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import ast
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+from collections import namedtuple
+
+from .cs_export import MockScriptTextDocument, clear_save_folder, cs_tree_dumps
+from .textlists import normalize_textlist
+
+LEGACY_MARKER_PATTERN = re.compile(
+    r"\(\*#-#-#-#-#-#-#-#-#-#---(Declaration|Implementation)---#-#-#-#-#-#-#-#-#-#-#-#-#\*\)\n?")
+
+# Legacy suffixes of the objects exported as one .st file
+TEXTUAL_TYPES = frozenset(["pou", "gvl", "dut", "itf"])
+# Legacy suffixes of the members nested in them, with their object type in the current export
+MEMBER_TYPES = {"m": "m", "act": "ACTION", "prop": "prop", "pm": "pm"}
+# Folders named with their type suffix in both layouts
+CONTAINER_TYPES = frozenset(["dev", "tc"])
+# Native exports, legacy suffix: current file name ending
+NATIVE_EXPORTS = {"task": "_task.xml", "lib": "_lib.xml"}
+TEXTLIST_TYPES = frozenset(["tl", "gtl"])
+KNOWN_TYPES = TEXTUAL_TYPES | set(MEMBER_TYPES) | CONTAINER_TYPES | set(NATIVE_EXPORTS) | TEXTLIST_TYPES
+
+UNKNOWN_OBJECT_TYPES = "unknown_object_types.txt"
+
+# path: the object's own legacy file (None if missing), children: LegacyObjects sorted by name
+LegacyObject = namedtuple("LegacyObject", ["name", "type", "path", "children"])
+# path relative to the legacy root
+Problem = namedtuple("Problem", ["path", "reason"])
+
+
+def split_name(entry):
+    """(name, legacy type suffix or "")"""
+    name, dot, suffix = entry.rpartition(".")
+    if dot and suffix in KNOWN_TYPES:
+        return name, suffix
+    return entry, ""
+
+
+def read_legacy_file(path):
+    """Text of a legacy file with \\n line ends; the IDE's \\r\\n was written in text mode as \\r\\r\\n."""
+    with io.open(path, "rb") as f:
+        data = f.read()
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("latin-1")
+    return re.sub("\r+\n?", "\n", text)
+
+
+def split_legacy_text(text):
+    """
+    Split legacy file text at the markers, in one scan.
+
+    Returns:
+        tuple: (text before the first marker, declaration, implementation); declaration and
+            implementation are None without their marker
+    """
+    parts = {"Declaration": None, "Implementation": None}
+    markers = list(LEGACY_MARKER_PATTERN.finditer(text))
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        parts[marker.group(1)] = text[marker.end():end]
+    prefix = text[:markers[0].start()] if markers else text
+    return prefix, parts["Declaration"], parts["Implementation"]
+
+
+class LegacyTree(object):
+    """Legacy export tree, listed once: folders, objects to convert, files to copy, problems"""
+
+    def __init__(self, root):
+        self.root = root
+        self.folders = []  # relative output paths
+        self.objects = []  # (relative output path, LegacyObject)
+        self.copies = []  # (legacy path, relative output path, textlist)
+        self.problems = []
+        self.unknown_object_types = None
+        self.visit(root, "")
+
+    def relative(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def visit(self, directory, output, own_file=None):
+        for entry in sorted(os.listdir(directory)):
+            path = os.path.join(directory, entry)
+            if entry.startswith(".") or entry == own_file:
+                continue
+            name, suffix = split_name(entry)
+            target = join(output, entry)
+            if os.path.isdir(path):
+                if suffix in TEXTUAL_TYPES:
+                    self.objects.append((join(output, name + ".st"), self.load_object(path, name, suffix)))
+                elif suffix in CONTAINER_TYPES or suffix == "":
+                    self.folders.append(target)
+                    if suffix == "dev" and os.path.isfile(os.path.join(path, entry)):
+                        self.problems.append(Problem(self.relative(os.path.join(path, entry)),
+                                                     "device identification only, export the device from the IDE"))
+                    self.visit(path, target, own_file=entry if suffix else None)
+                else:
+                    self.problems.append(Problem(self.relative(path), "folder of a .{} outside of a POU".format(suffix)))
+            elif suffix in TEXTUAL_TYPES:
+                self.objects.append((join(output, name + ".st"), LegacyObject(name, suffix, path, [])))
+            elif suffix in NATIVE_EXPORTS:
+                self.copies.append((path, join(output, name + NATIVE_EXPORTS[suffix]), False))
+            elif suffix in TEXTLIST_TYPES:
+                self.copies.append((path, join(output, name + ".tl"), True))
+            elif entry == UNKNOWN_OBJECT_TYPES and directory == self.root:
+                self.unknown_object_types = path
+            elif suffix == "dev":
+                self.problems.append(Problem(self.relative(path),
+                                             "device identification only, export the device from the IDE"))
+            elif suffix in MEMBER_TYPES:
+                self.problems.append(Problem(self.relative(path), ".{} outside of a POU".format(suffix)))
+            else:
+                self.problems.append(Problem(self.relative(path), "unknown file type"))
+
+    def load_object(self, directory, name, suffix):
+        """LegacyObject of an object folder: its own file and the member files and folders"""
+        own_file = name + "." + suffix
+        path = os.path.join(directory, own_file)
+        if not os.path.isfile(path):
+            self.problems.append(Problem(self.relative(path), "missing, the object is written without text"))
+            path = None
+        children = []
+        for entry in os.listdir(directory):
+            if entry == own_file or entry.startswith("."):
+                continue
+            child_path = os.path.join(directory, entry)
+            child_name, child_suffix = split_name(entry)
+            if child_suffix not in MEMBER_TYPES:
+                self.problems.append(Problem(self.relative(child_path), "not a method, action or property"))
+            elif os.path.isdir(child_path):
+                children.append(self.load_object(child_path, child_name, child_suffix))
+            else:
+                children.append(LegacyObject(child_name, child_suffix, child_path, []))
+        children.sort(key=lambda child: (child.name.lower(), child.name))
+        return LegacyObject(name, suffix, path, children)
+
+
+def join(output, name):
+    return output + "/" + name if output else name
+
+
+def object_type(legacy_type):
+    return MEMBER_TYPES.get(legacy_type, legacy_type)
+
+
+class LegacyScriptObject(object):
+    """The parts of a script object cs_tree_dumps reads, for a converted LegacyObject"""
+
+    __mocked__ = True  # type is the object type itself, not a Guid
+
+    def __init__(self, name, object_type, declaration, implementation, children):
+        self.name = name
+        self.type = object_type
+        self.textual_declaration = None if declaration is None else MockScriptTextDocument(declaration)
+        self.textual_implementation = None if implementation is None else MockScriptTextDocument(implementation)
+        self.children = children
+
+    def get_children(self):
+        return self.children
+
+    def get_name(self):
+        return self.name
+
+    @property
+    def has_textual_declaration(self):
+        return self.textual_declaration is not None
+
+    @property
+    def has_textual_implementation(self):
+        return self.textual_implementation is not None
+
+
+def build_object(legacy_object, problems, root):
+    """Script object tree of a LegacyObject, as cs_tree_dumps reads it from the IDE"""
+    declaration = implementation = None
+    if legacy_object.path is not None:
+        prefix, declaration, implementation = split_legacy_text(read_legacy_file(legacy_object.path))
+        if prefix.strip():
+            problems.append(Problem(os.path.relpath(legacy_object.path, root).replace(os.sep, "/"),
+                                    "text before the first marker dropped"))
+    children = [build_object(child, problems, root) for child in legacy_object.children]
+    return LegacyScriptObject(legacy_object.name, object_type(legacy_object.type), declaration, implementation,
+                              children)
+
+
+def migrate_object(job):
+    """Convert one legacy object and write its .st file. Returns the problems found."""
+    root, save_folder, output, legacy_object = job
+    problems = []
+    try:
+        text = cs_tree_dumps(build_object(legacy_object, problems, root))
+    except (IOError, OSError, ValueError) as e:
+        return [Problem(output, "{}: {}".format(type(e).__name__, e))]
+    with io.open(os.path.join(save_folder, *output.split("/")), "w", encoding="utf-8") as f:
+        f.write(text)
+    return problems
+
+
+def convert_unknown_object_types(path, save_folder):
+    """The legacy {guid: name} to the current {guid: [names]}"""
+    with io.open(path, encoding="utf-8") as f:
+        legacy = ast.literal_eval(f.read() or "{}")
+    with io.open(os.path.join(save_folder, UNKNOWN_OBJECT_TYPES), "w", encoding="utf-8") as f:
+        f.write(str(dict((guid, [name]) for guid, name in legacy.items())))
+
+
+def migrate_tree(legacy_root, save_folder, processes=None, chunksize=16):
+    """
+    Convert the legacy tree below legacy_root into save_folder, replacing its content except
+    hidden entries like .git.
+
+    Returns:
+        tuple: (number of files written, problems sorted by path)
+    """
+    tree = LegacyTree(legacy_root)
+    clear_save_folder(save_folder)
+    for folder in tree.folders:
+        os.makedirs(os.path.join(save_folder, *folder.split("/")))
+
+    problems = list(tree.problems)
+    for legacy_path, output, textlist in tree.copies:
+        target = os.path.join(save_folder, *output.split("/"))
+        if textlist:
+            normalize_textlist(legacy_path, target)
+        else:
+            shutil.copyfile(legacy_path, target)
+    if tree.unknown_object_types is not None:
+        convert_unknown_object_types(tree.unknown_object_types, save_folder)
+
+    jobs = [(legacy_root, save_folder, output, legacy_object) for output, legacy_object in tree.objects]
+    if processes == 1 or len(jobs) < chunksize * 2:
+        results = map(migrate_object, jobs)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = list(pool.imap_unordered(migrate_object, jobs, chunksize))
+        finally:
+            pool.close()
+            pool.join()
+    for job_problems in results:
+        problems.extend(job_problems)
+    problems.sort()
+    return len(jobs) + len(tree.copies), problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a tree of the legacy export script to the current layout")
+    parser.add_argument("legacy_root", help="legacy export, e.g. <project>_git2/st_source")
+    parser.add_argument("save_folder", help="new export folder, its content is replaced (hidden entries kept)")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    save_folder = os.path.abspath(args.save_folder)
+    legacy_root = os.path.abspath(args.legacy_root)
+    if save_folder == legacy_root or save_folder.startswith(legacy_root + os.sep):
+        parser.error("save_folder must not be legacy_root or inside it")
+    written, problems = migrate_tree(args.legacy_root, args.save_folder, args.processes)
+    for problem in problems:
+        print("{}: {}".format(problem.path, problem.reason))
+    print("{} files written, {} entries not migrated.".format(written, len(problems)))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory stand-in for the CodeSys scripting API (projects, project tree objects, PouType,
+DutType, device_repository), so the export and import code can run, be tested and benchmarked
+on plain CPython.
+
+Only what this package calls is implemented. Calls into the API are counted per project in
+MockProject.calls (MockDeviceRepository.calls for the repository), and the latency attribute
+adds a fixed delay to every call to approximate the cost of the real IDE.
+"""
+from __future__ import print_function, unicode_literals
+import io
+import os
+import pickle
+import time
+from collections import Counter
+
+from .cs_export import (
+    MockScriptTextDocument,
+    get_declaration_and_implementation,
+    guid_type,
+    merge_var_sections,
+    parse_iec_element,
+    scripting,
+)
+
+# First GUID of every object type in guid_type, used to give mock objects a type
+GUIDS = {}
+for _guid, _object_type in guid_type.items():
+    GUIDS.setdefault(_object_type, _guid)
+GUIDS["unknown"] = "40b404f9-e5dc-42c6-907f-c89f4a517386"  # Plc Logic, not in guid_type
+
+# Element types of the exported text to mock object types
+ELEMENT_OBJECT_TYPES = {
+    "FUNCTION_BLOCK": "pou",
+    "FUNCTION": "pou",
+    "PROGRAM": "pou",
+    "INTERFACE": "itf",
+    "TYPE": "dut",
+    "VAR_GLOBAL": "gvl",
+    "METHOD": "m",
+    "ACTION": "ACTION",
+}
+
+
+class PouType(object):
+    Program = "Program"
+    FunctionBlock = "FunctionBlock"
+    Function = "Function"
+
+
+class DutType(object):
+    Structure = "Structure"
+    Union = "Union"
+    Enumeration = "Enumeration"
+    Alias = "Alias"
+
+
+class MockGuid(object):
+    def __init__(self, value):
+        self.value = value
+
+    def ToString(self):
+        return self.value
+
+
+class MockDeviceId(object):
+    def __init__(self, type, id, version):
+        self.type = type
+        self.id = id
+        self.version = version
+
+
+class MockDeviceDescription(object):
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.name = "{} {}".format(device_id.id, device_id.version)
+
+
+class MockDeviceRepository(object):
+    """The `device_repository` object, knowing the installed (type, id, version) identifications"""
+
+    def __init__(self, installed=(), latency=0.0):
+        self.installed = set(installed)
+        self.latency = latency
+        self.calls = Counter()
+
+    def record_call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create_device_identification(self, type, id, version):
+        self.record_call("create_device_identification")
+        return MockDeviceId(type, id, version)
+
+    def get_device(self, device_id):
+        self.record_call("get_device")
+        if (device_id.type, device_id.id, device_id.version) in self.installed:
+            return MockDeviceDescription(device_id)
+        return None
+
+
+class MockLibrary(object):
+    def __init__(self, name, version):
+        self.name = name
+        self.version = version
+
+
+class MockTextDocument(MockScriptTextDocument):
+    """Text document that counts replace calls on its project"""
+
+    def __init__(self, owner, text):
+        super(MockTextDocument, self).__init__(text)
+        self.owner = owner
+
+    def replace(self, new_text):
+        self.owner.record_call("replace")
+        super(MockTextDocument, self).replace(new_text)
+
+
+class MockContainer(object):
+    """Children handling and object creation shared by projects and tree objects"""
+
+    def __init__(self):
+        self.parent = None
+        self.children = []
+
+    def add(self, child):
+        """Attach child without counting an API call, used to build mock projects."""
+        child.parent = self
+        self.children.append(child)
+        return child
+
+    @property
+    def project(self):
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node if isinstance(node, MockProject) else None
+
+    def record_call(self, name):
+        project = self.project
+        if project is not None:
+            project.calls[name] += 1
+            if project.latency:
+                time.sleep(project.latency)
+
+    def get_children(self, recursive=False):
+        self.record_call("get_children")
+        if not recursive:
+            return list(self.children)
+        result = []
+        for child in self.children:
+            result.append(child)
+            result.extend(child.get_children(True))
+        return result
+
+    def find(self, name, recursive=False):
+        self.record_call("find")
+        candidates = self.children
+        if recursive:
+            candidates = []
+            stack = list(reversed(self.children))
+            while stack:
+                node = stack.pop()
+                candidates.append(node)
+                stack.extend(reversed(node.children))
+        return [child for child in candidates if child.name.lower() == name.lower()]
+
+    def _create(self, api_name, name, object_type, declaration="", implementation=None):
+        self.record_call(api_name)
+        return self.add(MockTreeObject(name, object_type, declaration, implementation))
+
+    def create_folder(self, name):
+        return self._create("create_folder", name, "folder", declaration=None)
+
+    def create_pou(self, name, type=None, language=None, return_type=None):
+        return self._create("create_pou", name, "pou", implementation="")
+
+    def create_gvl(self, name):
+        return self._create("create_gvl", name, "gvl")
+
+    def create_dut(self, name, type=None):
+        return self._create("create_dut", name, "dut")
+
+    def create_interface(self, name):
+        return self._create("create_interface", name, "itf")
+
+    def create_method(self, name, return_type=None):
+        return self._create("create_method", name, "m", implementation="")
+
+    def create_action(self, name):
+        return self._create("create_action", name, "ACTION", declaration=None, implementation="")
+
+    def create_property(self, name, return_type=None):
+        return self._create("create_property", name, "prop")
+
+    def create_textlist(self, name):
+        return self._create("create_textlist", name, "tl", declaration=None)
+
+    def create_task_configuration(self):
+        return self._create("create_task_configuration", "Task Configuration", "tc", declaration=None)
+
+    def create_task(self, name):
+        return self._create("create_task", name, "task", declaration=None)
+
+
+class MockTreeObject(MockContainer):
+    """A project tree object, see the ScriptObject of the CodeSys scripting API"""
+
+    def __init__(self, name, object_type, declaration=None, implementation=None, children=(), content=None,
+                 version=None):
+        super(MockTreeObject, self).__init__()
+        self.name = name
+        self.object_type = object_type
+        self.version = version  # device description or library version
+        self.type = MockGuid(GUIDS[object_type])
+        self._declaration = None if declaration is None else MockTextDocument(self, declaration)
+        self._implementation = None if implementation is None else MockTextDocument(self, implementation)
+        self.content = content  # text list entries, device description, ...
+        for child in children:
+            self.add(child)
+
+    def get_name(self, localized=False):
+        self.record_call("get_name")
+        return self.name
+
+    @property
+    def has_textual_declaration(self):
+        self.record_call("has_textual_declaration")
+        return self._declaration is not None
+
+    @property
+    def has_textual_implementation(self):
+        self.record_call("has_textual_implementation")
+        return self._implementation is not None
+
+    @property
+    def textual_declaration(self):
+        self.record_call("textual_declaration")
+        return self._declaration
+
+    @property
+    def textual_implementation(self):
+        self.record_call("textual_implementation")
+        return self._implementation
+
+    @property
+    def is_device(self):
+        return self.object_type == "dev"
+
+    @property
+    def is_task(self):
+        return self.object_type == "task"
+
+    @property
+    def is_libman(self):
+        return self.object_type == "lib"
+
+    @property
+    def is_textlist(self):
+        return self.object_type in ("tl", "gtl")
+
+    @property
+    def is_folder(self):
+        return self.object_type == "folder"
+
+    def get_device_identification(self):
+        self.record_call("get_device_identification")
+        return MockDeviceId(4096, "1001 " + self.name, self.version)
+
+    def get_libraries(self):
+        self.record_call("get_libraries")
+        return [MockLibrary(name, self.version) for name in (self.content or "").split(",") if name]
+
+    def export(self, path):
+        """Text list export"""
+        self.record_call("export")
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(self.content or "")
+
+    def importfile(self, path):
+        """Text list import"""
+        self.record_call("importfile")
+        with io.open(path, "r", encoding="utf-8") as f:
+            self.content = f.read()
+
+    def remove(self):
+        self.record_call("remove")
+        self.parent.children.remove(self)
+        self.parent = None
+
+
+class MockProject(MockContainer):
+    def __init__(self, path, children=(), latency=0.0):
+        super(MockProject, self).__init__()
+        self.path = path
+        self.latency = latency
+        self.calls = Counter()
+        self.closed = False
+        for child in children:
+            self.add(child)
+
+    def export_native(self, objects, path, recursive=False):
+        self.record_call("export_native")
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write("<export recursive=\"{}\">\n".format(recursive))
+            for obj in objects:
+                f.write("  <object name=\"{}\" type=\"{}\">{}</object>\n".format(
+                    obj.name, obj.type.ToString(), obj.content or ""))
+            f.write("</export>\n")
+
+    def import_native(self, path):
+        self.record_call("import_native")
+
+    def save(self):
+        self.record_call("save")
+
+    def close(self):
+        self.record_call("close")
+        self.closed = True
+
+
+class MockProjects(object):
+    """The `projects` object of the scripting API"""
+
+    def __init__(self):
+        self._primary = None
+
+    @property
+    def primary(self):
+        """The primary project, None once it was closed"""
+        if self._primary is not None and self._primary.closed:
+            self._primary = None
+        return self._primary
+
+    def create(self, path, primary=True):
+        project = MockProject(path)
+        if primary:
+            self._primary = project
+        return project
+
+    def open(self, path, password=None, primary=True):
+        project = load_mock_project(path)
+        if primary:
+            self._primary = project
+        return project
+
+
+def save_mock_project(project, path=None):
+    """Store project at path (default project.path), so MockProjects.open can load it in another process."""
+    path = path or project.path
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, "wb") as f:
+        pickle.dump(project, f, pickle.HIGHEST_PROTOCOL)
+
+
+def load_mock_project(path):
+    with open(path, "rb") as f:
+        project = pickle.load(f)
+    project.path = path
+    project.calls = Counter()
+    project.closed = False
+    return project
+
+
+def open_mock_project(path):
+    """Picklable project opener for worker processes"""
+    return MockProjects().open(path)
+
+
+def install(projects=None, device_repository=None):
+    """Make the mock API available to the code using cs_export.scripting. Returns the projects object."""
+    if projects is None:
+        projects = MockProjects()
+    if device_repository is None:
+        device_repository = MockDeviceRepository()
+    scripting.install(projects=projects, PouType=PouType, DutType=DutType, device_repository=device_repository)
+    return projects
+
+
+def uninstall():
+    scripting.uninstall("projects", "PouType", "DutType", "device_repository")
+
+
+def mock_object_from_element(element, text_lines, deindent_level=0, in_interface=False):
+    object_type = ELEMENT_OBJECT_TYPES.get(element.type, "unknown")
+    declaration, implementation = get_declaration_and_implementation(element, text_lines, deindent_level)
+    children = [
+        mock_object_from_element(sub, text_lines, deindent_level + 1, object_type == "itf")
+        for sub in element.sub_elements
+    ]
+    # Like in the IDE, actions have no declaration and only POUs, methods and actions an implementation
+    has_implementation = object_type in ("pou", "m", "ACTION") and not in_interface
+    return MockTreeObject(
+        element.name,
+        object_type,
+        None if object_type == "ACTION" else "".join(declaration),
+        "".join(implementation) if has_implementation else None,
+        children,
+    )
+
+
+def textual_object(text):
+    """Build a mock POU, GVL, DUT or interface (with methods and actions) from exported text."""
+    element = merge_var_sections(parse_iec_element(text))
+    return mock_object_from_element(element, text.splitlines(True))
+
+
+def folder(name, *children):
+    return MockTreeObject(name, "folder", children=children)
+
+
+def application(name, *children):
+    return MockTreeObject(name, "application", children=children)
+
+
+def device(name, *children, **kwargs):
+    """A PLC device with its Plc Logic node holding the given children (applications)"""
+    return MockTreeObject(name, "dev", children=[MockTreeObject("Plc Logic", "unknown", children=children)],
+                          content="device {}".format(name), version=kwargs.get("version", "1.0.0.0"))
+
+
+def library_manager(name="Library Manager", libraries=(), version="3.5.17.0"):
+    return MockTreeObject(name, "lib", content=",".join(libraries), version=version)
+
+
+def textlist(name, content=""):
+    return MockTreeObject(name, "tl", content=content)
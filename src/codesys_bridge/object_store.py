@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed storage for exports, so many near-identical projects (machine variants,
+versions) share what they have in common.
+
+Layout below the store root:
+    objects/<2 hex>/<62 hex>   blobs: zlib-compressed file content, keyed by sha256 of the content
+    trees/<sha256>.json        trees: export path -> blob hash, keyed by sha256 of the JSON
+    refs/<name>                tree hash of a named export, e.g. a machine variant
+
+Usage:
+    python -m codesys_bridge.object_store add <store> <ref> <st_source>
+    python -m codesys_bridge.object_store checkout <store> <ref> <destination>
+    python -m codesys_bridge.object_store refs <store>
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+
+from .cs_export import export_project
+
+
+def write_atomic(path, data):
+    """Write data to a temporary file next to path and move it in place."""
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    fd, temp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ObjectStore(object):
+    def __init__(self, root):
+        self.root = root
+        self.blobs_written = 0
+        self.blobs_reused = 0
+        self.known_blobs = set()  # hashes known to exist, saves a stat per blob when the store is reused
+
+    def blob_path(self, blob_hash):
+        return os.path.join(self.root, "objects", blob_hash[:2], blob_hash[2:])
+
+    def tree_path(self, tree_hash):
+        return os.path.join(self.root, "trees", tree_hash + ".json")
+
+    def ref_path(self, name):
+        return os.path.join(self.root, "refs", name)
+
+    def put_blob(self, data):
+        """Store bytes, returns their hash. Existing blobs are not written again."""
+        blob_hash = hashlib.sha256(data).hexdigest()
+        if blob_hash in self.known_blobs:
+            self.blobs_reused += 1
+            return blob_hash
+        path = self.blob_path(blob_hash)
+        if os.path.exists(path):
+            self.blobs_reused += 1
+        else:
+            write_atomic(path, zlib.compress(data))
+            self.blobs_written += 1
+        self.known_blobs.add(blob_hash)
+        return blob_hash
+
+    def get_blob(self, blob_hash):
+        with open(self.blob_path(blob_hash), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def put_tree(self, tree):
+        """Store a {path: blob hash} mapping, returns the tree hash."""
+        data = json.dumps(tree, sort_keys=True, indent=0).encode("utf-8")
+        tree_hash = hashlib.sha256(data).hexdigest()
+        path = self.tree_path(tree_hash)
+        if not os.path.exists(path):
+            write_atomic(path, data)
+        return tree_hash
+
+    def get_tree(self, tree_hash):
+        with io.open(self.tree_path(tree_hash), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def set_ref(self, name, tree_hash):
+        write_atomic(self.ref_path(name), tree_hash.encode("ascii"))
+
+    def get_ref(self, name):
+        with open(self.ref_path(name), "rb") as f:
+            return f.read().decode("ascii").strip()
+
+    def refs(self):
+        folder = os.path.join(self.root, "refs")
+        if not os.path.exists(folder):
+            return []
+        return sorted(os.listdir(folder))
+
+    def resolve(self, ref_or_tree):
+        """Tree of a ref name or a tree hash"""
+        if os.path.exists(self.ref_path(ref_or_tree)):
+            return self.get_tree(self.get_ref(ref_or_tree))
+        return self.get_tree(ref_or_tree)
+
+    def add_folder(self, folder, ref=None):
+        """Store an existing export folder. Returns the tree hash."""
+        tree = {}
+        for dirpath, dirnames, filenames in os.walk(folder):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                with open(path, "rb") as f:
+                    tree[os.path.relpath(path, folder).replace(os.sep, "/")] = self.put_blob(f.read())
+        tree_hash = self.put_tree(tree)
+        if ref:
+            self.set_ref(ref, tree_hash)
+        return tree_hash
+
+    def checkout(self, ref_or_tree, destination, paths=None):
+        """
+        Materialize a tree (or only the given paths of it) below destination. Files that
+        already have the right content are left alone. A full checkout also removes the files
+        and emptied folders not in the tree, except hidden entries like .git. Returns the
+        number of files written.
+        """
+        tree = self.resolve(ref_or_tree)
+        if paths is None and os.path.exists(destination):
+            self.remove_untracked(tree, destination)
+        written = 0
+        for path in (paths if paths is not None else sorted(tree)):
+            data = self.get_blob(tree[path])
+            target = os.path.join(destination, *path.split("/"))
+            if os.path.exists(target):
+                with open(target, "rb") as f:
+                    if f.read() == data:
+                        continue
+            write_atomic(target, data)
+            written += 1
+        return written
+
+    @staticmethod
+    def remove_untracked(tree, destination):
+        """Remove the files below destination that are not in tree, and the folders left empty"""
+        for dirpath, dirnames, filenames in os.walk(destination, topdown=False):
+            if any(part.startswith(".") for part in os.path.relpath(dirpath, destination).split(os.sep)
+                   if part != os.curdir):
+                continue
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if not filename.startswith(".") and os.path.relpath(path, destination).replace(os.sep, "/") not in tree:
+                    os.remove(path)
+            if dirpath != destination and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+
+class StoredTree(object):
+    """Read access to a stored tree by path without a checkout"""
+
+    def __init__(self, store, ref_or_tree):
+        self.store = store
+        self.tree = store.resolve(ref_or_tree)
+
+    def paths(self):
+        return sorted(self.tree)
+
+    def read_bytes(self, path):
+        return self.store.get_blob(self.tree[path])
+
+    def digest(self, path):
+        return self.tree[path]
+
+    def read_text(self, path):
+        return self.read_bytes(path).decode("utf-8").replace("\r\n", "\n")
+
+
+class StoreTarget(object):
+    """Export target putting every exported file into an ObjectStore, see ExportRun"""
+
+    def __init__(self, store, ref):
+        self.store = store
+        self.ref = ref
+        self.tree = {}
+        self.tree_hash = None
+        self.temp_folder = tempfile.mkdtemp()
+
+    def make_folder(self, relative_path):
+        pass
+
+    def add(self, relative_path, data):
+        self.tree[relative_path.replace(os.sep, "/")] = self.store.put_blob(data)
+
+    def write_text(self, relative_path, text):
+        self.add(relative_path, text.encode("utf-8"))
+
+    def export_file(self, relative_path, export):
+        temp_path = os.path.join(self.temp_folder, "export" + os.path.splitext(relative_path)[1])
+        export(temp_path)
+        try:
+            with open(temp_path, "rb") as f:
+                self.add(relative_path, f.read())
+        finally:
+            os.remove(temp_path)
+
+    def close(self):
+        shutil.rmtree(self.temp_folder, ignore_errors=True)
+        self.tree_hash = self.store.put_tree(self.tree)
+        self.store.set_ref(self.ref, self.tree_hash)
+
+    def abort(self):
+        """Export failed: remove the temporary folder, the ref keeps its earlier tree"""
+        shutil.rmtree(self.temp_folder, ignore_errors=True)
+
+
+def export_project_to_store(project, store, ref):
+    """Export project into store (an ObjectStore or its root folder) under ref. Returns the StoreTarget."""
+    if not isinstance(store, ObjectStore):
+        store = ObjectStore(store)
+    target = StoreTarget(store, ref)
+    export_project(project, os.path.join(store.root, ref), target)
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Content-addressed store for exports")
+    subparsers = parser.add_subparsers(dest="command")
+    add = subparsers.add_parser("add", help="store an export folder under a ref")
+    add.add_argument("store")
+    add.add_argument("ref")
+    add.add_argument("folder")
+    checkout = subparsers.add_parser("checkout", help="materialize a ref or tree into a folder")
+    checkout.add_argument("store")
+    checkout.add_argument("ref")
+    checkout.add_argument("destination")
+    refs = subparsers.add_parser("refs", help="list refs")
+    refs.add_argument("store")
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        parser.print_help()
+        return 2
+    store = ObjectStore(args.store)
+    if args.command == "add":
+        tree_hash = store.add_folder(args.folder, args.ref)
+        print("{} {} ({} new blobs, {} reused)".format(args.ref, tree_hash, store.blobs_written, store.blobs_reused))
+    elif args.command == "checkout":
+        written = store.checkout(args.ref, args.destination)
+        print("{} files written to {}".format(written, args.destination))
+    elif args.command == "refs":
+        for name in store.refs():
+            print("{} {}".format(name, store.get_ref(name)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
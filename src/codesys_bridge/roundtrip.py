@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Round-trip verifier for exported trees: every .st file is parsed, turned into a mock
+script object tree and dumped again with cs_tree_dumps. Files whose dump differs from
+the original would not re-import losslessly.
+
+Usage: python -m codesys_bridge.roundtrip <st_source or export archive> [-j PROCESSES]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import multiprocessing
+import os
+import sys
+from collections import namedtuple
+
+from .cs_export import (
+    parse_iec_element,
+    merge_var_sections,
+    create_lazy_mock_cs_script_object,
+    cs_tree_dumps,
+)
+from .cs_import import read_st_file
+from .export_archive import ExportArchive
+
+# line is 1-based; error is set instead of line/expected/actual when the file can't be parsed
+RoundTripFailure = namedtuple(
+    "RoundTripFailure", ["path", "line", "expected", "actual", "error"]
+)
+
+
+def find_st_files(root):
+    """Return sorted paths of all .st files below root, skipping hidden directories."""
+    st_files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            if filename.endswith(".st"):
+                st_files.append(os.path.join(dirpath, filename))
+    st_files.sort()
+    return st_files
+
+
+def roundtrip_text(text):
+    """text -> IECElement tree -> mock script objects -> text"""
+    element = parse_iec_element(text)
+    if element is None:
+        raise ValueError("No IEC element found")
+    tree = merge_var_sections(element)
+    return cs_tree_dumps(create_lazy_mock_cs_script_object(tree, text.splitlines(True)))
+
+
+def first_difference(expected, actual):
+    """Return (line, expected_line, actual_line) of the first differing line or None if equal.
+    Lines keep their line endings, a missing line is reported as None."""
+    if expected == actual:
+        return None
+    expected_lines = expected.splitlines(True)
+    actual_lines = actual.splitlines(True)
+    for index in range(max(len(expected_lines), len(actual_lines))):
+        expected_line = expected_lines[index] if index < len(expected_lines) else None
+        actual_line = actual_lines[index] if index < len(actual_lines) else None
+        if expected_line != actual_line:
+            return index + 1, expected_line, actual_line
+
+
+def verify_text(path, read):
+    """Return a RoundTripFailure for the text read(path), or None if it round-trips losslessly."""
+    try:
+        text = read(path)
+        difference = first_difference(text, roundtrip_text(text))
+    except Exception as e:
+        return RoundTripFailure(path, None, None, None, "{}: {}".format(type(e).__name__, e))
+    if difference is None:
+        return None
+    return RoundTripFailure(path, difference[0], difference[1], difference[2], None)
+
+
+def verify_file(path):
+    return verify_text(path, read_st_file)
+
+
+# Archives opened by this (worker) process, by archive path
+_open_archives = {}
+
+
+def verify_archive_member(archive_and_member):
+    archive_path, member = archive_and_member
+    if archive_path not in _open_archives:
+        _open_archives[archive_path] = ExportArchive(archive_path)
+    return verify_text(member, _open_archives[archive_path].read_text)
+
+
+def run_verification(function, items, processes=None, chunksize=64):
+    if processes == 1 or len(items) < chunksize:
+        failures = [r for r in map(function, items) if r is not None]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            failures = [r for r in pool.imap_unordered(function, items, chunksize) if r is not None]
+        finally:
+            pool.close()
+            pool.join()
+    failures.sort(key=lambda failure: failure.path)
+    return failures
+
+
+def verify_files(paths, processes=None, chunksize=64):
+    """Verify paths in a process pool. processes=1 runs in the current process.
+    Returns failures sorted by path."""
+    return run_verification(verify_file, paths, processes, chunksize)
+
+
+def verify_archive(archive_path, processes=None, chunksize=64):
+    """Round-trip every .st member of an export archive, each worker reads members by path.
+    Returns (number of files checked, failures)."""
+    with ExportArchive(archive_path) as archive:
+        members = sorted(path for path in archive.paths() if path.endswith(".st"))
+    items = [(archive_path, member) for member in members]
+    return len(members), run_verification(verify_archive_member, items, processes, chunksize)
+
+
+def verify_tree(root, processes=None):
+    """Round-trip every .st file below root. Returns (number of files checked, failures)."""
+    paths = find_st_files(root)
+    return len(paths), verify_files(paths, processes)
+
+
+def format_failure(failure, root=None):
+    path = os.path.relpath(failure.path, root) if root else failure.path
+    if failure.error:
+        return "{}: {}".format(path, failure.error)
+    return "{}:{}\n  expected: {!r}\n  actual:   {!r}".format(
+        path, failure.line, failure.expected, failure.actual
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that exported .st files survive text -> tree -> text")
+    parser.add_argument("root", help="export tree, e.g. <project>_txt/st_source, or export archive")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if os.path.isfile(args.root):
+        checked, failures = verify_archive(args.root, args.processes)
+        root = None
+    else:
+        checked, failures = verify_tree(args.root, args.processes)
+        root = args.root
+    for failure in failures:
+        print(format_failure(failure, root))
+    print("{} of {} files differ after round trip.".format(len(failures), checked))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
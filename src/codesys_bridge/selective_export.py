@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Selective export: only the parts of the project tree picked by include/exclude filters are
+exported, into an existing export tree or a new folder.
+
+Patterns are name paths from the project root like those of TreeHandle, compared
+case-insensitively with fnmatch; a "**" level matches any number of levels:
+
+    PLC/Plc Logic/Application/Motors     the Motors folder with everything below it
+    */Plc Logic/Application/FB_*         the FB_ objects of the applications of all devices
+    **/Tests                             every object named Tests, at any depth
+
+Object types are those of guid_type ("pou", "gvl", "dev", "lib", "tl", "folder", ...). The
+filter is evaluated on every object before its children are asked for, so an excluded subtree,
+or one no include pattern can match anymore, costs no IDE call beyond the name of its root:
+
+    export_filter = ExportFilter(include=["*/Plc Logic/Application/Motors"], exclude=["**/Test*"])
+    export_selected(project, save_folder, export_filter)
+
+Objects above a selected one are walked through: their folders are created, their own files
+(device XML, ...) are not written. With `types`, only objects of these types are written and
+containers of other types are walked through; textual objects are exported with their methods
+and actions, so they can't be walked through.
+
+Nothing outside the selected subtrees is touched. In the folder of a selected object whose
+children were all visited, files and folders of objects no longer in the project are removed;
+files of excluded children are kept. Unknown object types are added to unknown_object_types.txt.
+
+Usage (IDE with --scriptargs, exports the primary project):
+    selective_export.py [--include PATTERN]... [--exclude PATTERN]... [--type TYPE]...
+                        [--exclude-type TYPE]... [--save-folder FOLDER] [--native-cache [FOLDER]]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import ast
+import io
+import os
+import shutil
+import sys
+from fnmatch import fnmatchcase
+
+from .cs_export import (
+    ExportRun,
+    NativeExportCache,
+    default_native_cache_folder,
+    export_object,
+    get_save_folder,
+    guid_type,
+    scripting,
+    write_unknown_object_types,
+)
+from .tracing import traced
+from .tree_handle import split_path
+
+# Actions of ExportFilter.select
+EXPORT = "export"  # export the object and walk its children
+DESCEND = "descend"  # only walk the children, the object itself is not written
+SKIP = "skip"  # neither the object nor anything below it
+
+# Results of match_names
+MATCH = "match"
+PREFIX = "prefix"  # a descendant may match
+
+UNKNOWN_OBJECT_TYPES_FILE = "unknown_object_types.txt"
+
+
+def match_names(parts, names):
+    """MATCH if the lower case name path names matches the pattern levels parts, PREFIX if a descendant may"""
+    if not parts:
+        return MATCH if not names else None
+    if not names:
+        return PREFIX
+    if parts[0] == "**":
+        results = (match_names(parts[1:], names), match_names(parts, names[1:]))
+        if MATCH in results:
+            return MATCH
+        return PREFIX if PREFIX in results else None
+    if fnmatchcase(names[0], parts[0]):
+        return match_names(parts[1:], names[1:])
+    return None
+
+
+class ExportFilter(object):
+    """
+    Selection of the objects to export. An object is exported if it or one of its parents
+    matches an include pattern (everything without include patterns), neither it nor one of
+    its parents matches an exclude pattern or type, and its type is in types (if given).
+    """
+
+    def __init__(self, include=(), exclude=(), types=(), exclude_types=()):
+        self.include = [[part.lower() for part in split_path(pattern)] for pattern in include]
+        self.exclude = [[part.lower() for part in split_path(pattern)] for pattern in exclude]
+        self.types = set(object_type.lower() for object_type in types)
+        self.exclude_types = set(object_type.lower() for object_type in exclude_types)
+
+    def select(self, names, object_type, included):
+        """
+        Args:
+            names: name path of the object from the project root
+            object_type: type of the object, see guid_type
+            included: an include pattern matched a parent of the object
+
+        Returns:
+            tuple: (EXPORT, DESCEND or SKIP, True if the object's subtree is included)
+        """
+        object_type = object_type.lower()
+        names = [name.lower() for name in names]
+        if object_type in self.exclude_types:
+            return SKIP, False
+        if any(match_names(parts, names) == MATCH for parts in self.exclude):
+            return SKIP, False
+        if not included:
+            results = [match_names(parts, names) for parts in self.include]
+            if MATCH in results:
+                included = True
+            elif PREFIX in results:
+                return DESCEND, False
+            else:
+                return SKIP, False
+        if self.types and object_type not in self.types:
+            return DESCEND, True
+        return EXPORT, True
+
+
+def object_entries(name, object_type):
+    """Names of the files and folders export_object may create for an object in its parent's folder"""
+    entries = set([name, name + "." + object_type])
+    for suffix in (".st", ".xml", "_task.xml", "_lib.xml", ".tl"):
+        entries.add(name + suffix)
+    return entries
+
+
+class SelectiveWalk(object):
+    """Walk of the project tree for one selective export"""
+
+    def __init__(self, run, export_filter):
+        self.run = run
+        self.export_filter = export_filter
+        self.folders = set()  # folders of the visited objects, relative to the save folder
+        self.synced = []  # (folder of a selected object, entries of children that were not exported)
+        self.skipped = 0
+
+    @traced("walk_selected")
+    def walk(self, treeobj, path, parents, included):
+        """
+        Export treeobj and the selected objects below it into path.
+
+        Returns:
+            set: entries of treeobj in path to keep, if treeobj was not exported
+        """
+        name = treeobj.get_name(False)
+        object_type = guid_type.get(treeobj.type.ToString(), "unknown")
+        names = parents + (name,)
+        action, included = self.export_filter.select(names, object_type, included)
+        if action == SKIP:
+            self.skipped += 1
+            return object_entries(name, object_type)
+
+        curpath, children = export_object(treeobj, path, self.run, name, contents=action == EXPORT)
+        if children:
+            self.folders.add(self.run.relative(curpath))
+            self.walk_children(children, curpath, names, included)
+        return set() if action == EXPORT else object_entries(name, object_type)
+
+    def walk_children(self, children, path, names, included, kept=()):
+        kept = set(kept)
+        for child in children:
+            kept.update(self.walk(child, path, names, included))
+        if included:
+            self.synced.append((path, kept))
+
+    def remove_stale(self):
+        """Remove the files and folders in the synced folders no visited object stands for"""
+        written = set(self.run.written)
+        for folder, kept in self.synced:
+            if not os.path.isdir(folder):
+                continue  # task, its children are exported with it
+            for entry in sorted(os.listdir(folder)):
+                if entry.startswith(".") or entry in kept:
+                    continue
+                path = os.path.join(folder, entry)
+                relative_path = self.run.relative(path)
+                if relative_path in written or relative_path in self.folders:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                self.run.removed.append(relative_path)
+
+
+def merge_unknown_object_types(save_folder, unknown_object_types):
+    """Add unknown_object_types to those of unknown_object_types.txt in save_folder"""
+    merged = {}
+    path = os.path.join(save_folder, UNKNOWN_OBJECT_TYPES_FILE)
+    if os.path.exists(path):
+        with io.open(path, "r", encoding="utf-8") as f:
+            try:
+                merged = ast.literal_eval(f.read())
+            except (ValueError, SyntaxError):
+                pass
+    for type_guid, names in unknown_object_types.items():
+        known = merged.setdefault(type_guid, [])
+        known.extend(name for name in names if name not in known)
+    write_unknown_object_types(save_folder, merged)
+
+
+@traced("export_selected")
+def export_selected(project, save_folder, export_filter, native_cache=None):
+    """
+    Export the objects of project selected by export_filter into save_folder, merging them
+    into the export tree already there.
+
+    Returns:
+        ExportRun: with the files written and removed, relative to save_folder
+    """
+    if not os.path.exists(save_folder):
+        os.makedirs(save_folder)
+    run = ExportRun(project, save_folder, native_cache=native_cache)
+    walk = SelectiveWalk(run, export_filter)
+    walk.walk_children(project.get_children(), save_folder, (), not export_filter.include,
+                       kept=[UNKNOWN_OBJECT_TYPES_FILE])
+    walk.remove_stale()
+
+    merge_unknown_object_types(save_folder, run.unknown_object_types)
+    if native_cache is not None:
+        native_cache.save()
+    run.target.close()
+    return run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export selected parts of the primary project")
+    parser.add_argument("--include", action="append", default=[], metavar="PATTERN",
+                        help="name path glob of objects to export with everything below them")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="name path glob of objects to leave out with everything below them")
+    parser.add_argument("--type", action="append", default=[], dest="types", help="only write objects of this type")
+    parser.add_argument("--exclude-type", action="append", default=[], dest="exclude_types",
+                        help="leave out objects of this type with everything below them")
+    parser.add_argument("--save-folder", help="export tree to merge into (default: <project>_txt/st_source)")
+    parser.add_argument("--native-cache", nargs="?", const=default_native_cache_folder(), metavar="FOLDER",
+                        help="reuse unchanged native exports from this cache folder (default folder: %(const)s)")
+    args = parser.parse_args(argv)
+
+    project = scripting.projects.primary
+    save_folder = args.save_folder or get_save_folder(project.path)
+    native_cache = NativeExportCache(args.native_cache) if args.native_cache else None
+    export_filter = ExportFilter(args.include, args.exclude, args.types, args.exclude_types)
+    print("Selective export to {} started.".format(save_folder))
+    run = export_selected(project, save_folder, export_filter, native_cache)
+    print("Export finished, {} files written, {} removed.".format(len(run.written), len(run.removed)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
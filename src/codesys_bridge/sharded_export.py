@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Sharded export: the project tree is split into subtrees ("units") which are exported by
+several workers, each with its own handle of the same project. Every worker writes a
+shard manifest, the manifests are merged into one unknown_object_types.txt and checked
+for overlapping output.
+
+Units are identified by their name path from the project root, so a worker can resolve
+them in its own project handle. When the project has fewer top-level subtrees than
+requested, the largest containers (devices, Plc Logic, applications, folders) are split
+further; the containers themselves are exported by the coordinator.
+"""
+from __future__ import print_function, unicode_literals
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+
+from .cs_export import (
+    ExportRun,
+    clear_save_folder,
+    export_object,
+    scripting,
+    walk_export_tree,
+    write_unknown_object_types,
+)
+from .tree_handle import TreeHandle
+
+MANIFEST_FOLDER = ".shards"
+
+
+def open_project(path):
+    """Default opener for workers: open path with the script engine's projects object."""
+    return scripting.projects.open(path)
+
+
+class ExportUnit(object):
+    """A subtree exported as a whole by one worker"""
+
+    def __init__(self, names, folder, weight):
+        self.names = names  # name path from the project root
+        self.folder = folder  # output folder relative to the save folder
+        self.weight = weight  # number of direct children, used for balancing
+        self.order = None  # position in the export order
+        # unknown object types of the containers the coordinator exported right before the unit
+        self.preceding_types = []
+
+    def to_json(self):
+        return {"names": self.names, "folder": self.folder}
+
+
+def get_by_names(project, names):
+    return TreeHandle(project).get(names)
+
+
+def plan_units(project, save_folder, run, min_units):
+    """
+    Split the project into at least min_units units where possible. Containers that are
+    split are exported here (native export, folder creation) through run. Their unknown object
+    types go to the preceding_types of the unit exported next, those after the last unit stay
+    in run.unknown_object_types.
+
+    Returns:
+        list[ExportUnit]: units in export order
+    """
+    units = []
+    for child in project.get_children(False):
+        units.append((child, ExportUnit([child.get_name(False)], "", len(child.get_children(False)))))
+
+    while len(units) < min_units:
+        # Split the heaviest unit whose children are not exported together with it
+        candidates = [i for i, (_, unit) in enumerate(units) if unit.weight > 0]
+        if not candidates:
+            break
+        index = max(candidates, key=lambda i: units[i][1].weight)
+        treeobj, unit = units[index]
+        unknown_object_types = run.unknown_object_types
+        run.unknown_object_types = defaultdict(lambda: [])
+        curpath, children = export_object(treeobj, os.path.join(save_folder, unit.folder), run)
+        preceding_types = unit.preceding_types + ([dict(run.unknown_object_types)] if run.unknown_object_types else [])
+        run.unknown_object_types = unknown_object_types
+        if curpath is None:
+            children = []  # a textual object, exported as a whole with its methods and actions
+        folder = os.path.relpath(curpath, save_folder) if curpath is not None else None
+        units[index:index + 1] = [
+            (child, ExportUnit(unit.names + [child.get_name(False)], folder, len(child.get_children(False))))
+            for child in children
+        ]
+        if index < len(units):
+            units[index][1].preceding_types = preceding_types + units[index][1].preceding_types
+        else:
+            for types in preceding_types:
+                for type_guid, names in types.items():
+                    run.unknown_object_types[type_guid].extend(names)
+    return [unit for _, unit in units]
+
+
+def assign_shards(units, shards):
+    """Distribute units over shards, heaviest first onto the lightest shard."""
+    assignment = [[] for _ in range(shards)]
+    loads = [0] * shards
+    for index in sorted(range(len(units)), key=lambda i: -units[i].weight):
+        shard = loads.index(min(loads))
+        assignment[shard].append(index)
+        loads[shard] += units[index].weight + 1
+    # keep the original order inside each shard
+    return [[units[i] for i in sorted(indexes)] for indexes in assignment if indexes]
+
+
+def export_shard(spec):
+    """
+    Worker: open the project, export the units of the shard and write the shard manifest.
+
+    Args:
+        spec (dict): project_path, save_folder, shard, units, manifest_path and open_project,
+            a picklable callable returning a project handle for project_path
+
+    Returns:
+        str: path of the written manifest
+    """
+    start = time.time()
+    opener = spec.get("open_project") or open_project
+    project = opener(spec["project_path"])
+    run = ExportRun(project, spec["save_folder"])
+    # units of a shard share their parents, resolve them once
+    tree = TreeHandle(project)
+    unit_types = []
+    for unit in spec["units"]:
+        treeobj = tree.get(unit["names"])
+        run.unknown_object_types = defaultdict(lambda: [])
+        walk_export_tree(treeobj, len(unit["names"]) - 1, os.path.join(spec["save_folder"], unit["folder"]), run)
+        unit_types.append(dict(run.unknown_object_types))
+
+    manifest = {
+        "shard": spec["shard"],
+        "units": spec["units"],
+        "unknown_object_types": unit_types,
+        "files": run.written,
+        "seconds": time.time() - start,
+    }
+    with open(spec["manifest_path"], "w") as f:
+        json.dump(manifest, f, indent=1)
+    return spec["manifest_path"]
+
+
+def merge_manifests(save_folder, manifest_paths, coordinator_run, units):
+    """
+    Merge shard manifests. The unknown object types are merged in export order, like a serial
+    export records them: those of every unit after the preceding_types the coordinator
+    recorded for it, the remaining ones of the coordinator last. Raises ValueError if two
+    shards wrote the same file.
+
+    Returns:
+        dict: merged manifest with files, unknown_object_types and per shard seconds
+    """
+    manifests = []
+    for path in manifest_paths:
+        with open(path) as f:
+            manifests.append(json.load(f))
+
+    written_by = {}
+    for file_path in coordinator_run.written:
+        written_by[file_path] = "coordinator"
+    for manifest in manifests:
+        for file_path in manifest["files"]:
+            if file_path in written_by:
+                raise ValueError("{} written by {} and shard {}".format(
+                    file_path, written_by[file_path], manifest["shard"]))
+            written_by[file_path] = manifest["shard"]
+
+    unit_types = {}
+    for manifest in manifests:
+        for unit, types in zip(manifest["units"], manifest["unknown_object_types"]):
+            unit_types[unit["order"]] = types
+    ordered_types = []
+    for unit in sorted(units, key=lambda unit: unit.order):
+        ordered_types.extend(unit.preceding_types)
+        ordered_types.append(unit_types.get(unit.order, {}))
+    ordered_types.append(coordinator_run.unknown_object_types)
+    unknown_object_types = defaultdict(lambda: [])
+    for types in ordered_types:
+        for type_guid, names in types.items():
+            unknown_object_types[type_guid].extend(names)
+
+    write_unknown_object_types(save_folder, unknown_object_types)
+    return {
+        "files": sorted(written_by),
+        "unknown_object_types": dict(unknown_object_types),
+        "seconds": dict((manifest["shard"], manifest["seconds"]) for manifest in manifests),
+    }
+
+
+def run_shards(specs, processes):
+    if processes == 1 or len(specs) == 1:
+        return [export_shard(spec) for spec in specs]
+    import multiprocessing  # not available in the IDE's IronPython
+    pool = multiprocessing.Pool(processes or len(specs))
+    try:
+        return pool.map(export_shard, specs, 1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def export_project_sharded(project_path, save_folder, shards, opener=open_project, processes=None):
+    """
+    Export the project stored at project_path into save_folder using shards workers.
+
+    Args:
+        project_path (str): project file, every worker opens it with opener
+        save_folder (str): export target, its previous content is replaced
+        shards (int): number of shards
+        opener: picklable callable project_path -> project handle
+        processes (int): worker processes, default one per shard; 1 exports in this process
+
+    Returns:
+        dict: merged manifest, see merge_manifests
+    """
+    clear_save_folder(save_folder)
+    project = opener(project_path)
+    coordinator_run = ExportRun(project, save_folder)
+    units = plan_units(project, save_folder, coordinator_run, shards)
+    for order, unit in enumerate(units):
+        unit.order = order
+
+    manifest_folder = os.path.join(save_folder, MANIFEST_FOLDER)
+    os.makedirs(manifest_folder)
+    specs = []
+    for shard, shard_units in enumerate(assign_shards(units, shards)):
+        specs.append({
+            "project_path": project_path,
+            "save_folder": save_folder,
+            "shard": shard,
+            "units": [dict(unit.to_json(), order=unit.order) for unit in shard_units],
+            "manifest_path": os.path.join(manifest_folder, "shard-{}.json".format(shard)),
+            "open_project": opener,
+        })
+    try:
+        manifest_paths = run_shards(specs, processes)
+        return merge_manifests(save_folder, manifest_paths, coordinator_run, units)
+    finally:
+        shutil.rmtree(manifest_folder)
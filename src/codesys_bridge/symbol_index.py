@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+Identifier index over an exported source tree: every identifier outside comments and strings
+is stored with its file, line, element path (e.g. "FB_Motor.M_Start") and whether it is the
+definition of a POU, method, action, property or variable, or a use of it.
+
+The index is a SQLite database (default <root>/.symbol_index/index.db, in a hidden folder
+like .git so the export, round-trip and diff tools skip it, with a .gitignore keeping it out
+of version control). update() only re-scans files whose size or modification
+time changed, lookups go through an index on the lower case identifier.
+
+Usage: python -m codesys_bridge.symbol_index <st_source> <identifier> [--definitions] [-j PROCESSES]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+from collections import namedtuple
+
+from .cs_export import code_matches, code_pattern, is_var_section, make_cache_folder, parse_iec_element
+from .cs_import import read_st_file
+from .roundtrip import find_st_files
+from .tree_diff import element_key
+
+INDEX_FOLDER = ".symbol_index"
+
+DEFINITION = 1
+REFERENCE = 0
+
+Occurrence = namedtuple("Occurrence", ["path", "line", "column", "element", "definition"])
+
+SCHEMA_VERSION = 3
+
+# Comments and strings are skipped by code_matches
+IDENTIFIER_PATTERN = code_pattern(
+    r"""
+    (?:
+        \{[^}]*\}                     # Pragmas
+        |
+        %[IQM]\S*                     # Direct addresses
+        |
+        \b(?:L?T|L?TIME|L?DATE|D|TOD|LTOD|TIME_OF_DAY|DT|LDT|DATE_AND_TIME)\#[\w:.\-]*  # Time literals
+        |
+        \d[\w.#]*                     # Numbers, typed and based literals
+    )
+    |
+    (?P<identifier>[A-Za-z_]\w*)
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+
+# Tokens of the declarations in VAR and TYPE bodies, comments and strings are skipped by code_matches
+DECLARATION_TOKEN_PATTERN = code_pattern(
+    r"""
+    \{[^}]*\}                         # Pragmas
+    | %[IQM][^\s:;]*                  # Direct addresses
+    | \d[\w.#]*                       # Numbers, typed and based literals
+    | (?P<end>;)
+    | (?P<colon>:(?!=))
+    | (?P<separator>[(,])
+    | (?P<name>[A-Za-z_]\w*)
+    """,
+    re.VERBOSE,
+)
+
+# Keywords and elementary types, not indexed
+KEYWORDS = frozenset("""
+    abstract action and and_then array at by case constant continue do else elsif end_action end_case
+    end_for end_function end_function_block end_if end_interface end_method end_program end_property
+    end_repeat end_struct end_type end_union end_var end_while exit extends false final for function
+    function_block get if implements interface internal jmp method mod not of or or_else persistent
+    pointer private program property protected public ref_to reference repeat retain return set
+    struct super then this to true type union until var var_config var_external var_global
+    var_in_out var_inst var_input var_output var_stat var_temp while xor
+    bool byte word dword lword sint int dint lint usint uint udint ulint real lreal
+    time ltime date ldate time_of_day tod date_and_time dt string wstring
+""".split())
+
+# Element types whose name is defined by the element
+DEFINING_ELEMENTS = frozenset(["FUNCTION_BLOCK", "FUNCTION", "INTERFACE", "PROGRAM", "TYPE", "METHOD", "ACTION",
+                               "PROPERTY"])
+
+
+def declaration_definitions(text, start, end, enums=False):
+    """
+    Positions of the names defined by the declarations in text[start:end]: the names before the
+    first ":" of each statement ("a, b AT %IX0.0 : INT := c;"), and with enums the values of
+    enumerations ("(Red := 1, Green)"), whose statements have no ":".
+    """
+    positions = []
+    names = []
+    values = []  # names after "(" or ","
+    declared = False
+    after_separator = False
+    for m in code_matches(DECLARATION_TOKEN_PATTERN, text, start, end):
+        group = m.lastgroup
+        if group == "name":
+            if not declared:
+                names.append(m.start())
+                if after_separator:
+                    values.append(m.start())
+        elif group == "colon":
+            if not declared:
+                positions.extend(names)
+                declared = True
+        elif group == "end":
+            if enums and not declared:
+                positions.extend(values)
+            names, values, declared = [], [], False
+        after_separator = group == "separator"
+    if enums and not declared:
+        positions.extend(values)
+    return positions
+
+
+def element_lines(element, text, newline_positions, lines=None):
+    """
+    Element path of every line (index 0 unused), the definition lines of the element names as
+    {line: set of names} and the positions of the names defined by declarations.
+
+    Args:
+        lines: (first, last) 1-based, only declarations overlapping these lines are read
+    """
+    line_count = len(newline_positions) + 1
+    paths = [None] * (line_count + 2)
+    definitions = {}
+    positions = set()
+
+    def offset(line):
+        return newline_positions[line - 2] + 1 if line > 1 else 0
+
+    def visit(element, prefix, label):
+        path = prefix + label
+        # The start segment also covers the lines before the keyword, they belong to the parent
+        first, last = element.start_segment.end_line, min(element.body_segment.end_line, line_count)
+        for line in range(first, last + 1):
+            paths[line] = path
+        if element.type in DEFINING_ELEMENTS and element.name:
+            definitions.setdefault(element.start_segment.end_line, set()).add(element.name.lower())
+        if is_var_section(element.type) or element.type == "TYPE":
+            # declarations on the lines before END_VAR / END_TYPE
+            first = element.body_segment.start_line
+            if first < last and (lines is None or (first <= lines[1] and last > lines[0])):
+                positions.update(declaration_definitions(text, offset(first), offset(last), element.type == "TYPE"))
+        counts = {}
+        for sub in element.sub_elements:
+            visit(sub, path + ".", element_key(sub, counts)[1])
+
+    visit(element, "", element_key(element, {})[1])
+    return paths, definitions, positions
+
+
+def scan_text(text, element=None, lines=None):
+    """
+    Identifier occurrences of an ST text.
+
+    Args:
+        element: parse tree of text, if the caller already has it
+        lines: (first, last) 1-based, only scan these lines; they must not start or end inside
+            a multiline comment or string
+
+    Returns:
+        list[tuple]: (identifier in lower case, line, column, element path, DEFINITION or REFERENCE),
+            line 1-based, column 0-based
+    """
+    newline_positions = [m.start() for m in re.finditer("\n", text)]
+    line_count = len(newline_positions) + 1
+    if element is None:
+        try:
+            element = parse_iec_element(text)
+        except (ValueError, AssertionError):
+            element = None
+    if element is not None:
+        paths, definitions, positions = element_lines(element, text, newline_positions, lines)
+    else:
+        paths, definitions, positions = [None] * (line_count + 2), {}, set()
+
+    occurrences = []
+    line = 1
+    line_start = 0
+    end = len(text)
+    if lines is not None:
+        line = lines[0]
+        line_start = newline_positions[line - 2] + 1 if line > 1 else 0
+        if lines[1] <= len(newline_positions):
+            end = newline_positions[lines[1] - 1]
+    for m in code_matches(IDENTIFIER_PATTERN, text, line_start, end):
+        identifier = m.group("identifier")
+        if identifier is None:
+            continue
+        name = identifier.lower()
+        if name in KEYWORDS:
+            continue
+        pos = m.start()
+        while line <= len(newline_positions) and newline_positions[line - 1] < pos:
+            line_start = newline_positions[line - 1] + 1
+            line += 1
+        kind = DEFINITION if pos in positions or name in definitions.get(line, ()) else REFERENCE
+        occurrences.append((name, line, pos - line_start, paths[line], kind))
+    return occurrences
+
+
+def scan_file(path):
+    try:
+        return path, scan_text(read_st_file(path))
+    except (IOError, OSError):
+        return path, None
+
+
+def scan_files(paths, processes=None, chunksize=16):
+    if processes == 1 or len(paths) < chunksize * 2:
+        return map(scan_file, paths)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return list(pool.imap_unordered(scan_file, paths, chunksize))
+    finally:
+        pool.close()
+        pool.join()
+
+
+class SymbolIndex(object):
+    def __init__(self, root, index_path=None):
+        self.root = root
+        if index_path is None:
+            index_path = os.path.join(make_cache_folder(os.path.join(root, INDEX_FOLDER)), "index.db")
+        self.index_path = index_path
+        self.db = sqlite3.connect(self.index_path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.db.executescript("""
+                DROP TABLE IF EXISTS occurrences;
+                DROP TABLE IF EXISTS files;
+                PRAGMA user_version = {};
+            """.format(SCHEMA_VERSION))
+        # Readers (e.g. the language server) are not blocked while update() writes
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime REAL);
+            CREATE TABLE IF NOT EXISTS occurrences (
+                identifier TEXT, file INTEGER, line INTEGER, "column" INTEGER, element TEXT, definition INTEGER);
+            CREATE INDEX IF NOT EXISTS occurrences_identifier ON occurrences (identifier);
+            CREATE INDEX IF NOT EXISTS occurrences_file ON occurrences (file);
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, processes=1):
+        """
+        Re-scan new and changed files, drop removed ones.
+
+        Returns:
+            tuple: (number of files scanned, number of files removed)
+        """
+        known = dict((path, (file_id, size, mtime)) for file_id, path, size, mtime
+                     in self.db.execute("SELECT id, path, size, mtime FROM files"))
+        stats = {}
+        changed = []
+        for full_path in find_st_files(self.root):
+            path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+            stat = os.stat(full_path)
+            stats[path] = (stat.st_size, stat.st_mtime)
+            if path not in known or known[path][1:] != stats[path]:
+                changed.append(full_path)
+        removed = [path for path in known if path not in stats]
+
+        with self.db:
+            for path in removed:
+                self.remove_file(known[path][0])
+            for full_path, occurrences in scan_files(changed, processes):
+                path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+                if path in known:
+                    self.remove_file(known[path][0])
+                if occurrences is None:
+                    continue
+                size, mtime = stats[path]
+                file_id = self.db.execute("INSERT INTO files (path, size, mtime) VALUES (?, ?, ?)",
+                                          (path, size, mtime)).lastrowid
+                self.db.executemany(
+                    'INSERT INTO occurrences (identifier, file, line, "column", element, definition) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [(name, file_id, line, column, element, kind)
+                     for name, line, column, element, kind in occurrences])
+        return len(changed), len(removed)
+
+    def remove_file(self, file_id):
+        self.db.execute("DELETE FROM occurrences WHERE file = ?", (file_id,))
+        self.db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def find(self, identifier, definitions_only=False):
+        """Occurrences of identifier (case insensitive), sorted by path and position"""
+        query = ('SELECT files.path, occurrences.line, occurrences."column", occurrences.element, '
+                 'occurrences.definition FROM occurrences JOIN files ON files.id = occurrences.file '
+                 'WHERE occurrences.identifier = ?')
+        if definitions_only:
+            query += " AND occurrences.definition = 1"
+        query += ' ORDER BY files.path, occurrences.line, occurrences."column"'
+        return [Occurrence(path, line, column, element, bool(definition))
+                for path, line, column, element, definition in self.db.execute(query, (identifier.lower(),))]
+
+    def definitions(self, identifier):
+        return self.find(identifier, definitions_only=True)
+
+    def references(self, identifier):
+        return [occurrence for occurrence in self.find(identifier) if not occurrence.definition]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find identifiers in an exported source tree")
+    parser.add_argument("root", help="export tree, e.g. <project>_txt/st_source")
+    parser.add_argument("identifier")
+    parser.add_argument("--definitions", action="store_true", help="only definitions")
+    parser.add_argument("--index", help="index database (default: <root>/{}/index.db)".format(INDEX_FOLDER))
+    parser.add_argument("-j", "--processes", type=int, default=None, help="worker processes for scanning")
+    args = parser.parse_args(argv)
+
+    with SymbolIndex(args.root, args.index) as index:
+        index.update(args.processes)
+        occurrences = index.find(args.identifier, args.definitions)
+    for occurrence in occurrences:
+        print("{}:{}: {}{}".format(occurrence.path, occurrence.line, occurrence.element or "",
+                                   " (definition)" if occurrence.definition else ""))
+    return 0 if occurrences else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import mock_scripting
+from codesys_bridge.batch_export import export_projects, main
+from codesys_bridge.benchmarks import generate_mock_project
+from codesys_bridge.object_store import ObjectStore, StoredTree
+
+
+class TestBatchExport(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project_paths = []
+        for name, devices in (("machine_a", 1), ("machine_b", 2)):
+            path = os.path.join(self.root, "projects", name, name + ".project")
+            mock_scripting.save_mock_project(generate_mock_project(path, devices=devices, folders=2, pous_per_folder=2))
+            self.project_paths.append(path)
+        self.projects = mock_scripting.install()
+
+    def tearDown(self):
+        mock_scripting.uninstall()
+        shutil.rmtree(self.root)
+
+    def test_export_to_save_folders(self):
+        self.projects.create(os.path.join(self.root, "open.project"))
+        missing = os.path.join(self.root, "projects", "missing", "missing.project")
+        results = export_projects(self.project_paths + [missing])
+
+        self.assertIsNone(self.projects.primary)
+        for result in results[:2]:
+            self.assertIsNone(result.error)
+            self.assertGreater(result.files, 0)
+            self.assertIsNotNone(result.close_seconds)
+            self.assertTrue(os.path.isfile(os.path.join(result.save_folder, "unknown_object_types.txt")))
+        self.assertEqual(results[0].save_folder, os.path.join(self.root, "projects", "machine_a_txt", "st_source"))
+        self.assertGreater(results[1].files, results[0].files)
+        self.assertIn("No such file", results[2].error)
+        self.assertIsNone(results[2].export_seconds)
+
+    def test_export_to_shared_store(self):
+        store = ObjectStore(os.path.join(self.root, "store"))
+        results = export_projects(self.project_paths, store=store)
+
+        self.assertEqual(store.refs(), ["machine_a", "machine_b"])
+        # the exported files and unknown_object_types.txt
+        self.assertEqual(len(StoredTree(store, "machine_b").paths()), results[1].files + 1)
+        # machine_b contains the device of machine_a
+        self.assertGreater(store.blobs_reused, 0)
+
+    def test_main_with_project_list(self):
+        list_path = os.path.join(self.root, "projects.txt")
+        with io.open(list_path, "w", encoding="utf-8") as f:
+            f.write("# nightly\n\n" + "\n".join(self.project_paths) + "\n")
+        self.assertEqual(main([list_path, "--store", os.path.join(self.root, "store"),
+                               "--native-cache", os.path.join(self.root, "cache")]), 0)
+        self.assertEqual(ObjectStore(os.path.join(self.root, "store")).refs(), ["machine_a", "machine_b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import benchmarks
+from codesys_bridge.benchmarks import BenchmarkHistory, baseline_regressions, check, run_scaling, scaling_failures
+
+
+def quadratic(size):
+    items = list(range(size))
+    return lambda: [a for a in items for b in items if a == b]
+
+
+def constant(size):
+    items = list(range(100))
+    return lambda: sum(items)
+
+
+class TestScalingChecks(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        benchmarks.SCALING_CASES["quadratic"] = quadratic
+        benchmarks.SCALING_CASES["constant"] = constant
+
+    def tearDown(self):
+        del benchmarks.SCALING_CASES["quadratic"]
+        del benchmarks.SCALING_CASES["constant"]
+        shutil.rmtree(self.root)
+
+    def test_scaling_and_baseline_failures(self):
+        linear = {"case": {250: 0.010, 500: 0.021, 1000: 0.041}}
+        self.assertEqual(scaling_failures(linear), [])
+        self.assertEqual(len(scaling_failures({"case": {250: 0.010, 500: 0.040, 1000: 0.160}})), 1)
+        self.assertEqual(baseline_regressions(linear, {"case": {250: 0.009, 500: 0.019, 1000: 0.040}}), [])
+        self.assertEqual(baseline_regressions(linear, {"other": {250: 0.001}}), [])
+        regressions = baseline_regressions(linear, {"case": {250: 0.005, 500: 0.010, 1000: 0.020}})
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("2.05x the baseline", regressions[0])
+
+    def test_quadratic_case_is_caught(self):
+        results = run_scaling(["quadratic"], sizes=(100, 200, 400), repeat=3)
+        self.assertEqual(sorted(results["quadratic"]), [100, 200, 400])
+        self.assertEqual(len(scaling_failures(results)), 1)
+
+    def test_history_keeps_runs_and_the_first_passing_baseline(self):
+        path = os.path.join(self.root, "history.json")
+        failures = check(path, cases=["quadratic"], sizes=(50, 100), repeat=1)
+        self.assertEqual(len(failures), 1)
+        self.assertIsNone(BenchmarkHistory(path).baseline(benchmarks.environment_key()))
+        self.assertEqual(check(path, cases=["constant"], sizes=(50, 100), repeat=1), [])
+        check(path, tolerance=100.0, cases=["constant"], sizes=(50, 100), repeat=1)
+        history = BenchmarkHistory(path)
+        self.assertEqual(len(history.data["runs"]), 3)
+        baseline = history.baseline(benchmarks.environment_key())
+        self.assertEqual(baseline["constant"][50], history.data["runs"][1]["results"]["constant"]["50"])
+
+    def test_cases_without_baseline_entry_are_added(self):
+        path = os.path.join(self.root, "history.json")
+        check(path, cases=["constant"], sizes=(50, 100), repeat=1)
+        benchmarks.SCALING_CASES["constant_too"] = constant
+        try:
+            failures = check(path, cases=["constant", "constant_too", "quadratic"], sizes=(50, 100), repeat=1)
+        finally:
+            del benchmarks.SCALING_CASES["constant_too"]
+        self.assertEqual(len(failures), 1)
+        history = BenchmarkHistory(path)
+        baseline = history.baseline(benchmarks.environment_key())
+        self.assertEqual(sorted(baseline), ["constant", "constant_too"])
+        self.assertEqual(baseline["constant"][50], history.data["runs"][0]["results"]["constant"]["50"])
+        self.assertEqual(baseline["constant_too"][50], history.data["runs"][1]["results"]["constant_too"]["50"])
+
+
+if __name__ == "__main__":
+    unittest.main()
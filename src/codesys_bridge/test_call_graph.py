@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge.call_graph import CallGraph
+
+SOURCES = {
+    "FB_Base.st": """\
+FUNCTION_BLOCK FB_Base
+VAR
+    tmr : TON;
+END_VAR
+
+    METHOD PUBLIC M_Start : BOOL
+        M_Log('start');
+    END_METHOD
+
+    METHOD M_Log
+    VAR_INPUT
+        sText : STRING;
+    END_VAR
+    END_METHOD
+
+    METHOD FB_init : BOOL
+    END_METHOD
+
+tmr(IN := TRUE, PT := T#1S);
+END_FUNCTION_BLOCK
+""",
+    "FB_Axis.st": """\
+FUNCTION_BLOCK FB_Axis EXTENDS FB_Base IMPLEMENTS I_Axis
+VAR_INPUT
+    nId : INT;
+END_VAR
+
+    METHOD M_Start : BOOL
+        SUPER^.M_Start();
+        THIS^.M_Home();
+        // M_Dead();
+    END_METHOD
+
+    METHOD M_Home
+        IF (nId > 0) THEN
+            M_Log('M_Dead()');
+        END_IF
+    END_METHOD
+
+    METHOD M_Dead
+    END_METHOD
+
+END_FUNCTION_BLOCK
+""",
+    "I_Axis.st": """\
+INTERFACE I_Axis
+
+    METHOD M_Home
+    END_METHOD
+
+END_INTERFACE
+""",
+    "GVL_Machine.st": """\
+VAR_GLOBAL
+    fbAxis : FB_Axis;
+    itfAxis : I_Axis;
+END_VAR
+""",
+    "PRG_Main.st": """\
+PROGRAM PRG_Main
+VAR
+    x : INT;
+END_VAR
+
+GVL_Machine.fbAxis(nId := 1);
+itfAxis.M_Home();
+x := F_Scale(MAX(1, 2));
+END_PROGRAM
+""",
+}
+
+
+class TestCallGraph(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "Application"))
+        for name, text in SOURCES.items():
+            self.write(name, text)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, text):
+        with io.open(os.path.join(self.root, "Application", name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_resolution_impact_and_dead_code(self):
+        graph = CallGraph(self.root)
+        self.assertTrue(os.path.exists(os.path.join(self.root, ".call_graph", ".gitignore")))
+        self.assertEqual(graph.update(), (5, 0))
+        self.assertEqual(graph.problems, [])
+        self.assertEqual([(edge.callee, edge.kind, edge.line) for edge in graph.callees("fb_axis.m_start")], [
+            ("FB_Base.M_Start", "call", 7),
+            ("FB_Axis.M_Home", "call", 8),
+        ])
+        self.assertEqual([(edge.callee, edge.text) for edge in graph.callees("PRG_Main")], [
+            ("FB_Axis", "GVL_Machine.fbAxis"),
+            ("I_Axis.M_Home", "itfAxis.M_Home"),
+            (None, "F_Scale"),
+            (None, "MAX"),
+        ])
+        self.assertEqual([(edge.caller, edge.kind) for edge in graph.callers("FB_Axis.M_Home")], [
+            ("FB_Axis.M_Start", "call"),
+            ("I_Axis.M_Home", "implementation"),
+        ])
+        self.assertEqual(graph.impact("FB_Base.M_Log"), [
+            "FB_Axis.M_Home", "FB_Axis.M_Start", "FB_Base.M_Start", "I_Axis.M_Home", "PRG_Main"])
+        self.assertEqual([definition.path for definition in graph.unreachable()], [
+            "FB_Axis.M_Dead", "FB_Axis.M_Start", "FB_Base.M_Start"])
+        self.assertRaises(ValueError, graph.callers, "FB_Missing")
+
+    def test_incremental_update(self):
+        graph = CallGraph(self.root)
+        graph.update()
+        graph.save()
+        graph = CallGraph(self.root)
+        self.assertEqual(graph.update(), (0, 0))
+        # written again by an export: same content, new modification time
+        self.write("FB_Axis.st", SOURCES["FB_Axis.st"])
+        os.utime(os.path.join(self.root, "Application", "FB_Axis.st"), (1, 1))
+        self.assertEqual(graph.update(), (0, 0))
+        self.write("PRG_Main.st", SOURCES["PRG_Main.st"].replace("itfAxis.M_Home();", "fbAxis.M_Dead();"))
+        os.remove(os.path.join(self.root, "Application", "I_Axis.st"))
+        self.assertEqual(graph.update(), (1, 1))
+        self.assertEqual([definition.path for definition in graph.unreachable()], [
+            "FB_Axis.M_Home", "FB_Axis.M_Start", "FB_Base.M_Log", "FB_Base.M_Start"])
+
+    def test_calls_through_indexed_instances(self):
+        self.write("PRG_Main.st", """\
+PROGRAM PRG_Main
+VAR
+    i : INT;
+    aAxes : ARRAY[0..3] OF FB_Axis;
+END_VAR
+
+aAxes[i].M_Home(a := 1);
+aAxes [F_Index(aAxes[0].M_Start())] ();
+END_PROGRAM
+""")
+        graph = CallGraph(self.root)
+        graph.update()
+        self.assertEqual([(edge.callee, edge.kind, edge.text, edge.line) for edge in graph.callees("PRG_Main")], [
+            ("FB_Axis.M_Home", "call", "aAxes[i].M_Home", 7),
+            ("FB_Axis", "call", "aAxes[F_Index(aAxes[0].M_Start())]", 8),
+            (None, "call", "F_Index", 8),
+            ("FB_Axis.M_Start", "call", "aAxes[0].M_Start", 8),
+            ("FB_Axis", "instance", "aAxes", None),
+        ])
+        self.assertEqual([definition.path for definition in graph.unreachable()], ["FB_Axis.M_Dead"])
+
+
+if __name__ == "__main__":
+    unittest.main()
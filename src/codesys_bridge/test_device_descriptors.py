@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge.device_descriptors import DeviceResolver, MissingDeviceError, find_device_files
+from codesys_bridge.mock_scripting import MockDeviceRepository
+
+COUPLER = (4096, "101a 0750", "5.1.10.10")
+PLC = (4096, "1001 WinV3", "3.5.17.0")
+
+
+def write_device(directory, name, identification):
+    directory = os.path.join(directory, name + ".dev")
+    os.makedirs(directory)
+    with io.open(os.path.join(directory, name + ".dev"), "wb") as f:
+        f.write("type={}\r\r\nid={}\r\r\nver={}".format(*identification).encode("utf-8"))
+    return directory
+
+
+class TestDeviceResolver(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "st_source")
+        plc = write_device(self.source, "PLC", PLC)
+        for i in range(50):
+            write_device(os.path.join(plc, "Plc Logic", "Application"), "Coupler{}".format(i), COUPLER)
+        self.cache_path = os.path.join(self.root, "cache", "devices.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_identical_devices_are_looked_up_once(self):
+        devices = find_device_files(self.source)
+        self.assertEqual(len(devices), 51)
+        self.assertEqual(devices[0][1], PLC)
+        self.assertEqual(devices[1][1], COUPLER)
+
+        repository = MockDeviceRepository([COUPLER, PLC])
+        resolver = DeviceResolver(repository, self.cache_path)
+        self.assertEqual(resolver.validate(devices), 2)
+        device_id = resolver.device_id(COUPLER)
+        self.assertEqual((device_id.type, device_id.id, device_id.version), COUPLER)
+        self.assertEqual(repository.calls, {"create_device_identification": 2, "get_device": 2})
+        resolver.save()
+
+        # installed identifications are taken from the cache file
+        repository = MockDeviceRepository([COUPLER, PLC])
+        resolver = DeviceResolver(repository, self.cache_path)
+        resolver.validate(devices)
+        self.assertEqual(repository.calls, {"create_device_identification": 2})
+        self.assertEqual(resolver.stats["cached"], 2)
+
+    def test_missing_descriptions_are_all_reported(self):
+        devices = find_device_files(self.source)
+        resolver = DeviceResolver(MockDeviceRepository([PLC]))
+        with self.assertRaises(MissingDeviceError) as raised:
+            resolver.validate(devices)
+        self.assertEqual(len(raised.exception.missing), 50)
+        self.assertIn("id=101a 0750", str(raised.exception))
+        self.assertEqual(resolver.repository.calls["get_device"], 2)
+        with self.assertRaises(MissingDeviceError):
+            resolver.device_id(COUPLER)
+
+
+if __name__ == "__main__":
+    unittest.main()
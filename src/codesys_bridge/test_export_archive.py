@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import mock_scripting
+from codesys_bridge.benchmarks import generate_mock_project
+from codesys_bridge.cs_export import export_project
+from codesys_bridge.cs_import import process_archive
+from codesys_bridge.export_archive import ExportArchive, export_project_to_archive
+from codesys_bridge.roundtrip import verify_archive, verify_tree
+
+
+class TestExportArchive(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project = generate_mock_project(os.path.join(self.root, "machine.project"),
+                                             devices=1, folders=2, pous_per_folder=2)
+        self.save_folder = os.path.join(self.root, "st_source")
+        self.archive_path = os.path.join(self.root, "st_source.zip")
+        export_project(self.project, self.save_folder)
+        export_project_to_archive(self.project, self.archive_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_archive_has_the_same_files_as_the_folder_export(self):
+        with ExportArchive(self.archive_path) as archive:
+            for dirpath, dirnames, filenames in os.walk(self.save_folder):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    member = os.path.relpath(path, self.save_folder).replace(os.sep, "/")
+                    with io.open(path, encoding="utf-8") as f:
+                        self.assertEqual(archive.read_text(member), f.read(), member)
+            self.assertEqual(len(archive.paths()), sum(len(files) for _, _, files in os.walk(self.save_folder)))
+
+    def test_listdir_and_isdir(self):
+        with ExportArchive(self.archive_path) as archive:
+            self.assertEqual(archive.listdir(), ["PLC0.dev", "PLC0.xml", "unknown_object_types.txt"])
+            self.assertEqual(archive.listdir("PLC0.dev/Plc Logic/Application/Folder1"),
+                             ["FB_0_1_0.st", "FB_0_1_1.st"])
+            self.assertTrue(archive.isdir("PLC0.dev/Plc Logic"))
+            self.assertFalse(archive.isdir("PLC0.xml"))
+            self.assertTrue(archive.exists("PLC0.xml"))
+
+    def test_import_from_archive(self):
+        mock_scripting.install()
+        try:
+            project = mock_scripting.MockProject(os.path.join(self.root, "imported.project"))
+            with ExportArchive(self.archive_path) as archive:
+                process_archive(project, archive)
+        finally:
+            mock_scripting.uninstall()
+        names = [child.name for child in project.get_children(True)]
+        self.assertIn("FB_0_1_1", names)
+        self.assertIn("Method0", names)
+
+    def test_roundtrip_of_archive_matches_folder(self):
+        checked, failures = verify_archive(self.archive_path, processes=1)
+        folder_checked, folder_failures = verify_tree(self.save_folder, processes=1)
+        self.assertEqual(checked, folder_checked)
+        self.assertEqual(len(failures), len(folder_failures))
+
+
+if __name__ == "__main__":
+    unittest.main()
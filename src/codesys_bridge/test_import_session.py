@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import mock_scripting
+from codesys_bridge.benchmarks import generate_mock_project
+from codesys_bridge.cs_export import export_project
+from codesys_bridge.cs_import import process_directory
+from codesys_bridge.import_session import ImportSession
+from codesys_bridge.textlists import import_textlists
+
+
+def tree_shape(node):
+    return [(child.name, child.object_type,
+             child._declaration.text if child._declaration is not None else None,
+             child._implementation.text if child._implementation is not None else None,
+             tree_shape(child)) for child in node.children]
+
+
+class TestImportSession(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "st_source")
+        project = generate_mock_project(os.path.join(self.root, "machine.project"), devices=1, folders=2,
+                                        pous_per_folder=3, methods=3, actions=2)
+        project.children[0].children[0].children[0].add(mock_scripting.textlist("Texts", "Id;Default\n"))
+        export_project(project, self.source)
+        mock_scripting.install()
+
+    def tearDown(self):
+        mock_scripting.uninstall()
+        shutil.rmtree(self.root)
+
+    def import_tree(self, deferred):
+        project = mock_scripting.MockProject(os.path.join(self.root, "imported.project"))
+        textlists = []
+        if deferred:
+            session = ImportSession(project)
+            process_directory(session.root, self.source, textlists)
+            import_textlists(textlists)
+            self.assertEqual(list(project.calls), ["find"])  # the existing children of the project
+            session.save()
+        else:
+            process_directory(project, self.source, textlists)
+            import_textlists(textlists)
+            project.save()
+        return project
+
+    def test_deferred_import_matches_immediate_import(self):
+        immediate = self.import_tree(deferred=False)
+        deferred = self.import_tree(deferred=True)
+        self.assertEqual(tree_shape(deferred), tree_shape(immediate))
+        self.assertEqual(deferred.children[0].children[0].children[0].children[-1].content, "Id;Default\n")
+
+        self.assertEqual(deferred.calls["save"], 1)
+        for name in ("create_folder", "create_pou", "create_method", "create_action", "create_textlist",
+                     "importfile", "replace"):
+            self.assertEqual(deferred.calls[name], immediate.calls[name], name)
+        # nothing created in the session is looked up in the IDE
+        self.assertEqual(deferred.calls["find"], 1)
+        self.assertGreater(immediate.calls["find"], 10)
+
+    def test_coalescing_and_flush_order(self):
+        project = mock_scripting.MockProject("machine.project")
+        session = ImportSession(project)
+        folder = session.root.create_folder("Folder")
+        pou = folder.create_pou("FB_A", mock_scripting.PouType.FunctionBlock)
+        pou.textual_declaration.replace("FUNCTION_BLOCK FB_A\n")
+        pou.textual_declaration.replace("FUNCTION_BLOCK FB_A\nVAR\nEND_VAR\n")
+        self.assertEqual(folder.find("fb_a"), [pou])
+        self.assertEqual(pou.textual_declaration.text, "FUNCTION_BLOCK FB_A\nVAR\nEND_VAR\n")
+        self.assertEqual(project.calls, {})
+
+        # anything not known to the session runs the queue first
+        self.assertEqual(pou.get_children(), [])
+        self.assertEqual([c.name for c in project.children[0].children], ["FB_A"])
+        self.assertEqual(project.children[0].children[0]._declaration.text, "FUNCTION_BLOCK FB_A\nVAR\nEND_VAR\n")
+        self.assertEqual(project.calls["replace"], 1)
+        self.assertEqual((session.stats["replace"], session.stats["replace_coalesced"]), (2, 1))
+        self.assertEqual(len(folder.find("FB_A")), 1)
+
+    def test_failed_create_is_skipped(self):
+        project = mock_scripting.MockProject("machine.project")
+        fb = project.add(mock_scripting.MockTreeObject("FB_A", "pou", "FUNCTION_BLOCK FB_A\n", ""))
+
+        def create_action(name):
+            if fb.find(name, False):
+                raise ValueError("duplicate name {}".format(name))
+            return mock_scripting.MockTreeObject.create_action(fb, name)
+        fb.create_action = create_action
+
+        session = ImportSession(project)
+        pou = session.root.find("FB_A")[0]
+        pou.create_action("A_Run")
+        duplicate = pou.create_action("A_Run")
+        duplicate.textual_implementation.replace("x := 1;")
+        duplicate.create_method("M_Inner")
+        pou.create_method("M_Start").textual_implementation.replace("y := 2;")
+        session.root.create_textlist("Texts").importfile(os.path.join(self.root, "missing.tl"))
+        session.root.create_gvl("GVL")
+        session.save()
+
+        self.assertEqual([child.name for child in project.children], ["FB_A", "Texts", "GVL"])
+        self.assertEqual([(child.name, child._implementation.text) for child in fb.children],
+                         [("A_Run", ""), ("M_Start", "y := 2;")])
+        self.assertEqual([call for call, e in session.errors], [
+            "create_action A_Run in FB_A", "replace of A_Run", "create_method M_Inner in A_Run",
+            "importfile of Texts"])
+        self.assertEqual((session.stats["failed"], session.stats["skipped"]), (2, 2))
+        self.assertEqual(project.calls["save"], 1)
+        self.assertRaises(RuntimeError, lambda: duplicate.get_children())
+
+if __name__ == "__main__":
+    unittest.main()
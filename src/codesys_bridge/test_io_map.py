@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge.benchmarks import generate_io_gvl
+from codesys_bridge.io_map import IntervalTree, IoMap, address_interval
+
+GVL_MOTORS = """\
+VAR_GLOBAL
+    wStatus AT %IW1 : WORD;
+    // xOld AT %IX2.0 : BOOL;
+    sText : STRING := 'AT %IX2.1 : BOOL;';
+    xReady AT %IX3.7 : BOOL;
+    xSpare AT %I* : BOOL;
+    xBroken AT %IX0.9 : BOOL;
+END_VAR
+"""
+
+PRG_MAIN = """\
+PROGRAM PRG_Main
+VAR
+    dwOut AT %QD0 : DWORD;
+    wOut AT %QW1 : WORD;
+    iLocal : INT;
+END_VAR
+END_PROGRAM
+"""
+
+
+def write(root, path, text):
+    full_path = os.path.join(root, *path.split("/"))
+    if not os.path.isdir(os.path.dirname(full_path)):
+        os.makedirs(os.path.dirname(full_path))
+    with io.open(full_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class TestIntervalTree(unittest.TestCase):
+    def test_addresses_and_queries(self):
+        self.assertEqual(address_interval("%IX3.7"), ("I", 31, 32))
+        self.assertEqual(address_interval("%iw1"), ("I", 16, 32))
+        self.assertEqual(address_interval("%QD1"), ("Q", 32, 64))
+        self.assertEqual(address_interval("%MB4"), ("M", 32, 40))
+        for address in ["%IX0.8", "%IW1.2", "%IX3", "%I*", "VAR"]:
+            self.assertRaises(ValueError, address_interval, address)
+
+        rng = random.Random(48)
+        intervals = []
+        for i in range(300):
+            start = rng.randint(0, 1000)
+            intervals.append((start, start + rng.choice([1, 8, 16, 32, 200]), i))
+        tree = IntervalTree(intervals)
+        for _ in range(300):
+            start = rng.randint(0, 1100)
+            end = start + rng.randint(1, 40)
+            expected = sorted(i for i, interval in enumerate(tree.intervals)
+                              if interval[0] < end and start < interval[1])
+            self.assertEqual(tree.overlapping(start, end), expected)
+        self.assertEqual(IntervalTree([]).overlapping(0, 10), [])
+
+
+class TestIoMap(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        write(self.root, "PLC.dev/Application/GVL_Motors.st", GVL_MOTORS)
+        write(self.root, "PLC.dev/Application/PRG_Main.st", PRG_MAIN)
+        write(self.root, "PLC.dev/Application/GVL_IO.st", generate_io_gvl(100, first=10))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_map_overlaps_and_updates(self):
+        io_map = IoMap(self.root)
+        self.assertEqual(io_map.update(processes=1), (3, 0))
+        io_map.save()
+        self.assertTrue(os.path.exists(os.path.join(self.root, ".io_map", ".gitignore")))
+        self.assertEqual(len(io_map.bindings), 104)
+        self.assertEqual([binding.address for binding in io_map.bindings[:2]], ["%IW1", "%IX3.7"])
+        self.assertEqual([(problem.path, problem.line) for problem in io_map.problems],
+                         [("PLC.dev/Application/GVL_Motors.st", 7)])
+        self.assertEqual([(first.name, second.name) for first, second in io_map.overlaps()],
+                         [("wStatus", "xReady"), ("dwOut", "wOut")])
+        self.assertEqual([binding.scope + "." + binding.name for binding in io_map.overlapping("%QB3")],
+                         ["PRG_Main.dwOut", "PRG_Main.wOut"])
+
+        reloaded = IoMap(self.root)
+        self.assertEqual(reloaded.update(), (0, 0))
+        self.assertEqual(reloaded.bindings, io_map.bindings)
+
+        write(self.root, "PLC.dev/Application/PRG_Main.st", PRG_MAIN.replace("%QW1", "%QW12"))
+        os.remove(os.path.join(self.root, "PLC.dev", "Application", "GVL_Motors.st"))
+        self.assertEqual(reloaded.update(), (1, 1))
+        self.assertEqual(reloaded.overlaps(), [])
+        self.assertEqual(len(reloaded.bindings), 102)
+
+
+if __name__ == "__main__":
+    unittest.main()
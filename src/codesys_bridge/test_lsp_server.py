@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import asyncio
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from codesys_bridge.lsp_server import Document, LanguageServer, encode_message, path_to_uri
+from codesys_bridge.symbol_index import scan_text
+from codesys_bridge.test_symbol_index import GVL, MOTOR
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write(path, text):
+    with io.open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class LanguageServerProcess(object):
+    """The server as an editor sees it: a subprocess speaking LSP over stdin/stdout"""
+
+    def __init__(self):
+        env = dict(os.environ, PYTHONPATH=SRC)
+        self.process = subprocess.Popen([sys.executable, "-m", "codesys_bridge.lsp_server"], env=env,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.next_id = 0
+
+    def send(self, method, params=None, request=True):
+        message = {"jsonrpc": "2.0", "method": method, "params": params}
+        if request:
+            self.next_id += 1
+            message["id"] = self.next_id
+        self.process.stdin.write(encode_message(message))
+        self.process.stdin.flush()
+        if request:
+            return self.read()
+
+    def notify(self, method, params=None):
+        self.send(method, params, request=False)
+
+    def read(self):
+        headers = {}
+        while True:
+            line = self.process.stdout.readline().decode("ascii").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.lower()] = value.strip()
+        return json.loads(self.process.stdout.read(int(headers["content-length"])).decode("utf-8"))
+
+    def close(self):
+        self.send("shutdown")
+        self.notify("exit")
+        self.process.stdin.close()
+        self.process.stdout.close()
+        return self.process.wait(10)
+
+
+class TestLanguageServer(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "Application"))
+        self.motor = os.path.join(self.root, "Application", "FB_Motor.st")
+        self.gvl = os.path.join(self.root, "Application", "GVL.st")
+        write(self.motor, MOTOR)
+        write(self.gvl, GVL)
+        self.server = LanguageServerProcess()
+        response = self.server.send("initialize", {"processId": None, "rootUri": path_to_uri(self.root)})
+        self.assertTrue(response["result"]["capabilities"]["definitionProvider"])
+        self.server.notify("initialized", {})
+        self.uri = path_to_uri(self.motor)
+        self.server.notify("textDocument/didOpen", {"textDocument": {
+            "uri": self.uri, "languageId": "st", "version": 1, "text": MOTOR}})
+
+    def tearDown(self):
+        try:
+            self.assertEqual(self.server.close(), 0)
+        finally:
+            shutil.rmtree(self.root)
+
+    def locations(self, method, line, character, **params):
+        params.update({"textDocument": {"uri": self.uri}, "position": {"line": line, "character": character}})
+        return [(location["uri"], location["range"]["start"]["line"], location["range"]["start"]["character"])
+                for location in self.server.send(method, params)["result"]]
+
+    def test_document_symbols(self):
+        result = self.server.send("textDocument/documentSymbol", {"textDocument": {"uri": self.uri}})["result"]
+        motor, = result
+        self.assertEqual((motor["name"], motor["kind"]), ("FB_Motor", 5))
+        self.assertEqual([(child["name"], child["kind"]) for child in motor["children"]],
+                         [("enable", 13), ("reset", 13), ("limit", 13), ("speed", 13), ("M_Start", 6)])
+        self.assertEqual([child["name"] for child in motor["children"][-1]["children"]], ["target"])
+        self.assertEqual(motor["children"][-1]["selectionRange"]["start"], {"line": 9, "character": 11})
+
+    def test_definition_and_references(self):
+        # GVL.maxSpeed in FB_Motor -> the declaration in the (not opened) GVL file, from the index
+        self.assertEqual(self.locations("textDocument/definition", 3, 30), [(path_to_uri(self.gvl), 1, 4)])
+        # speed, in the open document
+        self.assertEqual(self.locations("textDocument/definition", 14, 9), [(self.uri, 6, 8)])
+        self.assertEqual(self.locations("textDocument/references", 14, 9, context={"includeDeclaration": False}),
+                         [(self.uri, 14, 8)])
+
+    def test_incremental_change(self):
+        # insert a line above M_Start: its definition moves down, without saving the file
+        self.server.notify("textDocument/didChange", {
+            "textDocument": {"uri": self.uri, "version": 2},
+            "contentChanges": [{"range": {"start": {"line": 8, "character": 0}, "end": {"line": 8, "character": 0}},
+                                "text": "    // inserted\n"}]})
+        self.assertEqual(self.locations("textDocument/definition", 19, 9), [(self.uri, 10, 11)])
+
+    def test_unknown_method(self):
+        self.assertEqual(self.server.send("workspace/unknown", {})["error"]["code"], -32601)
+
+
+class TestRequestDispatch(unittest.TestCase):
+    def test_waiting_request_does_not_block_later_messages(self):
+        uri = "file:///tmp/FB_Motor.st"
+        responses = []
+        server = LanguageServer(responses.append)  # not initialized: the index never gets ready
+
+        async def serve():
+            reader = asyncio.StreamReader()
+            for message in [
+                {"jsonrpc": "2.0", "method": "textDocument/didOpen", "params": {"textDocument": {
+                    "uri": uri, "languageId": "st", "version": 1, "text": MOTOR}}},
+                # GVL.maxSpeed is only defined in the index
+                {"jsonrpc": "2.0", "id": 1, "method": "textDocument/definition", "params": {
+                    "textDocument": {"uri": uri}, "position": {"line": 3, "character": 30}}},
+                {"jsonrpc": "2.0", "id": 2, "method": "textDocument/documentSymbol", "params": {
+                    "textDocument": {"uri": uri}}},
+                {"jsonrpc": "2.0", "method": "$/cancelRequest", "params": {"id": 1}},
+            ]:
+                reader.feed_data(encode_message(message))
+            reader.feed_eof()
+            await asyncio.wait_for(server.serve(reader), 10)
+
+        asyncio.run(serve())
+        self.assertEqual([response["id"] for response in responses], [2, 1])
+        self.assertEqual(responses[0]["result"][0]["name"], "FB_Motor")
+        self.assertEqual(responses[1]["error"]["code"], -32800)
+        self.assertEqual(server.requests, {})
+
+
+class TestDocument(unittest.TestCase):
+    def edit(self, document, line, character, text, end_line=None, end_character=None):
+        document.apply_change({"range": {
+            "start": {"line": line, "character": character},
+            "end": {"line": line if end_line is None else end_line,
+                    "character": character if end_character is None else end_character}}, "text": text})
+
+    def test_incremental_edits_match_a_full_scan(self):
+        document = Document("file:///tmp/FB_Motor.st", MOTOR)
+        document.occurrences
+        self.edit(document, 14, 8, "speed := 0;\n        ")  # body of M_Start
+        self.assertIsNotNone(document._tree)
+        self.edit(document, 3, 0, "        brake : BOOL;\n")  # a declaration
+        self.assertIsNotNone(document._tree)
+        self.edit(document, 9, 0, "", 10, 0)  # a line before the method
+        self.assertEqual(document.occurrences, scan_text(document.text))
+        self.assertEqual(document.element_at({"line": 15, "character": 8}), "FB_Motor.M_Start")
+
+        self.edit(document, 0, 0, "(* header\n")  # opens a comment, parsed again
+        self.assertIsNone(document._tree)
+        self.assertEqual(document.occurrences, scan_text(document.text))
+
+
+if __name__ == "__main__":
+    unittest.main()
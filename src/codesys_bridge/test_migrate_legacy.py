@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import mock_scripting
+from codesys_bridge.benchmarks import write_legacy_export
+from codesys_bridge.cs_export import export_project
+from codesys_bridge.migrate_legacy import migrate_tree, split_legacy_text
+from codesys_bridge.testing import read_tree
+
+MOTOR = """\
+FUNCTION_BLOCK FB_Motor
+VAR_INPUT
+    enable : BOOL;
+END_VAR
+
+    ACTION A_Reset
+        speed := 0;
+    END_ACTION
+
+    METHOD M_Start : BOOL
+    VAR_INPUT
+        target : INT;
+    END_VAR
+
+        speed := target;
+    END_METHOD
+
+    IF enable THEN
+        M_Start(target := 10);
+    END_IF
+END_FUNCTION_BLOCK
+"""
+
+GVL = """\
+VAR_GLOBAL
+    maxSpeed : INT := 100;
+END_VAR
+"""
+
+
+class TestMigrateLegacy(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        gvl = mock_scripting.textual_object(GVL)
+        gvl.name = "GVL_Motors"
+        self.project = mock_scripting.MockProject(os.path.join(self.root, "machine.project"), [
+            mock_scripting.device("PLC", mock_scripting.application(
+                "Application",
+                mock_scripting.folder("Motors", mock_scripting.textual_object(MOTOR)),
+                gvl,
+                mock_scripting.library_manager(libraries=["Standard"]),
+                mock_scripting.textlist("Texts", "Id;Default\nT2;Two\nT1;One\n"),
+            )),
+        ])
+        self.legacy = os.path.join(self.root, "legacy")
+        os.makedirs(self.legacy)
+        for obj in self.project.children:
+            write_legacy_export(obj, self.legacy)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_split_legacy_text(self):
+        self.assertEqual(split_legacy_text("(*#-#-#-#-#-#-#-#-#-#---Implementation---#-#-#-#-#-#-#-#-#-#-#-#-#*)\nx := 1;\n"),
+                         ("", None, "x := 1;\n"))
+
+    def test_migration_matches_current_export(self):
+        expected = os.path.join(self.root, "expected")
+        export_project(self.project, expected)
+        expected_files = read_tree(expected)
+        self.assertIn("PLC.dev/Plc Logic/Application/Motors/FB_Motor.st", expected_files)
+
+        migrated = os.path.join(self.root, "migrated")
+        for processes in (1, 2):
+            written, problems = migrate_tree(self.legacy, migrated, processes, chunksize=1)
+            self.assertEqual(written, 4)
+            self.assertEqual(problems, [("PLC.dev/PLC.dev", "device identification only, export the device from the IDE")])
+            migrated_files = read_tree(migrated)
+            for path in ("PLC.xml", "unknown_object_types.txt"):
+                del expected_files[path]
+            self.assertEqual(migrated_files, expected_files)
+            expected_files = read_tree(expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
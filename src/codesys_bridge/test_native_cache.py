@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge.benchmarks import generate_mock_project
+from codesys_bridge.cs_export import NativeExportCache, export_project
+from codesys_bridge.testing import read_tree
+
+
+class TestNativeExportCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project = generate_mock_project(os.path.join(self.root, "machine.project"), devices=2, folders=1,
+                                             pous_per_folder=1)
+        self.cache_folder = os.path.join(self.root, "cache")
+        self.save_folder = os.path.join(self.root, "st_source")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def export(self):
+        cache = NativeExportCache(self.cache_folder)
+        self.project.calls.clear()
+        export_project(self.project, self.save_folder, native_cache=cache)
+        return cache
+
+    def test_unchanged_objects_are_taken_from_the_cache(self):
+        cache = self.export()
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        self.assertEqual(self.project.calls["export_native"], 4)
+        expected = read_tree(self.save_folder)
+
+        cache = self.export()
+        self.assertEqual((cache.hits, cache.misses), (4, 0))
+        self.assertEqual(self.project.calls["export_native"], 0)
+        self.assertEqual(read_tree(self.save_folder), expected)
+
+    def test_changed_version_or_cached_file_is_exported_again(self):
+        self.export()
+        plc0 = self.project.children[0]
+        plc0.version = "2.0.0.0"
+        library_manager = plc0.children[0].children[0].children[-2]
+        library_manager.version = "3.5.18.0"
+        library_manager.content = "Standard,Util,Changed"
+        cache = self.export()
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        with open(os.path.join(self.save_folder, "PLC0.dev", "Plc Logic", "Application",
+                               "Library Manager_lib.xml")) as f:
+            self.assertIn("Changed", f.read())
+
+        for name in os.listdir(self.cache_folder):
+            if name.endswith(".xml"):
+                with open(os.path.join(self.cache_folder, name), "a") as f:
+                    f.write("modified")
+        cache = self.export()
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        cache = self.export()
+        self.assertEqual((cache.hits, cache.misses), (4, 0))
+
+    def test_libraries_without_version_are_not_cached(self):
+        library_manager = self.project.children[0].children[0].children[0].children[-2]
+        library_manager.version = ""
+        self.export()
+        cache = self.export()
+        self.assertEqual((cache.hits, cache.misses), (3, 0))
+        self.assertEqual(self.project.calls["export_native"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import mock_scripting
+from codesys_bridge.benchmarks import generate_function_block, generate_mock_project
+from codesys_bridge.cs_export import export_project
+from codesys_bridge.object_store import ObjectStore, StoreTarget, StoredTree, export_project_to_store
+from codesys_bridge.testing import read_tree
+
+
+class TestObjectStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store_root = os.path.join(self.root, "store")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def variant(self, name, changed_fb=None):
+        project = generate_mock_project(os.path.join(self.root, name + ".project"),
+                                        devices=1, folders=2, pous_per_folder=3)
+        if changed_fb:
+            folder = project.children[0].children[0].children[0].children[0]
+            folder.add(mock_scripting.textual_object(generate_function_block(changed_fb, methods=1, actions=0)))
+        return project
+
+    def test_near_identical_export_only_writes_new_blobs(self):
+        first = export_project_to_store(self.variant("machine_a"), self.store_root, "machine_a")
+        self.assertGreater(first.store.blobs_written, 6)
+
+        second = export_project_to_store(self.variant("machine_b", changed_fb="FB_Special"), self.store_root, "machine_b")
+        # everything but the added FB is shared with machine_a
+        self.assertEqual(second.store.blobs_written, 1)
+        self.assertEqual(ObjectStore(self.store_root).refs(), ["machine_a", "machine_b"])
+
+    def test_checkout_matches_folder_export(self):
+        project = self.variant("machine_a")
+        export_project_to_store(project, self.store_root, "machine_a")
+        folder = os.path.join(self.root, "folder_export")
+        export_project(project, folder)
+
+        destination = os.path.join(self.root, "checkout")
+        store = ObjectStore(self.store_root)
+        written = store.checkout("machine_a", destination)
+        self.assertEqual(read_tree(destination), read_tree(folder))
+        self.assertEqual(written, len(read_tree(folder)))
+        self.assertEqual(store.checkout("machine_a", destination), 0)
+
+        # leftovers of a checkout of another tree are removed, hidden entries are kept
+        os.makedirs(os.path.join(destination, "Other.dev", "Plc Logic"))
+        os.makedirs(os.path.join(destination, ".git"))
+        for path in (("Other.dev", "Plc Logic", "FB_Old.st"), ("FB_Old.st",), (".git", "HEAD")):
+            with io.open(os.path.join(destination, *path), "w", encoding="utf-8") as f:
+                f.write("old\n")
+        self.assertEqual(store.checkout("machine_a", destination), 0)
+        self.assertEqual(sorted(os.listdir(destination)), sorted(os.listdir(folder) + [".git"]))
+        self.assertEqual(read_tree(destination), dict(read_tree(folder), **{".git/HEAD": "old\n"}))
+
+        tree = StoredTree(store, "machine_a")
+        path = "PLC0.dev/Plc Logic/Application/Folder0/FB_0_0_0.st"
+        self.assertEqual(tree.read_text(path), read_tree(folder)[path])
+
+    def test_failed_export_removes_its_temporary_folder(self):
+        project = self.variant("machine_a")
+
+        def fail(*args):
+            raise RuntimeError("connection lost")
+
+        project.children[0].children[0].get_children = fail
+        target = StoreTarget(ObjectStore(self.store_root), "machine_a")
+        self.assertRaises(RuntimeError, export_project, project, self.store_root, target)
+        self.assertFalse(os.path.exists(target.temp_folder))
+        self.assertEqual(target.store.refs(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge.roundtrip import (
+    first_difference,
+    find_st_files,
+    verify_files,
+    verify_tree,
+)
+
+LOSSLESS = """\
+FUNCTION_BLOCK Lossless
+    VAR
+        x : INT;
+    END_VAR
+
+    x := 1;
+END_FUNCTION_BLOCK
+"""
+
+# The blank line between END_VAR and the body is added by cs_tree_dumps
+LOSSY = """\
+FUNCTION_BLOCK Lossy
+    VAR
+        x : INT;
+    END_VAR
+    x := 1;
+END_FUNCTION_BLOCK
+"""
+
+
+class TestRoundTrip(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write("Application/Lossless.st", LOSSLESS)
+        self.write("Application/Folder/Lossy.st", LOSSY)
+        self.write("Application/Broken.st", "FUNCTION_BLOCK Broken\n    x := 1;\n")
+        self.write("Application/Library_lib.xml", "<xml/>")
+        self.write(".git/Ignored.st", LOSSY)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, relative_path, text):
+        path = os.path.join(self.root, *relative_path.split("/"))
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_find_st_files(self):
+        names = [os.path.relpath(p, self.root).replace(os.sep, "/") for p in find_st_files(self.root)]
+        self.assertEqual(names, ["Application/Broken.st", "Application/Folder/Lossy.st", "Application/Lossless.st"])
+
+    def test_verify_tree_reports_first_differing_line(self):
+        checked, failures = verify_tree(self.root, processes=1)
+        self.assertEqual(checked, 3)
+        self.assertEqual([os.path.basename(f.path) for f in failures], ["Broken.st", "Lossy.st"])
+        broken, lossy = failures
+        self.assertIn("ValueError", broken.error)
+        self.assertEqual((lossy.line, lossy.expected, lossy.actual), (5, "    x := 1;\n", "\n"))
+
+    def test_verify_files_in_process_pool(self):
+        failures = verify_files(find_st_files(self.root), processes=2, chunksize=1)
+        self.assertEqual([os.path.basename(f.path) for f in failures], ["Broken.st", "Lossy.st"])
+
+    def test_first_difference(self):
+        self.assertIsNone(first_difference("a\nb\n", "a\nb\n"))
+        self.assertEqual(first_difference("a\nb\n", "a\n"), (2, "b\n", None))
+        self.assertEqual(first_difference("a\nb", "a\nb\n"), (2, "b", "b\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
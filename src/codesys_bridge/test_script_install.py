@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from codesys_bridge import codesys_script_install
+from codesys_bridge.benchmarks import measure_script_clicks, write_stub_scriptengine
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(codesys_script_install.__file__))
+
+
+class TestBundleInstall(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.install_dir = os.path.join(self.root, "Script Commands")
+        self.entry = {"Name": "Text Export", "Desc": "CodeSys Bridge: Text Export", "Icon": "export_icon.ico", "Path": ""}
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_bundle_is_reproducible(self):
+        data1, stamp1 = codesys_script_install.build_bundle(PACKAGE_DIR)
+        data2, stamp2 = codesys_script_install.build_bundle(PACKAGE_DIR)
+        self.assertEqual(data1, data2)
+        self.assertEqual(stamp1, stamp2)
+
+    def test_install_skips_unchanged_bundle(self):
+        codesys_script_install.install_to_directory(self.install_dir, dict(self.entry), PACKAGE_DIR)
+        bundle_path = os.path.join(self.install_dir, codesys_script_install.BUNDLE_NAME)
+        with zipfile.ZipFile(bundle_path) as bundle:
+            self.assertIn("codesys_bridge/cs_export.py", bundle.namelist())
+        with open(os.path.join(self.install_dir, "config.json")) as f:
+            self.assertEqual(json.load(f)[0]["Path"], "cs_export.py")
+
+        _, updated = codesys_script_install.install_bundle(self.install_dir, PACKAGE_DIR)
+        self.assertFalse(updated)
+
+        os.remove(bundle_path)
+        _, updated = codesys_script_install.install_bundle(self.install_dir, PACKAGE_DIR)
+        self.assertTrue(updated)
+
+    def test_launcher_exports_with_stub_script_engine(self):
+        os.makedirs(self.install_dir)
+        launcher_name, _ = codesys_script_install.install_bundle(self.install_dir, PACKAGE_DIR)
+        write_stub_scriptengine(self.root, os.path.join(self.root, "projects", "machine", "machine.project"))
+        timings = measure_script_clicks(os.path.join(self.install_dir, launcher_name), self.root, clicks=2)
+        self.assertEqual(len(timings), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.root, "projects", "machine_txt", "st_source", "unknown_object_types.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
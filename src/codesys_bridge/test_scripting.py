@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import unittest
+
+from codesys_bridge.benchmarks import measure_import_time
+from codesys_bridge.cs_export import ScriptingEnvironment, scripting
+from codesys_bridge.cs_import import create_object
+
+IMPORT_TIME_LIMIT = 0.05  # seconds
+
+
+class FakePouType(object):
+    Program = "program"
+    FunctionBlock = "function_block"
+    Function = "function"
+
+
+class RecordingProject(object):
+    def __init__(self):
+        self.calls = []
+
+    def create_pou(self, name, pou_type, **kwargs):
+        self.calls.append((name, pou_type, kwargs))
+        return name
+
+
+class TestScriptingEnvironment(unittest.TestCase):
+    def test_missing_name_raises_attribute_error(self):
+        environment = ScriptingEnvironment()
+        with self.assertRaises(AttributeError):
+            environment.PouType
+
+    def test_install_and_uninstall(self):
+        environment = ScriptingEnvironment()
+        environment.install(projects="mock projects")
+        self.assertEqual(environment.projects, "mock projects")
+        environment.uninstall("projects")
+        self.assertFalse(hasattr(environment, "projects"))
+
+    def test_create_object_resolves_pou_type_on_use(self):
+        scripting.install(PouType=FakePouType)
+        try:
+            project = RecordingProject()
+            create_object(project, "pou", "FB_A", "FUNCTION_BLOCK FB_A\nEND_FUNCTION_BLOCK\n")
+            create_object(project, "pou", "F_B", "FUNCTION F_B : INT\nEND_FUNCTION\n")
+        finally:
+            scripting.uninstall("PouType")
+        self.assertEqual(project.calls, [
+            ("FB_A", "function_block", {}),
+            ("F_B", "function", {"return_type": "INT"}),
+        ])
+
+
+class TestImportTime(unittest.TestCase):
+    def test_parser_imports_without_script_engine_quickly(self):
+        # Best of a few runs in fresh interpreters, so a cold disk cache doesn't fail the test
+        timings = measure_import_time(["codesys_bridge.cs_export", "codesys_bridge.cs_import"], runs=3)
+        self.assertLess(min(timings), IMPORT_TIME_LIMIT)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import ast
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import mock_scripting
+from codesys_bridge.benchmarks import generate_function_block, generate_mock_project
+from codesys_bridge.cs_export import export_project
+from codesys_bridge.selective_export import DESCEND, EXPORT, SKIP, ExportFilter, export_selected
+from codesys_bridge.testing import read_tree
+
+APPLICATION = os.path.join("PLC0.dev", "Plc Logic", "Application")
+
+
+def slashed(paths):
+    """Paths of an ExportRun like the keys of read_tree"""
+    return [path.replace(os.sep, "/") for path in paths]
+
+
+def not_walked(recursive=False):
+    raise AssertionError("children of a pruned subtree asked for")
+
+
+class TestExportFilter(unittest.TestCase):
+    def test_select(self):
+        export_filter = ExportFilter(include=["*/plc logic/Application/Motor*", "**/Tests"], exclude=["**/Old"],
+                                     exclude_types=["LIB"])
+        application = ["PLC", "Plc Logic", "Application"]
+        self.assertEqual(export_filter.select(["PLC"], "dev", False), (DESCEND, False))
+        self.assertEqual(export_filter.select(application, "application", False), (DESCEND, False))
+        self.assertEqual(export_filter.select(application + ["Motors"], "folder", False), (EXPORT, True))
+        self.assertEqual(export_filter.select(application + ["Motors", "Old"], "folder", True), (SKIP, False))
+        self.assertEqual(export_filter.select(application + ["Motors", "Library"], "lib", True), (SKIP, False))
+        self.assertEqual(export_filter.select(application + ["Motors", "FB_A"], "pou", True), (EXPORT, True))
+        self.assertEqual(export_filter.select(application + ["A", "B", "tests"], "folder", False), (EXPORT, True))
+
+        export_filter = ExportFilter(types=["pou"])
+        self.assertEqual(export_filter.select(["PLC"], "dev", True), (DESCEND, True))
+        self.assertEqual(export_filter.select(application + ["FB_A"], "pou", True), (EXPORT, True))
+        self.assertEqual(ExportFilter(include=["PLC"]).select(["Other"], "dev", False), (SKIP, False))
+
+
+class TestSelectiveExport(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.save_folder = os.path.join(self.root, "st_source")
+        self.project = generate_mock_project(os.path.join(self.root, "machine.project"), devices=2, folders=2,
+                                             pous_per_folder=2)
+        export_project(self.project, self.save_folder)
+        self.exported = read_tree(self.save_folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def folder(self, device, name):
+        application = self.project.children[device].children[0].children[0]
+        return [child for child in application.children if child.name == name][0]
+
+    def test_subtree_merges_into_existing_tree(self):
+        folder0 = self.folder(0, "Folder0")
+        folder0.children[1].remove()
+        folder0.add(mock_scripting.textual_object(generate_function_block("FB_New", methods=2, actions=1)))
+        self.folder(0, "Folder1").get_children = not_walked
+        self.project.children[1].get_children = not_walked
+
+        run = export_selected(self.project, self.save_folder, ExportFilter(include=["PLC0/*/*/Folder0"]))
+        folder_path = os.path.join(APPLICATION, "Folder0")
+        self.assertEqual(sorted(run.written), [os.path.join(folder_path, "FB_0_0_0.st"),
+                                               os.path.join(folder_path, "FB_New.st")])
+        self.assertEqual(run.removed, [os.path.join(folder_path, "FB_0_0_1.st")])
+
+        files = read_tree(self.save_folder)
+        removed, written = slashed(run.removed), slashed(run.written)
+        self.assertEqual(sorted(files), sorted(set(self.exported) - set(removed) | set(written)))
+        for path in self.exported:
+            if path not in removed:
+                self.assertEqual(files[path], self.exported[path], path)
+        self.assertEqual(ast.literal_eval(files["unknown_object_types.txt"]),
+                         ast.literal_eval(self.exported["unknown_object_types.txt"]))
+
+    def test_excluded_objects_are_kept(self):
+        with io.open(os.path.join(self.save_folder, APPLICATION, "FB_Deleted.st"), "w", encoding="utf-8") as f:
+            f.write("FUNCTION_BLOCK FB_Deleted\nEND_FUNCTION_BLOCK\n")
+        self.folder(0, "Folder1").get_children = not_walked
+        self.folder(0, "Folder0").children[0].remove()
+
+        run = export_selected(self.project, self.save_folder,
+                              ExportFilter(exclude=["PLC0/**/Folder1"], exclude_types=["lib", "tl"]))
+        self.assertEqual(sorted(run.removed), [os.path.join(APPLICATION, "FB_Deleted.st"),
+                                               os.path.join(APPLICATION, "Folder0", "FB_0_0_0.st")])
+        self.assertNotIn(os.path.join(APPLICATION, "Library Manager_lib.xml"), run.written)
+        self.assertIn("PLC1.xml", run.written)
+        files = read_tree(self.save_folder)
+        self.assertEqual(sorted(files), sorted(set(self.exported) - set(slashed(run.removed))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import mock_scripting
+from codesys_bridge.benchmarks import generate_mock_project
+from codesys_bridge.cs_export import export_project
+from codesys_bridge.sharded_export import export_project_sharded
+from codesys_bridge.testing import read_tree
+
+
+def unknown_object(name, type_guid=None):
+    treeobj = mock_scripting.MockTreeObject(name, "unknown")
+    if type_guid is not None:
+        treeobj.type = mock_scripting.MockGuid(type_guid)
+    return treeobj
+
+
+class TestShardedExport(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project_path = os.path.join(self.root, "machine.project")
+        project = generate_mock_project(self.project_path, devices=2, folders=3, pous_per_folder=2)
+        # unknown object types inside the units, between those of the containers split by the coordinator
+        folder = project.children[0].children[0].children[0].children[0]
+        folder.add(unknown_object("Extra"))
+        folder.add(unknown_object("Visu", "0fdbf158-1ae0-47d9-9269-cd84be308e9d"))
+        mock_scripting.save_mock_project(project)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def export_serial(self):
+        save_folder = os.path.join(self.root, "serial")
+        export_project(mock_scripting.open_mock_project(self.project_path), save_folder)
+        return read_tree(save_folder)
+
+    def test_sharded_export_matches_serial_export(self):
+        expected = self.export_serial()
+        for shards, processes in ((1, 1), (3, 1), (4, 2), (16, 2)):
+            save_folder = os.path.join(self.root, "sharded{}".format(shards))
+            manifest = export_project_sharded(self.project_path, save_folder, shards,
+                                              opener=mock_scripting.open_mock_project, processes=processes)
+            actual = read_tree(save_folder)
+            self.assertEqual(sorted(actual), sorted(expected))
+            for path in expected:
+                self.assertEqual(actual[path], expected[path], path)
+            self.assertEqual(len(manifest["files"]), len(expected) - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
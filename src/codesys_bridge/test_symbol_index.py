@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge.symbol_index import SymbolIndex, scan_text
+
+MOTOR = """\
+FUNCTION_BLOCK FB_Motor
+    VAR_INPUT
+        enable, reset AT %IX0.0 : BOOL; // speed in a comment
+        limit : INT := GVL.maxSpeed;
+    END_VAR
+    VAR
+        speed : INT;
+    END_VAR
+
+    METHOD M_Start : BOOL
+        VAR_INPUT
+            target : INT;
+        END_VAR
+
+        speed := MIN(target, limit);
+    END_METHOD
+
+    IF enable THEN
+        M_Start(target := 'speed');
+    END_IF
+END_FUNCTION_BLOCK
+"""
+
+GVL = """\
+VAR_GLOBAL
+    maxSpeed : INT := 100;
+END_VAR
+"""
+
+
+def write(path, text):
+    with io.open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class TestSymbolIndex(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "Application"))
+        write(os.path.join(self.root, "Application", "FB_Motor.st"), MOTOR)
+        write(os.path.join(self.root, "Application", "GVL.st"), GVL)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_scan_skips_comments_strings_and_keywords(self):
+        occurrences = [(name, line, element, kind) for name, line, _, element, kind in scan_text(MOTOR)
+                       if name in ("speed", "m_start", "enable")]
+        self.assertEqual(occurrences, [
+            ("enable", 3, "FB_Motor.VAR_INPUT", 1),
+            ("speed", 7, "FB_Motor.VAR", 1),
+            ("m_start", 10, "FB_Motor.M_Start", 1),
+            ("speed", 15, "FB_Motor.M_Start", 0),
+            ("enable", 18, "FB_Motor", 0),
+            ("m_start", 19, "FB_Motor", 0),
+        ])
+
+    def test_only_declared_names_are_definitions(self):
+        text = ("{attribute 'qualified_only'}\n"
+                "VAR_GLOBAL\n"
+                "    {attribute 'hide'} aLimits : ARRAY[0..1] OF INT := [nInit,\n"
+                "        nInit];\n"
+                "    a, b AT %IX0.0 : BOOL;\n"
+                "END_VAR\n")
+        self.assertEqual([(name, line, kind) for name, line, _, _, kind in scan_text(text)], [
+            ("alimits", 3, 1), ("ninit", 3, 0), ("ninit", 4, 0), ("a", 5, 1), ("b", 5, 1),
+        ])
+        text = "TYPE E_Color :\n(\n    Red := 1,\n    Green\n) INT;\nEND_TYPE\n"
+        self.assertEqual([(name, line, kind) for name, line, _, _, kind in scan_text(text)],
+                         [("e_color", 1, 1), ("red", 3, 1), ("green", 4, 1)])
+
+    def test_queries_and_incremental_update(self):
+        with SymbolIndex(self.root) as index:
+            self.assertEqual(index.update(), (2, 0))
+            self.assertEqual([(o.path, o.line, o.column) for o in index.definitions("MAXSPEED")],
+                             [("Application/GVL.st", 2, 4)])
+            self.assertEqual([(o.path, o.line, o.element) for o in index.references("maxSpeed")],
+                             [("Application/FB_Motor.st", 4, "FB_Motor.VAR_INPUT")])
+            self.assertEqual(index.update(), (0, 0))
+        self.assertTrue(os.path.exists(os.path.join(self.root, ".symbol_index", ".gitignore")))
+
+        write(os.path.join(self.root, "Application", "FB_Pump.st"),
+              "FUNCTION_BLOCK FB_Pump\n    x := GVL.maxSpeed;\nEND_FUNCTION_BLOCK\n")
+        os.remove(os.path.join(self.root, "Application", "FB_Motor.st"))
+        with SymbolIndex(self.root) as index:
+            self.assertEqual(index.update(), (1, 1))
+            self.assertEqual([(o.path, o.element) for o in index.references("maxspeed")],
+                             [("Application/FB_Pump.st", "FB_Pump")])
+            self.assertEqual(index.find("speed"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import mock_scripting
+from codesys_bridge.cs_export import export_project
+from codesys_bridge.cs_import import update_textlists
+from codesys_bridge.textlists import TextListReader, normalize_textlist, textlist_digest
+
+
+def write(path, text):
+    with io.open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+
+
+def read(path):
+    with io.open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+class TestTextLists(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_reader_streams_rows(self):
+        with io.StringIO("Id\tDefault\ten\nT2\tZwei\ttwo\r\n\nT1\tEins\n") as f:
+            reader = TextListReader(f)
+            self.assertEqual(reader.columns, ["Id", "Default", "en"])
+            self.assertEqual([(row.id, row.values) for row in reader],
+                             [("T2", ["Zwei", "two"]), ("T1", ["Eins", ""])])
+
+    def test_normalize_sorts_rows_and_languages(self):
+        path = os.path.join(self.root, "Texts.tl")
+        write(path, "\ufeffId;Default;fr;de\r\nT2;Two;Deux;Zwei\r\nT1;One;Un;Eins\r\n")
+        digest = textlist_digest(path)
+        normalize_textlist(path, path)
+        self.assertEqual(read(path), "Id;Default;de;fr\nT1;One;Eins;Un\nT2;Two;Zwei;Deux\n")
+        self.assertEqual(textlist_digest(path), digest)
+
+    def test_delimiters_in_texts(self):
+        path = os.path.join(self.root, "Quoted.tl")
+        write(path, 'Id;Default;en\r\nT2;"a;b";x\r\nT1;"say ""hi""";"two\r\nlines"\r\n')
+        digest = textlist_digest(path)
+        normalize_textlist(path, path)
+        self.assertEqual(read(path), 'Id;Default;en\nT1;"say ""hi""";"two\r\nlines"\nT2;"a;b";x\n')
+        self.assertEqual(textlist_digest(path), digest)
+        with io.open(path, encoding="utf-8", newline="") as f:
+            self.assertEqual([row.values for row in TextListReader(f)], [["say \"hi\"", "two\r\nlines"], ["a;b", "x"]])
+
+        # an unquoted delimiter gives more fields than the header: the file is left as exported
+        text = "Id;Default;en\r\nT1;Hello; world;Hi\r\n"
+        write(path, text)
+        normalize_textlist(path, path)
+        self.assertEqual(read(path), text)
+        with io.open(path, encoding="utf-8", newline="") as f:
+            self.assertRaises(ValueError, list, TextListReader(f))
+        target = os.path.join(self.root, "Copy.tl")
+        normalize_textlist(path, target)
+        self.assertEqual(read(target), text)
+
+    def test_update_imports_only_changed_textlists(self):
+        project = mock_scripting.MockProject(os.path.join(self.root, "machine.project"), [
+            mock_scripting.application("Application", *[
+                mock_scripting.textlist("Texts{}".format(i), "Id;Default\nT{};Text\n".format(i)) for i in range(3)
+            ])
+        ])
+        save_folder = os.path.join(self.root, "st_source")
+        export_project(project, save_folder)
+        state_path = os.path.join(self.root, "textlists.json")
+
+        self.assertEqual(update_textlists(project, save_folder, state_path), (3, 0))
+        write(os.path.join(save_folder, "Application", "Texts1.tl"), "Id;Default\nT1;Changed\n")
+        project.calls.clear()
+        self.assertEqual(update_textlists(project, save_folder, state_path), (1, 2))
+        self.assertEqual(project.calls["importfile"], 1)
+        self.assertEqual(project.children[0].children[1].content, "Id;Default\nT1;Changed\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
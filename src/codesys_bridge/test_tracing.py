@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import mock_scripting
+from codesys_bridge.benchmarks import generate_mock_project
+from codesys_bridge.cs_export import export_project
+from codesys_bridge.cs_import import process_directory
+from codesys_bridge.tracing import trace_to, tracer
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project = generate_mock_project(os.path.join(self.root, "machine.project"), devices=1, folders=2,
+                                             pous_per_folder=3)
+        self.save_folder = os.path.join(self.root, "st_source")
+        self.trace_path = os.path.join(self.root, "export.trace.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_export_and_import_spans(self):
+        with trace_to(self.trace_path, summary=False):
+            export_project(self.project, self.save_folder)
+            mock_scripting.install()
+            try:
+                process_directory(mock_scripting.MockProject("imported.project"), self.save_folder)
+            finally:
+                mock_scripting.uninstall()
+
+        summary = dict((name, (count, total, self_time)) for name, count, total, self_time in tracer.summary())
+        self.assertEqual(summary["export_project"][0], 1)
+        self.assertEqual(summary["cs_tree_dumps"][0], 6 * (1 + 5 + 2))  # FBs with their methods and actions
+        self.assertEqual(summary["save"][0], 6)
+        self.assertEqual(summary["set_object_content"][0], 6)
+        self.assertGreaterEqual(summary["parse_iec_element"][0], 6)
+        for name in ("walk_export_tree", "fetch_text", "process_directory", "export_native", "export_textlist"):
+            self.assertIn(name, summary)
+        # the export contains every other export span, the self times add up to it
+        export_total = summary["export_project"][1]
+        export_spans = ("export_project", "walk_export_tree", "cs_tree_dumps", "fetch_text", "save",
+                        "export_native", "export_textlist")
+        self.assertAlmostEqual(sum(summary[name][2] for name in export_spans), export_total, places=6)
+        self.assertLessEqual(summary["cs_tree_dumps"][1], export_total)
+
+        with io.open(self.trace_path, encoding="utf-8") as f:
+            trace = json.load(f)
+        events = trace["traceEvents"]
+        self.assertEqual(len(events), len(tracer.events))
+        self.assertTrue(set(events[0]).issuperset(["name", "ph", "ts", "dur", "pid", "tid"]))
+        self.assertEqual(events[0]["name"], "export_project")
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer.stop()
+        tracer.events = []
+        export_project(self.project, self.save_folder)
+        self.assertEqual(tracer.events, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from codesys_bridge import tree_diff
+from codesys_bridge.tree_diff import FolderTree, diff_trees
+
+MOTOR = """\
+FUNCTION_BLOCK FB_Motor
+    VAR_INPUT
+        enable : BOOL;
+    END_VAR
+    VAR
+        speed : INT;
+    END_VAR
+
+    speed := 0;
+
+    METHOD M_Start : BOOL
+        VAR_INPUT
+            target : INT;
+        END_VAR
+
+        speed := target;
+    END_METHOD
+
+    METHOD M_Stop : BOOL
+
+        speed := 0;
+    END_METHOD
+END_FUNCTION_BLOCK
+"""
+
+
+def write_files(root, files):
+    for path, text in files.items():
+        full_path = os.path.join(root, *path.split("/"))
+        if not os.path.exists(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+        with io.open(full_path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+class TestTreeDiff(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.old = os.path.join(self.root, "old")
+        self.new = os.path.join(self.root, "new")
+        files = {
+            "Application/FB_Motor.st": MOTOR,
+            "Application/FB_Other.st": MOTOR.replace("FB_Motor", "FB_Other"),
+            "Application/Texts.tl": "Id;Default\n",
+            "Application/GVL_Old.st": "VAR_GLOBAL\n    x : INT;\nEND_VAR\n",
+        }
+        write_files(self.old, files)
+        write_files(self.new, files)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def changes(self):
+        return [(c.file, c.element, c.change) for c in diff_trees(FolderTree(self.old), FolderTree(self.new))]
+
+    def test_identical_trees_are_not_parsed(self):
+        parsed = []
+        original = tree_diff.parse_iec_element
+        tree_diff.parse_iec_element = lambda *args, **kwargs: parsed.append(args[0]) or original(*args, **kwargs)
+        try:
+            self.assertEqual(self.changes(), [])
+        finally:
+            tree_diff.parse_iec_element = original
+        self.assertEqual(parsed, [])
+
+    def test_element_changes(self):
+        motor = MOTOR.replace("        speed := target;\n", "        // shifts the lines below\n\n        speed := target;\n")
+        motor = motor.replace("            target : INT;\n", "            target : DINT;\n")
+        motor = motor.replace("    END_METHOD\nEND_FUNCTION_BLOCK", "    END_METHOD\n\n    ACTION A_Reset\n        speed := 0;\n    END_ACTION\nEND_FUNCTION_BLOCK")
+        motor = motor.replace("    METHOD M_Stop : BOOL\n\n        speed := 0;\n    END_METHOD\n", "")
+        write_files(self.new, {
+            "Application/FB_Motor.st": motor,
+            "Application/GVL_New.st": "VAR_GLOBAL\nEND_VAR\n",
+            "Application/Texts.tl": "Id;Default\nT1;One\n",
+        })
+        os.remove(os.path.join(self.new, "Application", "GVL_Old.st"))
+
+        self.assertEqual(self.changes(), [
+            ("Application/FB_Motor.st", "FB_Motor.M_Stop", "removed"),
+            ("Application/FB_Motor.st", "FB_Motor.M_Start", "modified"),
+            ("Application/FB_Motor.st", "FB_Motor.M_Start.VAR_INPUT", "modified"),
+            ("Application/FB_Motor.st", "FB_Motor.A_Reset", "added"),
+            ("Application/GVL_New.st", None, "added"),
+            ("Application/GVL_Old.st", None, "removed"),
+            ("Application/Texts.tl", None, "modified"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
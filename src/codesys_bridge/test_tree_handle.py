@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import unittest
+
+from codesys_bridge.benchmarks import generate_mock_project
+from codesys_bridge.tree_handle import TreeHandle
+
+APPLICATION = "PLC1/Plc Logic/Application"
+
+
+class TestTreeHandle(unittest.TestCase):
+    def setUp(self):
+        self.project = generate_mock_project("machine.project", devices=2, folders=3, pous_per_folder=4)
+        self.tree = TreeHandle(self.project)
+
+    def test_paths_resolve_from_the_memoized_maps(self):
+        pou = self.tree.get(APPLICATION + "/Folder2/FB_1_2_3")
+        self.assertEqual(pou.name, "FB_1_2_3")
+        self.assertIs(self.tree.get(["plc1", "PLC LOGIC", "application", "folder2", "fb_1_2_3"]), pou)
+        self.assertIsNone(self.tree.find(APPLICATION + "/Folder2/FB_Missing"))
+        self.assertIsNone(self.tree.find(APPLICATION + "/Folder2/FB_1_2_3/M_Missing/X"))
+        with self.assertRaises(ValueError):
+            self.tree.get("PLC7")
+        calls = self.project.calls["get_children"]
+        for p in range(4):
+            self.tree.get(APPLICATION + "/Folder2/FB_1_2_{}".format(p))
+        self.assertEqual(self.project.calls["get_children"], calls)
+        self.assertEqual([child.name for child in self.tree.children(APPLICATION)][:3],
+                         ["Folder0", "Folder1", "Folder2"])
+
+    def test_created_and_removed_objects_update_the_maps(self):
+        folder = APPLICATION + "/Folder0"
+        self.tree.children(folder)
+        calls = self.project.calls["get_children"]
+        created = self.tree.create(folder, "create_pou", "FB_New")
+        self.assertIs(self.tree.get(folder + "/fb_new"), created)
+        self.tree.remove(folder + "/FB_1_0_0")
+        self.assertIsNone(self.tree.find(folder + "/FB_1_0_0"))
+        self.assertEqual(self.project.calls["get_children"], calls)
+        self.assertEqual(len(self.tree.children(folder)), 4)
+
+        # changes made behind the handle are seen after invalidate
+        self.tree.get(folder).create_folder("Sub")
+        self.assertIsNone(self.tree.find(folder + "/Sub"))
+        self.tree.invalidate(APPLICATION)
+        self.assertEqual(self.tree.get(folder + "/Sub").name, "Sub")
+
+
+if __name__ == "__main__":
+    unittest.main()
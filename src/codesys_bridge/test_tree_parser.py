@@ -2,14 +2,24 @@
 from __future__ import print_function, unicode_literals
 import unittest
 from codesys_bridge.cs_export import (
+    ELEMENT_PATTERN,
+    ELEMENT_TOKENS,
+    code_matches,
+    code_spans,
+    find_element_delimiters,
+    find_newline_positions,
     merge_var_sections,
     parse_iec_element,
     get_declaration_and_implementation,
     create_mock_cs_script_object,
+    create_lazy_mock_cs_script_object,
     cs_tree_dumps,
     get_element_type,
 )
 import difflib
+import random
+import re
+import time
 
 
 class HighLevelTest(unittest.TestCase):
@@ -249,6 +259,49 @@ END_FUNCTION_BLOCK
         )  # Body ends at END_VAR line
 
 
+class TestElementHashes(unittest.TestCase):
+    text = """\
+FUNCTION_BLOCK Hashed
+    VAR
+        x : INT;
+    END_VAR
+
+    METHOD First
+        x := 1;
+    END_METHOD
+
+    METHOD Second
+        x := 2;
+    END_METHOD
+END_FUNCTION_BLOCK
+"""
+
+    def test_hashes_are_optional(self):
+        self.assertIsNone(parse_iec_element(self.text).hash)
+        element = parse_iec_element(self.text, hashes=True)
+        self.assertEqual(len(element.hash), 40)
+        self.assertEqual(merge_var_sections(element).hash, element.hash)
+
+    def test_edit_changes_only_the_hashes_of_the_element_and_its_parents(self):
+        before = parse_iec_element(self.text, hashes=True)
+        after = parse_iec_element(self.text.replace("x := 1;", "x := 1;\n        x := x + 1;"), hashes=True)
+        var, first, second = before.sub_elements
+        var_after, first_after, second_after = after.sub_elements
+        self.assertNotEqual(after.hash, before.hash)
+        self.assertNotEqual(first_after.hash, first.hash)
+        # Second moved down a line but its text is the same
+        self.assertEqual(second_after.start_segment.start_line, second.start_segment.start_line + 1)
+        self.assertEqual(second_after.hash, second.hash)
+        self.assertEqual(var_after.hash, var.hash)
+
+    def test_removing_a_sibling_keeps_the_hash(self):
+        before = parse_iec_element(self.text, hashes=True)
+        after = parse_iec_element(self.text.replace("\n    METHOD First\n        x := 1;\n    END_METHOD\n", ""),
+                                  hashes=True)
+        self.assertEqual([e.name for e in after.sub_elements], [None, "Second"])
+        self.assertEqual(after.sub_elements[1].hash, before.sub_elements[2].hash)
+
+
 class TestTreeToText(unittest.TestCase):
     def setUp(self):
         self.maxDiff = None
@@ -399,6 +452,28 @@ x := 3;
         mocked_tree = create_mock_cs_script_object(transformed_element, text_lines)
         self.assertEqual(cs_tree_dumps(mocked_tree), self.original_file_input)
 
+    def test_lazy_tree_matches_eager_tree(self):
+        element = merge_var_sections(parse_iec_element(self.original_file_input))
+        text_lines = self.original_file_input.splitlines(True)
+        eager_tree = create_mock_cs_script_object(element, text_lines)
+        lazy_tree = create_lazy_mock_cs_script_object(element, text_lines)
+        self.assertEqual(cs_tree_dumps(lazy_tree), cs_tree_dumps(eager_tree))
+        for eager_child, lazy_child in zip(eager_tree.get_children(), lazy_tree.get_children()):
+            self.assertEqual(lazy_child.get_name(), eager_child.get_name())
+            self.assertEqual(lazy_child.textual_declaration.text, eager_child.textual_declaration.text)
+            self.assertEqual(lazy_child.textual_implementation.text, eager_child.textual_implementation.text)
+
+    def test_lazy_tree_builds_nothing_until_accessed(self):
+        element = merge_var_sections(parse_iec_element(self.original_file_input))
+        lazy_tree = create_lazy_mock_cs_script_object(element, self.original_file_input.splitlines(True))
+        self.assertEqual(lazy_tree.child_count(), 2)
+        self.assertIsNone(lazy_tree._children)
+        methods = lazy_tree.get_children()
+        self.assertEqual([m.get_name() for m in methods], ["Method1", "Method2"])
+        self.assertTrue(all(m._documents is None for m in methods))
+        self.assertEqual(methods[0].textual_implementation.text, "x := 1;\n")
+        self.assertIsNone(methods[1]._documents)
+
 
 def text_to_tree(element, text_lines):
     """Convert IECElement to dictionary representation."""
@@ -415,6 +490,105 @@ def text_to_tree(element, text_lines):
     return tree
 
 
+KEYWORD_PATTERN = re.compile(ELEMENT_TOKENS, re.VERBOSE | re.IGNORECASE)
+
+
+def reference_span_end(text, i):
+    """End of the comment or string at i, character by character; None if unterminated"""
+    if text.startswith("//", i):
+        end = text.find("\n", i)
+        return len(text) if end == -1 else end
+    if text.startswith("(*", i):
+        depth, j = 1, i + 2
+        while j < len(text):
+            if text.startswith("(*", j):
+                depth, j = depth + 1, j + 2
+            elif text.startswith("*)", j):
+                depth, j = depth - 1, j + 2
+                if depth == 0:
+                    return j
+            else:
+                j += 1
+        return None
+    if text[i] in "'\"":
+        j = i + 1
+        while j < len(text):
+            if text[j] == "$":
+                j += 2
+            elif text[j] == text[i]:
+                return j + 1
+            else:
+                j += 1
+    return None
+
+
+def reference_tokens(text):
+    tokens = []
+    i = 0
+    while i < len(text):
+        if text[i] in "(/'\"":
+            end = reference_span_end(text, i)
+            if end is not None:
+                i = end
+                continue
+        m = KEYWORD_PATTERN.match(text, i)
+        if m:
+            tokens.append((m.start(), m.end()))
+            i = m.end()
+        else:
+            i += 1
+    return tokens
+
+
+class TestLexer(unittest.TestCase):
+    def test_comments_and_strings(self):
+        text = """\
+(* (* nested END_VAR *) END_VAR *) VAR
+s := 'it$'s $N END_VAR'; d := "$$" VAR_INPUT
+// END_VAR
+(* unterminated END_VAR
+"""
+        self.assertEqual([m.group().upper() for m in code_matches(ELEMENT_PATTERN, text)],
+                         ["VAR", "VAR_INPUT", "END_VAR"])
+        self.assertEqual([text[start:end] for start, end in code_spans(text)],
+                         ["(* (* nested END_VAR *) END_VAR *)", "'it$'s $N END_VAR'", '"$$"', "// END_VAR"])
+
+    def test_matches_reference_lexer(self):
+        rng = random.Random(46)
+        pieces = ["(*", "*)", "(", "*", ")", "//", "'", '"', "$", "\n", " ", "x", "VAR", "END_VAR", "METHOD M"]
+        for _ in range(2000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+            self.assertEqual([(m.start(), m.end()) for m in code_matches(ELEMENT_PATTERN, text)],
+                             reference_tokens(text), repr(text))
+
+    def test_adversarial_inputs_scale_linearly(self):
+        cases = [
+            lambda n: "(* VAR " * n,  # unterminated comments
+            lambda n: "(* (* *) " * n,  # unterminated nesting
+            lambda n: '"' + '$" END_VAR ' * n,  # escaped quotes without an end
+            lambda n: "'$" * n,
+            lambda n: "(*" + "(**)" * n,
+        ]
+        for make in cases:
+            timings = []
+            for n in (5000, 20000):
+                text = make(n)
+                newline_positions = find_newline_positions(text)
+                start = time.perf_counter()
+                find_element_delimiters(text, newline_positions)
+                timings.append(time.perf_counter() - start)
+            # 4x the input, quadratic code would take 16x
+            self.assertLess(timings[1], timings[0] * 8 + 0.05, make(1))
+
+            timings = []
+            for n in (5000, 20000):
+                text = make(n).replace("VAR", "x")  # no keyword, the whole text is scanned
+                start = time.perf_counter()
+                self.assertIsNone(get_element_type(text))
+                timings.append(time.perf_counter() - start)
+            self.assertLess(timings[1], timings[0] * 8 + 0.05, make(1))
+
+
 class TestGetElementType(unittest.TestCase):
     def test_get_element_type(self):
         test_cases = [
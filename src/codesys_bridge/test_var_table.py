@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+import unittest
+
+from codesys_bridge.benchmarks import generate_io_gvl
+from codesys_bridge.var_table import Variable, parse_variables
+
+GVL = """\
+{attribute 'qualified_only'}
+VAR_GLOBAL RETAIN
+    // push buttons
+    {attribute 'hide'}
+    xStart,
+        xStop AT %ix0.0 : BOOL := FALSE;  // pressed = TRUE
+    aData : ARRAY[0..9] OF INT := [1, 2, 3]; sName : STRING(80) := 'a;b:=c'; (* after *)
+    fbAxis : FB_Axis(nId := 1);
+    rSpeed (* mm/s *) : REAL
+        := 1.5;
+    not a declaration;
+END_VAR
+"""
+
+FUNCTION_BLOCK = """\
+FUNCTION_BLOCK FB_Motor
+VAR_INPUT
+    Enable : BOOL;
+END_VAR
+VAR CONSTANT
+    MaxSpeed : REAL := 100.0;
+END_VAR
+
+    METHOD Start
+    VAR_INPUT
+        Enable : bool;
+    END_VAR
+    END_METHOD
+
+END_FUNCTION_BLOCK
+"""
+
+
+class TestVariableTable(unittest.TestCase):
+    def test_declarations(self):
+        table = parse_variables(GVL)
+        self.assertEqual(table.names, ["xStart", "xStop", "aData", "sName", "fbAxis", "rSpeed"])
+        self.assertEqual(table.get("XSTOP"), Variable(
+            "xStop", "BOOL", "FALSE", "%IX0.0", ("attribute 'hide'",), "push buttons\npressed = TRUE", 6,
+            "", "VAR_GLOBAL RETAIN"))
+        self.assertEqual(table.get("xStart").line, 5)
+        self.assertEqual(table.get("aData")[1:5], ("ARRAY[0..9] OF INT", "[1, 2, 3]", None, ()))
+        self.assertEqual(table.get("sName")[1:3], ("STRING(80)", "'a;b:=c'"))
+        self.assertEqual(table.get("sName").comment, "after")
+        self.assertEqual(table.get("fbAxis")[1:3], ("FB_Axis(nId := 1)", None))
+        self.assertEqual(table.get("rSpeed")[1:3], ("REAL", "1.5"))
+        self.assertEqual(table.get("rSpeed").comment, "mm/s")
+        self.assertIsNone(table.get("not"))
+        self.assertEqual([variable.name for variable in table.at_address("%IX0.0 ")], ["xStart", "xStop"])
+        self.assertEqual(table.type_names, ["BOOL", "ARRAY[0..9] OF INT", "STRING(80)", "FB_Axis(nId := 1)", "REAL"])
+
+    def test_scopes_and_lookups(self):
+        table = parse_variables(FUNCTION_BLOCK)
+        self.assertEqual([(variable.name, variable.scope, variable.section) for variable in table], [
+            ("Enable", "FB_Motor", "VAR_INPUT"),
+            ("MaxSpeed", "FB_Motor", "VAR CONSTANT"),
+            ("Enable", "FB_Motor.Start", "VAR_INPUT"),
+        ])
+        self.assertEqual(table.rows("enable"), [0, 2])
+        self.assertEqual(table.rows_of_type("BOOL"), [0, 2])
+
+        table = parse_variables(generate_io_gvl(1000))
+        self.assertEqual(len(table), 1000)
+        self.assertEqual(len(table.type_names), 4)
+        self.assertEqual(table.get("io_12").address, "%QX48.0")
+        self.assertEqual(table.at_address("%qd10")[0].name, "io_10")
+        self.assertEqual(len(table.rows_of_type("bool")), 250)
+        self.assertEqual(table.get("io_100").attributes, ("attribute 'hide'",))
+        self.assertEqual(table.get("io_100").comment, "Module 1\nchannel 4")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""Helpers shared by the tests"""
+from __future__ import print_function, unicode_literals
+import io
+import os
+
+
+def read_tree(root):
+    """Text of every file below root, by its path relative to root with "/" separators"""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with io.open(path, encoding="utf-8") as f:
+                files[os.path.relpath(path, root).replace(os.sep, "/")] = f.read()
+    return files
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Text lists (.tl files) as exported by the IDE: a header line (Id, Default, one column per
+language) followed by one line per entry, separated by tabs or semicolons. Texts containing the
+separator, quotes or line breaks are quoted with double quotes, as in CSV.
+
+The reader streams entries from a file; the writer produces the normalized form written by the
+export: entries sorted by Id and language columns sorted by name, so a changed translation shows
+up as a single changed line. import_textlists only imports text lists whose entries differ from
+what was imported into the project last time, recorded in a TextListState file.
+"""
+from __future__ import print_function, unicode_literals
+import io
+import os
+from collections import namedtuple
+
+TextListRow = namedtuple("TextListRow", ["id", "values"])  # values: one per column after Id
+
+
+class TextListReader(object):
+    """
+    Iterates the rows of a text list file, the header is read on construction. Missing values
+    at the end of a row are empty.
+
+    Raises:
+        ValueError: a row has more fields than the header, while iterating
+    """
+
+    def __init__(self, f):
+        import csv
+        header = f.readline()
+        self.delimiter = "\t" if "\t" in header else ";"
+        self.columns = next(csv.reader([header], delimiter=self.delimiter), [])
+        self.rows = csv.reader(f, delimiter=self.delimiter)
+
+    def __iter__(self):
+        width = len(self.columns) - 1
+        for fields in self.rows:
+            if not fields or fields == [""]:
+                continue
+            if len(fields) > width + 1:
+                raise ValueError("line {}: {} fields, the header has {}".format(
+                    self.rows.line_num + 1, len(fields), len(self.columns)))
+            values = fields[1:]
+            values.extend([""] * (width - len(values)))
+            yield TextListRow(fields[0], values)
+
+
+def open_textlist(path):
+    return io.open(path, "r", encoding="utf-8-sig", newline="")
+
+
+def normalized_rows(reader):
+    """(columns, rows) with the language columns after Default and the rows sorted by Id"""
+    columns = reader.columns
+    order = list(range(2, len(columns)))
+    order.sort(key=lambda index: columns[index].lower())
+    order = [index for index in (0, 1) if index < len(columns)] + order
+    normalized_columns = [columns[index] for index in order]
+    rows = []
+    for row in reader:
+        fields = [row.id] + row.values
+        rows.append([fields[index] for index in order])
+    rows.sort(key=lambda fields: fields[0])
+    return normalized_columns, rows
+
+
+def write_textlist(f, columns, rows, delimiter="\t"):
+    """Write rows (lists of fields including the Id) line by line, quoting fields where needed."""
+    import csv
+    writer = csv.writer(f, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(columns)
+    for fields in rows:
+        writer.writerow(fields)
+
+
+def normalize_textlist(source_path, target_path):
+    """
+    Rewrite the IDE's export at source_path in the normalized form to target_path (may be the same).
+    A text list with rows not matching its header is copied unchanged.
+    """
+    try:
+        with open_textlist(source_path) as f:
+            reader = TextListReader(f)
+            delimiter = reader.delimiter
+            columns, rows = normalized_rows(reader)
+    except ValueError:
+        if source_path != target_path:
+            import shutil
+            shutil.copyfile(source_path, target_path)
+        return
+    with io.open(target_path, "w", encoding="utf-8", newline="") as f:
+        write_textlist(f, columns, rows, delimiter)
+
+
+def textlist_digest(path):
+    """
+    Hash of the entries of a text list, independent of row and column order and of the separator.
+    Text lists with rows not matching their header are hashed as they are.
+    """
+    import hashlib
+    try:
+        with open_textlist(path) as f:
+            columns, rows = normalized_rows(TextListReader(f))
+    except ValueError:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    digest = hashlib.sha256()
+    for fields in [columns] + rows:
+        digest.update("\t".join(fields).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class TextListState(object):
+    """Digests of the text lists last imported into a project, by object path"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.digests = {}
+        if path and os.path.exists(path):
+            import json
+            with io.open(path, "r", encoding="utf-8") as f:
+                self.digests = json.load(f)
+
+    def save(self):
+        if self.path:
+            import json
+            with io.open(self.path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(self.digests, indent=1, sort_keys=True, ensure_ascii=False))
+
+
+def find_textlist(parent, name):
+    for child in parent.find(name, False):
+        if child.is_textlist:
+            return child
+    return None
+
+
+def import_textlists(textlists, state=None):
+    """
+    Import text list files into the project, skipping the ones whose entries are unchanged since
+    the import recorded in state; skipped text lists cost no call into the IDE. The state must
+    belong to the project, a newly created project is imported without state.
+
+    Args:
+        textlists (list): (parent object, object path, file path) for every text list; the object
+            is found or created in parent by the file name
+        state (TextListState): last imported digests, updated and saved; None imports everything
+
+    Returns:
+        tuple: (number of text lists imported, number skipped)
+    """
+    if state is None:
+        state = TextListState()
+    imported = skipped = 0
+    for parent, object_path, file_path in textlists:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        digest = textlist_digest(file_path)
+        if state.digests.get(object_path) == digest:
+            skipped += 1
+            continue
+        textlist = find_textlist(parent, name)
+        if textlist is None:
+            textlist = parent.create_textlist(name)
+        textlist.importfile(file_path)
+        state.digests[object_path] = digest
+        imported += 1
+    state.save()
+    return imported, skipped
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Timing spans for the export and import stages.
+
+Functions decorated with @traced("name") record a span while the tracer is running; when it is
+not, the wrapper only checks tracer.enabled and calls through. Spans nest, the summary splits
+every stage into its total time and its self time (without the spans inside it), so walking the
+tree, fetching texts from the IDE, formatting and writing files can be told apart even though
+they call each other.
+
+    with trace_to("export.trace.json"):  # Chrome trace / Perfetto JSON, summary printed
+        export_project(project, save_folder)
+
+From the IDE, set the environment variable CODESYS_BRIDGE_TRACE to the trace file path before
+starting the export or import script.
+"""
+from __future__ import print_function, unicode_literals
+import functools
+import io
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+TRACE_ENVIRONMENT_VARIABLE = "CODESYS_BRIDGE_TRACE"
+
+clock = getattr(time, "perf_counter", time.time)
+
+
+class Tracer(object):
+    def __init__(self):
+        self.enabled = False
+        self.origin = 0.0
+        # (name, thread id, start, duration, self time, outermost), times in seconds from origin
+        self.events = []
+        self.local = threading.local()
+
+    def start(self):
+        self.events = []
+        self.origin = clock()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        return self.events
+
+    def stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def begin(self, name):
+        stack = self.stack()
+        # [name, start, time spent in nested spans, not inside a span of the same name]
+        stack.append([name, clock(), 0.0, all(entry[0] != name for entry in stack)])
+
+    def end(self):
+        end = clock()
+        stack = self.stack()
+        name, start, nested, outermost = stack.pop()
+        duration = end - start
+        if stack:
+            stack[-1][2] += duration
+        self.events.append((name, threading.current_thread().ident, start - self.origin, duration,
+                            duration - nested, outermost))
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def summary(self):
+        """[(name, count, total seconds, self seconds)], largest self time first"""
+        totals = defaultdict(lambda: [0, 0.0, 0.0])
+        for name, thread, start, duration, self_time, outermost in self.events:
+            entry = totals[name]
+            entry[0] += 1
+            entry[2] += self_time
+            # recursive spans (walk_export_tree, cs_tree_dumps) count their outermost calls only
+            if outermost:
+                entry[1] += duration
+        rows = [(name, count, total, self_time) for name, (count, total, self_time) in totals.items()]
+        return sorted(rows, key=lambda row: -row[3])
+
+    def format_summary(self):
+        lines = ["{:<28} {:>8} {:>12} {:>12}".format("span", "count", "total ms", "self ms")]
+        for name, count, total, self_time in self.summary():
+            lines.append("{:<28} {:>8} {:>12.2f} {:>12.2f}".format(name, count, total * 1000, self_time * 1000))
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """Trace Event Format document, opened by chrome://tracing and ui.perfetto.dev"""
+        pid = os.getpid()
+        events = [{
+            "name": name,
+            "cat": "codesys_bridge",
+            "ph": "X",
+            "ts": round(start * 1e6, 3),
+            "dur": round(duration * 1e6, 3),
+            "pid": pid,
+            "tid": thread,
+        } for name, thread, start, duration, self_time, outermost in sorted(self.events, key=lambda event: event[2])]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        import json
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.chrome_trace(), ensure_ascii=False))
+
+
+tracer = Tracer()
+
+
+def traced(name):
+    """Decorator recording a span named name for every call while the tracer is running"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            tracer.begin(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tracer.end()
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def trace_to(path, summary=True):
+    """Trace the block, write the Chrome trace to path and print the summary table"""
+    tracer.start()
+    try:
+        yield tracer
+    finally:
+        tracer.stop()
+        tracer.write_chrome_trace(path)
+        if summary:
+            print(tracer.format_summary())
+
+
+@contextmanager
+def trace_from_environment():
+    """trace_to the file named by CODESYS_BRIDGE_TRACE, nothing if it is not set"""
+    path = os.environ.get(TRACE_ENVIRONMENT_VARIABLE)
+    if not path:
+        yield None
+        return
+    with trace_to(path) as running:
+        yield running
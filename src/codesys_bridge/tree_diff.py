@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Element-level diff between two export trees: instead of a line diff over whole files, the .st
+files are parsed with parse_iec_element and their elements (POUs, methods, actions, properties,
+VAR sections) are matched by their (type, name) path and reported as added, removed or modified.
+
+Unchanged files are skipped by their digest without being parsed, and inside a changed file
+elements whose text is unchanged are skipped without visiting their children, so the cost
+grows with the number of changed elements rather than with the size of the trees.
+
+Trees are export folders, export archives (ExportArchive) or refs of an ObjectStore (StoredTree).
+
+Usage: python -m codesys_bridge.tree_diff <old> <new> [--store STORE]
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import hashlib
+import os
+import sys
+from collections import OrderedDict, namedtuple
+
+from .cs_export import is_var_section, parse_iec_element
+from .export_archive import ExportArchive
+from .object_store import ObjectStore, StoredTree
+
+# element is the dotted element path inside the file ("FB_Motor.M_Start", "FB_Motor.VAR_INPUT"),
+# None for changes of whole non-.st files; old_lines/new_lines are (first, last) line or None
+ElementChange = namedtuple("ElementChange", ["file", "element", "type", "change", "old_lines", "new_lines"])
+
+ADDED = "added"
+REMOVED = "removed"
+MODIFIED = "modified"
+
+
+class FolderTree(object):
+    """An export folder, with the interface of ExportArchive and StoredTree used here"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def paths(self):
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/"))
+        paths.sort()
+        return paths
+
+    def read_bytes(self, path):
+        with open(os.path.join(self.root, *path.split("/")), "rb") as f:
+            return f.read()
+
+    def digest(self, path):
+        return hashlib.sha1(self.read_bytes(path)).hexdigest()
+
+
+def file_digests(old_tree, new_tree, path):
+    """Digests of path in both trees, computed the same way for both."""
+    if type(old_tree) is type(new_tree) and hasattr(old_tree, "digest"):
+        return old_tree.digest(path), new_tree.digest(path)
+    return (hashlib.sha1(old_tree.read_bytes(path)).hexdigest(),
+            hashlib.sha1(new_tree.read_bytes(path)).hexdigest())
+
+
+def decode(data):
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        text = data.decode("latin-1")
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def text_hash(lines):
+    return hashlib.sha1("".join(lines).encode("utf-8")).hexdigest()
+
+
+class DiffNode(object):
+    """
+    An IECElement with its Merkle hash from the parser, the hash of its text without the text
+    of its children (own_hash) and its children by key. Both hashes only depend on the text,
+    not on the line numbers; own_hash and children are only computed for changed elements.
+    """
+
+    def __init__(self, element, text_lines, label):
+        self.element = element
+        self.text_lines = text_lines
+        self.label = label
+        self.type = element.type
+        self.hash = element.hash
+        self.lines = (element.start_segment.start_line, element.body_segment.end_line)
+        self._children = None
+
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = OrderedDict()
+            counts = {}
+            for sub in self.element.sub_elements:
+                key, label = element_key(sub, counts)
+                self._children[key] = DiffNode(sub, self.text_lines, label)
+        return self._children
+
+    @property
+    def own_hash(self):
+        segments = (self.element.start_segment, self.element.body_segment)
+        return text_hash(["".join(self.text_lines[segment.start_line - 1:segment.end_line]) + "\0"
+                          for segment in segments])
+
+
+def element_key(element, counts):
+    """
+    Key matching an element with its counterpart in the other tree, and its label.
+    VAR sections have no name and are matched by type and position among sections of that type.
+    """
+    if is_var_section(element.type) or not element.name:
+        counts[element.type] = counts.get(element.type, 0) + 1
+        label = element.type if counts[element.type] == 1 else "{}#{}".format(element.type, counts[element.type])
+        return (element.type, label), label
+    return (element.type, element.name.lower()), element.name
+
+
+def parse_file(text):
+    # Split at "\n" only, like the line numbers of the parser
+    lines = text.split("\n")
+    text_lines = [line + "\n" for line in lines[:-1]] + lines[-1:]
+    element = parse_iec_element(text, hashes=True)
+    if element is None:
+        raise ValueError("No IEC element found")
+    counts = {}
+    key, label = element_key(element, counts)
+    return key, DiffNode(element, text_lines, label)
+
+
+def diff_nodes(file_path, old, new, prefix, changes):
+    if old.hash == new.hash:
+        return
+    path = prefix + old.label
+    if old.own_hash != new.own_hash:
+        changes.append(ElementChange(file_path, path, old.type, MODIFIED, old.lines, new.lines))
+    diff_children(file_path, old.children, new.children, path + ".", changes)
+
+
+def diff_children(file_path, old_children, new_children, prefix, changes):
+    for key, old_child in old_children.items():
+        if key not in new_children:
+            changes.append(ElementChange(file_path, prefix + old_child.label, old_child.type, REMOVED,
+                                         old_child.lines, None))
+    for key, new_child in new_children.items():
+        if key not in old_children:
+            changes.append(ElementChange(file_path, prefix + new_child.label, new_child.type, ADDED,
+                                         None, new_child.lines))
+        else:
+            diff_nodes(file_path, old_children[key], new_child, prefix, changes)
+
+
+def diff_file(file_path, old_text, new_text):
+    """Element changes between two versions of a .st file"""
+    changes = []
+    try:
+        old_key, old_root = parse_file(old_text)
+        new_key, new_root = parse_file(new_text)
+    except (ValueError, AssertionError):
+        return [ElementChange(file_path, None, None, MODIFIED, None, None)]
+    diff_children(file_path, OrderedDict([(old_key, old_root)]), OrderedDict([(new_key, new_root)]), "", changes)
+    return changes
+
+
+def diff_trees(old_tree, new_tree):
+    """
+    Changes between two export trees.
+
+    Returns:
+        list[ElementChange]: sorted by file; inside a parent element the removed children come
+            first, then the added and modified ones in the order of the new file
+    """
+    old_paths = set(old_tree.paths())
+    new_paths = set(new_tree.paths())
+    changes = []
+    for path in sorted(old_paths | new_paths):
+        if path not in new_paths:
+            changes.append(ElementChange(path, None, None, REMOVED, None, None))
+        elif path not in old_paths:
+            changes.append(ElementChange(path, None, None, ADDED, None, None))
+        else:
+            old_digest, new_digest = file_digests(old_tree, new_tree, path)
+            if old_digest == new_digest:
+                continue
+            if path.endswith(".st"):
+                changes.extend(diff_file(path, decode(old_tree.read_bytes(path)), decode(new_tree.read_bytes(path))))
+            else:
+                changes.append(ElementChange(path, None, None, MODIFIED, None, None))
+    return changes
+
+
+def format_change(change):
+    if change.element is None:
+        return "{} {}".format(change.change, change.file)
+    lines = change.new_lines or change.old_lines
+    return "{} {}:{} {} ({})".format(change.change, change.file, lines[0], change.element, change.type)
+
+
+def open_tree(path, store=None):
+    if store is not None:
+        return StoredTree(store, path)
+    if os.path.isfile(path):
+        return ExportArchive(path)
+    return FolderTree(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Element-level diff between two export trees")
+    parser.add_argument("old", help="export folder, export archive or ref/tree of --store")
+    parser.add_argument("new", help="export folder, export archive or ref/tree of --store")
+    parser.add_argument("--store", help="object store the refs are in")
+    args = parser.parse_args(argv)
+
+    store = ObjectStore(args.store) if args.store else None
+    changes = diff_trees(open_tree(args.old, store), open_tree(args.new, store))
+    for change in changes:
+        print(format_change(change))
+    return 1 if changes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Name paths into a live project tree.
+
+Looking up "Device/Plc Logic/Application/Folder/FB_A" by walking get_children() and comparing
+get_name() costs an IDE call per sibling on every level, for every lookup. TreeHandle reads the
+children of a visited object once into a case-insensitive name map, so a path resolves in one
+dict lookup per level after the first visit:
+
+    tree = TreeHandle(project)
+    pou = tree.get("PLC/Plc Logic/Application/Motors/FB_Motor")
+    method = tree.create("PLC/Plc Logic/Application/Motors/FB_Motor", "create_method", "M_Start")
+    tree.remove("PLC/Plc Logic/Application/Motors/FB_Old")
+
+Objects created and removed through the handle update the maps. After other changes to the
+tree (import_native, changes made by another script) call invalidate() for the changed subtree.
+"""
+from __future__ import print_function, unicode_literals
+from collections import Counter, OrderedDict
+
+SEPARATOR = "/"
+
+
+def split_path(path):
+    """Names of a "a/b/c" path or of a list of names"""
+    if isinstance(path, (list, tuple)):
+        return list(path)
+    return [name for name in path.split(SEPARATOR) if name]
+
+
+class TreeHandle(object):
+    def __init__(self, root):
+        self.root = root
+        self.maps = {}  # lower case name path: {lower case name: child}
+        self.stats = Counter()  # IDE calls made and lookups answered from the maps
+
+    def child_map(self, obj, key):
+        """Children of obj, the object at the lower case name path key, by lower case name"""
+        children = self.maps.get(key)
+        if children is None:
+            self.stats["get_children"] += 1
+            children = OrderedDict()
+            for child in obj.get_children(False):
+                self.stats["get_name"] += 1
+                # the first of equal names, like a scan over get_children
+                children.setdefault(child.get_name(False).lower(), child)
+            self.maps[key] = children
+        else:
+            self.stats["map_hit"] += 1
+        return children
+
+    def find(self, path):
+        """Object at path, None if there is none"""
+        obj = self.root
+        key = ()
+        for name in split_path(path):
+            obj = self.child_map(obj, key).get(name.lower())
+            if obj is None:
+                return None
+            key += (name.lower(),)
+        return obj
+
+    def get(self, path):
+        obj = self.find(path)
+        if obj is None:
+            raise ValueError("Object {} not found".format(SEPARATOR.join(split_path(path))))
+        return obj
+
+    def children(self, path=()):
+        """Children of the object at path, from the map"""
+        key = tuple(name.lower() for name in split_path(path))
+        return list(self.child_map(self.get(path), key).values())
+
+    def create(self, parent_path, method, *args, **kwargs):
+        """
+        Call the create_* method of the object at parent_path and add the new object to the map.
+        Without a returned object (e.g. add of a device) the children of the parent are read again
+        on the next lookup.
+        """
+        parent = self.get(parent_path)
+        created = getattr(parent, method)(*args, **kwargs)
+        key = tuple(name.lower() for name in split_path(parent_path))
+        if created is None:
+            self.maps.pop(key, None)
+        elif key in self.maps:
+            self.stats["get_name"] += 1
+            self.maps[key].setdefault(created.get_name(False).lower(), created)
+        return created
+
+    def remove(self, path):
+        """Remove the object at path from the project and forget its subtree"""
+        names = split_path(path)
+        self.get(names).remove()
+        self.invalidate(names)
+        parent_map = self.maps.get(tuple(name.lower() for name in names[:-1]))
+        if parent_map is not None:
+            parent_map.pop(names[-1].lower(), None)
+
+    def invalidate(self, path=()):
+        """Forget the children of the object at path and of everything below it"""
+        prefix = tuple(name.lower() for name in split_path(path))
+        for key in [key for key in self.maps if key[:len(prefix)] == prefix]:
+            del self.maps[key]
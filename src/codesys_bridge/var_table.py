@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Variable declarations of the VAR sections of an ST text as a columnar table.
+
+parse_iec_element only gives the line ranges of the VAR sections; an I/O GVL with 60000
+variables would be scanned again by every analysis asking for a name, a type or an address.
+parse_variables reads every declaration once:
+
+    {attribute 'hide'}
+    xStart, xStop AT %IX0.0 : BOOL := FALSE;  // push buttons
+
+into one row per name, stored as parallel columns (names, type ids, initial values, addresses,
+attributes, comments, lines, section ids). Type names and sections are interned, a row only
+holds their index, so 60000 BOOL variables share one "BOOL" and rows_of_type compares ints:
+
+    table = parse_variables(read_st_file("GVL_IO.st"))
+    table.get("xStart").address          # "%IX0.0"
+    table.at_address("%IX0.0")           # [Variable(name="xStart", ...), Variable(name="xStop", ...)]
+    table.rows_of_type("BOOL")
+
+Comments belong to the declaration they stand in front of, and a comment after the ";" on the
+same line belongs to the declaration before it. Lookups by name are case-insensitive, the
+indexes are built on the first lookup.
+"""
+from __future__ import print_function, unicode_literals
+import re
+from array import array
+from collections import namedtuple
+
+from .cs_export import (
+    code_matches,
+    code_pattern,
+    find_newline_positions,
+    is_var_section,
+    parse_iec_element,
+)
+
+Variable = namedtuple("Variable", ["name", "type", "initial_value", "address", "attributes", "comment", "line",
+                                   "scope", "section"])
+
+# Pragmas and the ends of declarations with a line comment behind them, outside comments and strings
+DECLARATION_PATTERN = code_pattern(r"(?P<pragma>\{[^}]*\})|;(?:[ \t]*(?P<line_comment>//[^\n]*))?")
+
+# "name, other AT %IX0.0 :" at the start of a declaration, comments and pragmas blanked
+NAMES_PATTERN = re.compile(
+    r"\s*(?P<names>[A-Za-z_]\w*(?:\s*,\s*[A-Za-z_]\w*)*)\s*(?:\bAT\s+(?P<address>%[IQM][^\s:]*)\s*)?:(?!=)",
+    re.IGNORECASE,
+)
+NAME_PATTERN = re.compile(r"\w+")
+
+QUALIFIER_PATTERN = re.compile(r"\b(CONSTANT|RETAIN|PERSISTENT)\b", re.IGNORECASE)
+
+NO_ATTRIBUTES = ()
+
+
+def normalize_address(address):
+    return address.strip().upper()
+
+
+def comment_text(comment):
+    """Text of a // or (* *) comment without its delimiters"""
+    if comment.startswith("//"):
+        return comment[2:].strip()
+    return comment[2:-2].strip()
+
+
+def split_initial_value(rest):
+    """(type, initial value or None) of the text after the ":" of a declaration"""
+    assign = rest.find(":=")
+    if assign == -1:
+        return rest, None
+    head = rest[:assign]
+    if "(" not in head and "[" not in head:
+        return head, rest[assign + 2:]
+    # ARRAY[0..9] OF INT := ..., FB_Axis(nId := 1) := ...: the first := outside of brackets
+    depth = 0
+    for i, char in enumerate(rest):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif depth == 0 and rest.startswith(":=", i):
+            return rest[:i], rest[i + 2:]
+    return rest, None
+
+
+class VariableTable(object):
+    def __init__(self):
+        self.names = []
+        self.type_ids = array("i")
+        self.initial_values = []  # None without initial value
+        self.addresses = []  # normalized "%IX0.0", None without AT
+        self.attributes = []  # tuples of the pragma texts without braces
+        self.comments = []  # None without comment
+        self.lines = array("i")  # 1-based line of the name
+        self.section_ids = array("i")
+        self.type_names = []  # interned type names, by type id
+        self.sections = []  # (scope, "VAR_GLOBAL CONSTANT"), by section id
+        self._type_ids = {}
+        self._section_ids = {}
+        self._name_index = None  # lower case name: rows
+        self._address_index = None  # address: rows
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        for row in range(len(self.names)):
+            yield self.variable(row)
+
+    def type_id(self, type_name):
+        type_id = self._type_ids.get(type_name)
+        if type_id is None:
+            type_id = self._type_ids[type_name] = len(self.type_names)
+            self.type_names.append(type_name)
+        return type_id
+
+    def section_id(self, scope, section):
+        key = (scope, section)
+        section_id = self._section_ids.get(key)
+        if section_id is None:
+            section_id = self._section_ids[key] = len(self.sections)
+            self.sections.append(key)
+        return section_id
+
+    def add(self, name, type_id, initial_value, address, attributes, comment, line, section_id):
+        self.names.append(name)
+        self.type_ids.append(type_id)
+        self.initial_values.append(initial_value)
+        self.addresses.append(address)
+        self.attributes.append(attributes)
+        self.comments.append(comment)
+        self.lines.append(line)
+        self.section_ids.append(section_id)
+        self._name_index = self._address_index = None
+
+    def variable(self, row):
+        scope, section = self.sections[self.section_ids[row]]
+        return Variable(self.names[row], self.type_names[self.type_ids[row]], self.initial_values[row],
+                        self.addresses[row], self.attributes[row], self.comments[row], self.lines[row],
+                        scope, section)
+
+    def rows(self, name):
+        """Rows declaring name, in text order"""
+        if self._name_index is None:
+            index = {}
+            for row, row_name in enumerate(self.names):
+                index.setdefault(row_name.lower(), []).append(row)
+            self._name_index = index
+        return self._name_index.get(name.lower(), [])
+
+    def get(self, name):
+        """Variable of the first declaration of name, None if there is none"""
+        rows = self.rows(name)
+        return self.variable(rows[0]) if rows else None
+
+    def at_address(self, address):
+        """Variables declared AT address"""
+        if self._address_index is None:
+            index = {}
+            for row, row_address in enumerate(self.addresses):
+                if row_address is not None:
+                    index.setdefault(row_address, []).append(row)
+            self._address_index = index
+        return [self.variable(row) for row in self._address_index.get(normalize_address(address), [])]
+
+    def rows_of_type(self, type_name):
+        """Rows of the variables of type type_name, case-insensitive"""
+        key = " ".join(type_name.split()).upper()
+        type_ids = set(type_id for name, type_id in self._type_ids.items() if name.upper() == key)
+        return [row for row, type_id in enumerate(self.type_ids) if type_id in type_ids]
+
+
+def section_name(element, text, newline_positions):
+    """VAR section keyword with the qualifiers of its line, e.g. "VAR_GLOBAL RETAIN" """
+    line = element.start_segment.end_line
+    start = newline_positions[line - 2] + 1 if line > 1 else 0
+    end = newline_positions[line - 1] if line <= len(newline_positions) else len(text)
+    keyword = re.search(r"\b{}\b".format(element.type), text[start:end], re.IGNORECASE)
+    qualifiers = QUALIFIER_PATTERN.findall(text[start:end], keyword.end()) if keyword else []
+    return " ".join([element.type] + [qualifier.upper() for qualifier in qualifiers])
+
+
+def parse_section(table, text, newline_positions, element, scope):
+    """Add the declarations of the VAR section element to table"""
+    segment = element.body_segment
+    if segment.start_line > segment.end_line:
+        return
+    offset = newline_positions[segment.start_line - 2] + 1 if segment.start_line > 1 else 0
+    end = newline_positions[segment.end_line - 1] if segment.end_line <= len(newline_positions) else len(text)
+    body = text[offset:end]
+    section_id = table.section_id(scope, section_name(element, text, newline_positions))
+
+    spans = []  # comments and strings
+    declarations = []  # (position of the ";", pragmas before it)
+    pragmas = []
+    for m in code_matches(DECLARATION_PATTERN, body, spans=spans):
+        group = m.lastgroup
+        if group == "pragma":
+            pragmas.append(m.span())
+            continue
+        if group == "line_comment":
+            spans.append(m.span(group))
+        declarations.append((m.start(), pragmas))
+        pragmas = []
+    comments = [span for span in spans if body[span[0]] in "(/"]
+
+    next_comment = 0
+    start = 0
+    line = segment.start_line
+    counted = 0  # position up to which the line breaks are counted in line
+    for stop, pragmas in declarations:
+        inner = []
+        while next_comment < len(comments) and comments[next_comment][0] < stop:
+            inner.append(comments[next_comment])
+            next_comment += 1
+        described = inner
+        if next_comment < len(comments):
+            # a comment after the ";" on the same line
+            comment_start, comment_stop = comments[next_comment]
+            line_end = body.find("\n", stop)
+            if (line_end == -1 or comment_start < line_end) and not body[stop + 1:comment_start].strip():
+                described = inner + [comments[next_comment]]
+                next_comment += 1
+
+        if inner or pragmas:
+            pieces = []
+            pos = start
+            for blank_start, blank_stop in sorted(inner + pragmas):
+                pieces.append(body[pos:blank_start])
+                pieces.append(" " * (blank_stop - blank_start))
+                pos = blank_stop
+            pieces.append(body[pos:stop])
+            statement = "".join(pieces)
+        else:
+            statement = body[start:stop]
+
+        declaration = NAMES_PATTERN.match(statement)
+        if declaration is not None:
+            type_name, initial_value = split_initial_value(statement[declaration.end():])
+            type_name = " ".join(type_name.split())
+            if type_name:
+                if initial_value is not None:
+                    initial_value = initial_value.strip()
+                address = declaration.group("address")
+                if address is not None:
+                    address = normalize_address(address)
+                attributes = NO_ATTRIBUTES
+                if pragmas:
+                    attributes = tuple(body[pragma_start + 1:pragma_stop - 1].strip()
+                                       for pragma_start, pragma_stop in pragmas)
+                comment = None
+                if len(described) == 1:
+                    comment = comment_text(body[described[0][0]:described[0][1]])
+                elif described:
+                    comment = "\n".join(comment_text(body[comment_start:comment_stop])
+                                        for comment_start, comment_stop in described)
+                type_id = table.type_id(type_name)
+                names_start = start + declaration.start("names")
+                names = declaration.group("names")
+                positions = [(names, 0)] if "," not in names else [
+                    (name.group(), name.start()) for name in NAME_PATTERN.finditer(names)]
+                for name, name_start in positions:
+                    line += body.count("\n", counted, names_start + name_start)
+                    counted = names_start + name_start
+                    table.add(name, type_id, initial_value, address, attributes, comment, line, section_id)
+        start = described[-1][1] if described and described[-1][1] > stop else stop + 1
+
+def parse_variables(text, element=None):
+    """
+    VariableTable of the declarations in the VAR sections of text.
+
+    Args:
+        element: parse tree of text, if the caller already has it
+
+    Raises:
+        ValueError: text has no valid element structure
+    """
+    if element is None:
+        element = parse_iec_element(text)
+    newline_positions = find_newline_positions(text)
+    table = VariableTable()
+
+    def visit(element, scope):
+        if is_var_section(element.type):
+            parse_section(table, text, newline_positions, element, scope)
+            return
+        if element.name:
+            scope = scope + "." + element.name if scope else element.name
+        for sub in element.sub_elements:
+            visit(sub, scope)
+
+    if element is not None:
+        visit(element, "")
+    return table